@@ -1,12 +1,19 @@
 import requests
 import requests.packages
+import time
 from typing import List, Dict, Union, Tuple
 from enum import Enum
 from json import JSONDecodeError
+from urllib.parse import urlparse
 import logging
 
+import tracing
+from backoff import backoff_delay
+from api.connection_pool import ConnectionPool
 from api.exceptions import ApiException
 from api.models import Result
+from api.rate_limiter import HostRateLimiter, get_retry_delay, is_rate_limited
+from constants import app_center_constants as APP_CENTER_CONSTANTS
 
 class HTTP_METHOD(Enum):
   '''
@@ -17,6 +24,27 @@ class HTTP_METHOD(Enum):
   PUT = 3
   DELETE = 4
 
+def resolve_host(hostname: str):
+  '''
+  Resolve the base url of a host, applying APP_CENTER_CONSTANTS.API_HOST_OVERRIDES
+
+  Parameters
+  ----------
+  hostname : str
+    Ex: api.github.com, or a url with scheme and port such as http://127.0.0.1:8080
+
+  Returns
+  ----------
+  host : str
+    Host name and port without scheme. Rate limits and connection pools are kept per host
+  base_url : str
+    Url the endpoints are appended to, ending with a slash
+  '''
+  url = hostname if '://' in hostname else f'https://{hostname}'
+  host = urlparse(url).netloc
+  base_url = APP_CENTER_CONSTANTS.API_HOST_OVERRIDES.get(host, url)
+  return host, base_url.rstrip('/') + '/'
+
 class ApiWrapper:
   '''
   API Wrapper Class for all api requests
@@ -28,30 +56,34 @@ class ApiWrapper:
     Parameters
     ----------
     hostname : str
-      Ex: api.github.com
+      Ex: api.github.com, or a url with scheme and port such as http://127.0.0.1:8080
     headers : Dict
       Headers for all the requests
     logger : Logger
       Logger
     '''
-    self.__url = f'https://{hostname}/'
+    host, self.__url = resolve_host(hostname)
+    self.__host = host
     self.__headers = headers
     self.__session = requests.Session()
+    # Connections are pooled per host across every api of the process
+    ConnectionPool.for_host(host).mount(self.__session, self.__url)
     self.__logger = logger or logging.getLogger(__name__)
+    self.__rate_limiter = HostRateLimiter.for_host(host)
 
-  def __do(self, http_method: str, endpoint: str, params: Dict = None, json: Dict = None, data: Union[Dict, List, Tuple, bytes] = None) -> Result:
+  def __send(self, http_method: str, full_url: str, params: Dict = None, json: Dict = None, data: Union[Dict, List, Tuple, bytes] = None):
     '''
-    Perform HTTP Request and handle all exceptions
+    Send a single HTTP Request, re-raising any exception as ApiException
     '''
-    full_url = self.__url + endpoint
-    headers = self.__headers
-    log_line_pre = f'method={http_method}, url={full_url}, params={params}'
-    log_line_post = ', '.join((log_line_pre, 'success={}, status_code={}, message={}'))
-    
-    # Log HTTP params and perform an HTTP request, catching and re-raising any exceptions
+    with tracing.span(f'{http_method} {urlparse(full_url).path}', category='http', method=http_method, host=self.__host) as span:
+      response = self.__request(http_method=http_method, full_url=full_url, params=params, json=json, data=data)
+      body = response.request.body
+      span.set(status=response.status_code, bytes_sent=len(body) if isinstance(body, (bytes, str)) else 0, bytes_received=len(response.content))
+      return response
+
+  def __request(self, http_method: str, full_url: str, params: Dict = None, json: Dict = None, data: Union[Dict, List, Tuple, bytes] = None):
     try:
-      self.__logger.debug(msg=log_line_pre)
-      response = self.__session.request(method=http_method, url=full_url, headers=headers, params=params, json=json, data=data)
+      return self.__session.request(method=http_method, url=full_url, headers=self.__headers, params=params, json=json, data=data)
     except requests.exceptions.HTTPError as e:
       self.__logger.error(msg=(str(e)))
       raise ApiException('Request failed due to HTTP error') from e
@@ -67,13 +99,57 @@ class ApiWrapper:
     except requests.exceptions.RequestException as e:
       self.__logger.error(msg=(str(e)))
       raise ApiException('Request failed due to request exception') from e
+
+  def __do(self, http_method: str, endpoint: str, params: Dict = None, json: Dict = None, data: Union[Dict, List, Tuple, bytes] = None) -> Result:
+    '''
+    Perform HTTP Request and handle all exceptions
+
+    Requests wait for the rate limiter of the host. Rate limited requests are retried,
+    other failures only if the method is idempotent
+    '''
+    full_url = self.__url + endpoint
+    log_line_pre = f'method={http_method}, url={full_url}, params={params}'
+    log_line_post = ', '.join((log_line_pre, 'success={}, status_code={}, message={}'))
+    idempotent = http_method in APP_CENTER_CONSTANTS.API_IDEMPOTENT_METHODS
+    attempt = 0
+
+    while True:
+      attempt += 1
+      delay = self.__rate_limiter.reserve()
+      if delay > 0:
+        time.sleep(delay)
+
+      # Log HTTP params and perform an HTTP request, catching and re-raising any exceptions
+      try:
+        self.__logger.debug(msg=log_line_pre)
+        response = self.__send(http_method=http_method, full_url=full_url, params=params, json=json, data=data)
+      except ApiException as e:
+        # Without a response it is unknown if the server processed the request, only idempotent requests are sent again
+        no_response = isinstance(e.__cause__, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        if not (idempotent and no_response and attempt <= APP_CENTER_CONSTANTS.API_MAX_RETRIES):
+          raise
+        time.sleep(backoff_delay(attempt, initial_delay=APP_CENTER_CONSTANTS.API_RETRY_INITIAL_DELAY, max_delay=APP_CENTER_CONSTANTS.API_RETRY_MAX_DELAY))
+        continue
+
+      self.__rate_limiter.update(response.headers)
+
+      retry_delay = get_retry_delay(response.status_code, response.headers, idempotent=idempotent, attempt=attempt)
+      if retry_delay is None:
+        break
+
+      self.__logger.warning(msg=f'{log_line_pre}, status_code={response.status_code}, retrying in {retry_delay:.1f} seconds')
+      if is_rate_limited(response.status_code, response.headers):
+        # Every request to the host has to wait, not only this one
+        self.__rate_limiter.pause(retry_delay)
+      else:
+        time.sleep(retry_delay)
     
     # Deserialize JSON output to Python object, or return failed Result on exception
     try:
       data_out = response.json()
     except (ValueError, JSONDecodeError) as e:
       self.__logger.error(msg=log_line_post.format(False, None, e))
-      raise ApiException('Bad JSON in response') from e
+      raise ApiException('Bad JSON in response', status_code=response.status_code) from e
 
     # If status_code in 200-299 range, return success Result with data, otherwise raise exception
     is_success = 299 >= response.status_code >= 200
@@ -84,7 +160,7 @@ class ApiWrapper:
       return Result(response.status_code, message=response.reason, data=data_out)
     
     self.__logger.error(msg=log_line)
-    raise ApiException(f'{response.status_code}: {response.reason}')
+    raise ApiException(f'{response.status_code}: {response.reason}', status_code=response.status_code)
 
   def get(self, endpoint: str, params: Dict = None) -> Result:
     '''
@@ -3,6 +3,7 @@ from typing import Dict
 import urllib
 
 from api.api_wrapper import ApiWrapper
+from api.exceptions import ApiException
 from constants import app_center_constants as APP_CENTER_CONSTANTS
 
 class AppCenterApi:
@@ -15,9 +16,17 @@ class AppCenterApi:
       'accept': 'application/json',
       'Content-Type': 'application/json'
     }
+    self.__app_center_token = app_center_token
     self.__api = ApiWrapper('api.appcenter.ms', headers=headers)
     self.__logger = logging.getLogger(__name__)
 
+  @property
+  def app_center_token(self):
+    '''
+    App Center API token of the requests, the uploads of the apps of the token use it as well
+    '''
+    return self.__app_center_token
+
   def delete_app(self, app_name: str):
     '''
     Allows the user to delete the app
@@ -89,6 +98,100 @@ class AppCenterApi:
     result = self.__api.post(endpoint=endpoint, json=json)
     return result.data
 
+  def replace_app_config(self, app_name: str, branch: str, json: Dict):
+    '''
+    Public method to replace the existing pipeline configuration of a branch
+
+    Parameters
+    ----------
+    app_name : str
+      App name
+    branch : str
+      Branch name to configure the pipeline
+    json : dict
+      Request body sent to the server
+
+    Returns
+    ----------
+    data : Any
+    '''
+    formatted_branch = urllib.parse.quote_plus(f'{branch}')
+    endpoint = (f"{APP_CENTER_CONSTANTS.BASE_ENDPOINTS['app_base_endpoint']}/{app_name}/branches/{formatted_branch}/config")
+    result = self.__api.put(endpoint=endpoint, json=json)
+    return result.data
+
+  def __get_or_none(self, endpoint: str):
+    '''
+    Private method to read a resource that may not exist
+
+    Parameters
+    ----------
+    endpoint : str
+      The API endpoint
+
+    Returns
+    ----------
+    data : Any
+      Response data or None if the resource does not exist
+    '''
+    try:
+      return self.__api.get(endpoint=endpoint).data
+    except ApiException as e:
+      if e.status_code == 404:
+        return None
+      raise
+
+  def get_app(self, app_name: str):
+    '''
+    Public method to read an app
+
+    Parameters
+    ----------
+    app_name : str
+      App name
+
+    Returns
+    ----------
+    data : Any
+      App or None if the app does not exist
+    '''
+    return self.__get_or_none(endpoint=f"{APP_CENTER_CONSTANTS.BASE_ENDPOINTS['app_base_endpoint']}/{app_name}")
+
+  def get_repo_config(self, app_name: str):
+    '''
+    Public method to read the repositories linked with an app
+
+    Parameters
+    ----------
+    app_name : str
+      App name
+
+    Returns
+    ----------
+    data : Any
+      List of repository configurations or None if the app has no repository
+    '''
+    return self.__get_or_none(endpoint=f"{APP_CENTER_CONSTANTS.BASE_ENDPOINTS['app_base_endpoint']}/{app_name}/repo_config")
+
+  def get_branch_config(self, app_name: str, branch: str):
+    '''
+    Public method to read the pipeline configuration of a branch
+
+    Parameters
+    ----------
+    app_name : str
+      App name
+    branch : str
+      Branch name
+
+    Returns
+    ----------
+    data : Any
+      Pipeline configuration or None if the branch is not configured
+    '''
+    formatted_branch = urllib.parse.quote_plus(f'{branch}')
+    return self.__get_or_none(endpoint=f"{APP_CENTER_CONSTANTS.BASE_ENDPOINTS['app_base_endpoint']}/{app_name}/branches/{formatted_branch}/config")
+
   def upload_file_asset(self, app_name: str, json: Dict = {}):
     '''
     Public method to initiate the file upload for a given app
@@ -0,0 +1,98 @@
+import threading
+from requests.adapters import HTTPAdapter
+
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+
+class ConnectionPool:
+  '''
+  Keep-alive connections of a host shared by every api of the process
+
+  Every ApiWrapper keeps its own session, but mounts the adapter of its host,
+  so a connection opened by one api is reused by the next request of any other api to the same host
+  '''
+  __pools = {}
+  __registry_lock = threading.Lock()
+
+  def __init__(self, hostname: str, pool_size: int) -> None:
+    '''
+    Constructor for ConnectionPool Class
+
+    Parameters
+    ----------
+    hostname : str
+      Ex: api.github.com
+    pool_size : int
+      Maximum number of idle connections kept open to the host
+    '''
+    self.__hostname = hostname
+    self.__adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+
+  @classmethod
+  def for_host(cls, hostname: str):
+    '''
+    Get the pool of a host, creating it with its size from APP_CENTER_CONSTANTS.API_CONNECTION_POOL_SIZES on first use
+
+    Parameters
+    ----------
+    hostname : str
+      Ex: api.github.com
+
+    Returns
+    ----------
+    pool : ConnectionPool
+    '''
+    with cls.__registry_lock:
+      if hostname not in cls.__pools:
+        pool_size = APP_CENTER_CONSTANTS.API_CONNECTION_POOL_SIZES.get(hostname, APP_CENTER_CONSTANTS.API_DEFAULT_CONNECTION_POOL_SIZE)
+        cls.__pools[hostname] = cls(hostname=hostname, pool_size=pool_size)
+      return cls.__pools[hostname]
+
+  @classmethod
+  def all_stats(cls):
+    '''
+    Returns
+    ----------
+    stats : dict
+      Connection reuse statistics by host
+    '''
+    with cls.__registry_lock:
+      pools = dict(cls.__pools)
+    return {hostname: pool.stats() for hostname, pool in pools.items()}
+
+  def mount(self, session, url: str):
+    '''
+    Route the requests of a session to the shared pool
+
+    Parameters
+    ----------
+    session : Session
+      requests session
+    url : str
+      Base url of the host
+    '''
+    session.mount(url, self.__adapter)
+
+  def stats(self):
+    '''
+    Returns
+    ----------
+    stats : dict
+      Number of requests sent, connections opened and requests that reused an open connection
+    '''
+    requests_count = 0
+    connections_count = 0
+    pools = self.__adapter.poolmanager.pools
+    for key in pools.keys():
+      pool = pools.get(key)
+      if pool is None:
+        continue
+      requests_count += pool.num_requests
+      connections_count += pool.num_connections
+
+    reused_count = max(requests_count - connections_count, 0)
+    return {
+      'requests': requests_count,
+      'connections': connections_count,
+      'reused': reused_count,
+      'reuse_ratio': reused_count / requests_count if requests_count else 0,
+    }
@@ -2,4 +2,14 @@ class ApiException(Exception):
   '''
   Custom API Exception Class
   '''
-  pass
+  def __init__(self, message: str = '', status_code: int = None) -> None:
+    '''
+    Parameters
+    ----------
+    message : str
+      Error message
+    status_code : int
+      HTTP status code of the response. None if no response was received
+    '''
+    super().__init__(message)
+    self.status_code = status_code
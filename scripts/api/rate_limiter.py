@@ -0,0 +1,201 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict
+
+from backoff import backoff_delay
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+
+def parse_retry_after(headers, now: float = None):
+  '''
+  Parse the Retry-After header of a response
+
+  Parameters
+  ----------
+  headers : Mapping
+    Response headers
+  now : float
+    Current epoch time an HTTP date is compared with. Defaults to time.time()
+
+  Returns
+  ----------
+  delay : float
+    Seconds to wait before the next request or None if the header is missing or invalid
+  '''
+  value = headers.get('Retry-After')
+  if value is None:
+    return None
+
+  try:
+    return max(float(value), 0)
+  except ValueError:
+    pass
+
+  # Retry-After can also be an HTTP date
+  try:
+    return max(parsedate_to_datetime(value).timestamp() - (time.time() if now is None else now), 0)
+  except (TypeError, ValueError):
+    return None
+
+def is_rate_limited(status_code: int, headers):
+  '''
+  Check if a response reports that the rate limit of the host is exhausted
+
+  Parameters
+  ----------
+  status_code : int
+    Response status code
+  headers : Mapping
+    Response headers
+
+  Returns
+  ----------
+  rate_limited : bool
+  '''
+  # Github answers 403 instead of 429 once the rate limit is exhausted
+  return status_code == 429 or (status_code == 403 and headers.get('X-RateLimit-Remaining') == '0')
+
+def get_retry_delay(status_code: int, headers, idempotent: bool, attempt: int):
+  '''
+  Decide if a response is retried
+
+  Rate limited responses are retried, other APP_CENTER_CONSTANTS.API_RETRY_STATUS_CODES only if the request is idempotent.
+  The delay is the Retry-After of the response or an exponential backoff
+
+  Parameters
+  ----------
+  status_code : int
+    Response status code
+  headers : Mapping
+    Response headers
+  idempotent : bool
+    Sending the request again has the same effect as sending it once
+  attempt : int
+    Number of the attempt that got the response, starting at 1
+
+  Returns
+  ----------
+  delay : float
+    Seconds to wait before the retry or None if the response is final
+  '''
+  if attempt > APP_CENTER_CONSTANTS.API_MAX_RETRIES:
+    return None
+
+  if not is_rate_limited(status_code, headers) and not (idempotent and status_code in APP_CENTER_CONSTANTS.API_RETRY_STATUS_CODES):
+    return None
+
+  delay = parse_retry_after(headers)
+  if delay is None:
+    delay = backoff_delay(attempt, initial_delay=APP_CENTER_CONSTANTS.API_RETRY_INITIAL_DELAY, max_delay=APP_CENTER_CONSTANTS.API_RETRY_MAX_DELAY)
+
+  return delay if delay <= APP_CENTER_CONSTANTS.API_MAX_RATE_LIMIT_WAIT else None
+
+class HostRateLimiter:
+  '''
+  Token bucket shared by every request to a host
+
+  Every request takes a token. Tokens are refilled at rate per second up to burst.
+  The host can be paused as a whole, when it answers with Retry-After or reports an exhausted rate limit.
+  reserve does not block, it returns the delay the caller has to wait
+  '''
+  __limiters = {}
+  __registry_lock = threading.Lock()
+
+  def __init__(self, rate: float = None, burst: int = None, clock: Callable = time.monotonic, wall_clock: Callable = time.time) -> None:
+    '''
+    Constructor for HostRateLimiter Class
+
+    Parameters
+    ----------
+    rate : float
+      Requests per second. If None, requests are only delayed while the host is paused
+    burst : int
+      Requests that can be sent at once after an idle period. Defaults to rate
+    clock : Callable
+      Monotonic clock in seconds the tokens are refilled with
+    wall_clock : Callable
+      Epoch clock in seconds the X-RateLimit-Reset header is compared with
+    '''
+    self.__rate = rate
+    self.__burst = burst or rate or 1
+    self.__clock = clock
+    self.__wall_clock = wall_clock
+    self.__tokens = self.__burst
+    self.__updated_at = clock()
+    self.__paused_until = 0
+    self.__lock = threading.Lock()
+
+  @classmethod
+  def for_host(cls, hostname: str):
+    '''
+    Get the limiter of a host, creating it from APP_CENTER_CONSTANTS.API_RATE_LIMITS on first use
+
+    Parameters
+    ----------
+    hostname : str
+      Ex: api.github.com
+
+    Returns
+    ----------
+    limiter : HostRateLimiter
+    '''
+    with cls.__registry_lock:
+      if hostname not in cls.__limiters:
+        limits = APP_CENTER_CONSTANTS.API_RATE_LIMITS.get(hostname, {})
+        cls.__limiters[hostname] = cls(rate=limits.get('rate'), burst=limits.get('burst'))
+      return cls.__limiters[hostname]
+
+  def reserve(self):
+    '''
+    Take a token for a request
+
+    Returns
+    ----------
+    delay : float
+      Seconds the caller has to wait before sending the request
+    '''
+    with self.__lock:
+      now = self.__clock()
+      pause = max(self.__paused_until - now, 0)
+
+      if self.__rate is None:
+        return pause
+
+      self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated_at) * self.__rate)
+      self.__updated_at = now
+      # Tokens go negative while requests are queued, every queued request waits for its own refill
+      self.__tokens -= 1
+      return max(pause, -self.__tokens / self.__rate if self.__tokens < 0 else 0)
+
+  def pause(self, seconds: float):
+    '''
+    Stop sending requests to the host for a number of seconds
+
+    Parameters
+    ----------
+    seconds : float
+      Seconds to pause
+    '''
+    with self.__lock:
+      self.__paused_until = max(self.__paused_until, self.__clock() + seconds)
+
+  def update(self, headers: Dict):
+    '''
+    Pause the host until its rate limit resets, when a response reports that no request is remaining
+
+    Parameters
+    ----------
+    headers : Mapping
+      Response headers with [X-RateLimit-Remaining] and [X-RateLimit-Reset] (epoch seconds)
+    '''
+    remaining = headers.get('X-RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset')
+    if remaining is None or reset is None:
+      return
+
+    try:
+      if int(remaining) > 0:
+        return
+      self.pause(max(float(reset) - self.__wall_clock(), 0))
+    except ValueError:
+      return
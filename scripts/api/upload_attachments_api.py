@@ -1,5 +1,3 @@
-from typing import Dict
-
 from api.api_wrapper import ApiWrapper
 from constants import app_center_constants as APP_CENTER_CONSTANTS
 
@@ -70,3 +68,38 @@ class UploadAttachmentsApi:
     endpoint = f"{APP_CENTER_CONSTANTS.UPLOAD_BASE_URLS['upload_finished']}/{id}?token={url_encoded_token}"
     result = self.__api.post(endpoint=endpoint, json=json)
     return result.data
+
+  def upload_status(self, **kwargs):
+    '''
+    Upload status. Used to find the chunks that are still missing on the server when resuming an upload
+    
+    Parameters
+    ----------
+    kwargs : dict
+      [id], [url_encoded_token]
+    '''
+    id = kwargs.get('id', '')
+    url_encoded_token = kwargs.get('url_encoded_token', '')
+
+    endpoint = f"{APP_CENTER_CONSTANTS.UPLOAD_BASE_URLS['upload_status']}/{id}?token={url_encoded_token}"
+    result = self.__api.get(endpoint=endpoint)
+    return result.data
+
+  def cancel_upload(self, **kwargs):
+    '''
+    Cancel upload
+    
+    Parameters
+    ----------
+    json: dict
+      Request body
+    kwargs : dict
+      [id], [url_encoded_token], [json]
+    '''
+    id = kwargs.get('id', '')
+    url_encoded_token = kwargs.get('url_encoded_token', '')
+    json = kwargs.get('json', {})
+
+    endpoint = f"{APP_CENTER_CONSTANTS.UPLOAD_BASE_URLS['cancel_upload']}/{id}?token={url_encoded_token}"
+    result = self.__api.post(endpoint=endpoint, json=json)
+    return result.data
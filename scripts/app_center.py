@@ -1,10 +1,15 @@
 import sys
 import time
 import json
+from typing import Dict, List
 
+import tracing
+from backoff import retry_with_backoff
 from github import Github
 from key_vault import KeyVault
+from task_graph import TaskGraph
 from api.app_center_api import AppCenterApi
+from api.exceptions import ApiException
 from constants import app_center_constants as APP_CENTER_CONSTANTS
 
 '''
@@ -14,6 +19,11 @@ python3 app_center.py
 For non-dev mode:
 python3 app_center.py <arg> # arg can be anything except dev
 Ex: python3 app_center.py qa
+To update existing apps instead of creating them:
+python3 app_center.py [arg] --plan # print the changes only
+python3 app_center.py [arg] --reconcile # apply the changes
+To write the spans of the run to APP_CENTER_CONSTANTS.TRACE_PATH, open it in chrome://tracing or https://ui.perfetto.dev:
+python3 app_center.py [arg] --trace
 '''
 
 class AppCenterApp:
@@ -49,30 +59,68 @@ class AppCenter:
   '''
   Class to create an app in App Center, fetch secrets from Azure Key Vault and configure Pipeline
   '''
-  def __init__(self, environment: str) -> None:
+  def __init__(self, environment: str, **kwargs) -> None:
+    '''
+    Constructor for AppCenter Class
+
+    Parameters
+    ----------
+    environment : str
+      Environment name
+    kwargs : dict
+      Used to run without user input.
+      [app_center_token] App Center API token,
+      [app_center_api] AppCenterApi to share its HTTP session with other apps,
+      [apps] display_name, app_name, description and repo_url by OS,
+      [github] configured Github app,
+      [key_vault] configured KeyVault
+    '''
     self.__environment = environment
-    self.__app_center_api = None
-    self.__key_vault = KeyVault(environment=environment)
+    self.__app_center_token = kwargs.get('app_center_token')
+    self.__app_center_api = kwargs.get('app_center_api')
+    self.__apps = kwargs.get('apps')
+    self.__github = kwargs.get('github')
+    self.__key_vault = kwargs.get('key_vault') or KeyVault(environment=environment)
 
-  def __configure_repository(self, created_app):
+  def __configure_repository(self, created_app, repo_url: str):
     '''
     Private method to configure Repository for the App Center Apps
-    '''
-    if self.__environment != APP_CENTER_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
-      repo_url = input(f'Enter your Repository URL for configuration. You must have admin access to the repository: \n')
-    else:
-      repo_url = APP_CENTER_CONSTANTS.GITHUB_URL
 
-    print()
+    Parameters
+    ----------
+    created_app : dict
+      Created app
+    repo_url : str
+      Github repository url linked to the app
+    '''
     data = {'repo_url':  repo_url}
     app_name = created_app.get('name')
-    print(f'Waiting for app to come online {app_name}. Takes approximately 60 seconds')
-    time.sleep(60)
-    self.__app_center_api.repo_config(app_name=app_name, json=data)
-    print(f'Repository configured successfully for {app_name}')
+    print(f'Waiting for app to come online {app_name}')
+
+    # Poll until App Center accepts the repository configuration instead of waiting a fixed time
+    start_time = time.monotonic()
+    with tracing.span('app_center.wait_for_app', app=app_name, attempts=1) as span:
+      def on_retry(attempt, delay, e):
+        span.set(attempts=attempt + 1)
+        print(f'{app_name} is not online yet ({e}). Retrying in {delay:.1f} seconds')
+
+      retry_with_backoff(
+        lambda: self.__app_center_api.repo_config(app_name=app_name, json=data),
+        retry_on=(ApiException,),
+        timeout=APP_CENTER_CONSTANTS.APP_READINESS_TIMEOUT,
+        initial_delay=APP_CENTER_CONSTANTS.APP_READINESS_INITIAL_DELAY,
+        max_delay=APP_CENTER_CONSTANTS.APP_READINESS_MAX_DELAY,
+        on_retry=on_retry,
+        retry_if=self.__is_app_not_ready
+      )
+    print(f'Repository configured successfully for {app_name} after {time.monotonic() - start_time:.1f} seconds')
     print()
 
-  def __retrieve_pipeline_config_keyvault(self, app_name: str, platform: str, env_name: str):
+  def __is_app_not_ready(self, e: ApiException):
+    # Without a status code no response was received, the request is worth another attempt
+    return e.status_code is None or e.status_code in APP_CENTER_CONSTANTS.APP_READINESS_RETRY_STATUS_CODES or e.status_code >= 500
+
+  def __retrieve_pipeline_config_keyvault(self, app_name: str, platform: str, env_name: str, upload: bool = True):
     '''
     Private method to contruct pipeline configuration for keyvault
     
@@ -84,56 +132,83 @@ class AppCenter:
       Platform name
     env_name : str
       Environment name from which the secrets are extracted from
+    upload : bool
+      Upload the certificates. If False, the upload ids of their previous uploads are used, see KeyVault.get_vault_secrets
     '''
 
-    return self.__key_vault.get_vault_secrets(app_name=app_name, platform=platform, env_name=env_name)
+    # The certificates are uploaded to the App Center account of the app
+    return self.__key_vault.get_vault_secrets(app_name=app_name, platform=platform, env_name=env_name, app_center_api=self.__app_center_api, upload=upload)
 
-  def __configure_pipeline(self, created_app):
+  def __configure_pipeline(self, created_app, env, replace: bool = False):
     '''
-    Private method to configure pipeline for all the created apps for each environment/branche
+    Private method to configure pipeline of a created app for one environment/branch
     
     Parameters
     ----------
     created_app : dict
       Created app
+    env : dict
+      Environment name and branch from APP_CENTER_CONSTANTS.ENVIRONMENTS
+    replace : bool
+      Replace the existing configuration of the branch instead of creating it
     '''
-    for env in APP_CENTER_CONSTANTS.ENVIRONMENTS:
-      env_name = env['env_name']
-      branch = env['branch']
-      app_name = created_app.get('name')
-      os = created_app.get('os')
-      app_display_name = created_app.get('display_name')
+    env_name = env['env_name']
+    branch = env['branch']
+    app_name = created_app.get('name')
+    os = created_app.get('os')
+    app_display_name = created_app.get('display_name')
 
-      print()
-      # Extract config from a reference app or Keyvault
+    print()
+    # Extract config from a reference app or Keyvault
+    with tracing.span('app_center.pipeline_config', app=app_name, env=env_name):
       pipeline_config = self.__retrieve_pipeline_config_keyvault(app_name=app_name, platform=os, env_name=env_name)
-      
-      print(f'Configuring Pipeline for Branch - {branch} of {app_display_name}')
-      self.__app_center_api.update_app_config(app_name=app_name, branch=branch, json=pipeline_config)
-      
-      print(f'Successfully Configured Pipeline for {app_name}')
-      print()
+    
+    print(f'Configuring Pipeline for Branch - {branch} of {app_display_name}')
+    with tracing.span('app_center.write_branch_config', app=app_name, branch=branch, replace=replace):
+      if replace:
+        self.__app_center_api.replace_app_config(app_name=app_name, branch=branch, json=pipeline_config)
+      else:
+        self.__app_center_api.update_app_config(app_name=app_name, branch=branch, json=pipeline_config)
+    
+    print(f'Successfully Configured Pipeline for {app_name} on {branch}')
+    print()
 
-  def __create_app_center_apps(self):
+  def __get_app_center_apps(self):
     '''
-    Private method to create Apps in App Center
+    Private method to obtain the Apps to create in App Center and the repository to link them with.
+    If environment is dev, default constants are utilized.
+    Else, user is promted with questions
+
+    Returns
+    ----------
+    apps : list
+      AppCenterApp and repository url of every OS
     '''
+    apps = []
+
     for i in range(len(APP_CENTER_CONSTANTS.OS)):
       os = APP_CENTER_CONSTANTS.OS[i]
 
-      if self.__environment != APP_CENTER_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
+      if self.__apps is not None:
+        app_display_name = self.__apps[os]['display_name']
+        app_name = self.__apps[os].get('app_name', '')
+        app_description = self.__apps[os].get('description', '')
+        repo_url = self.__apps[os]['repo_url']
+      elif self.__environment != APP_CENTER_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
         app_display_name = input(f'Enter your App Center Display Name for {os}: \n')
         print()
         app_name = input(f'Enter your App Center App ID for {os}: \n')
         print()
         app_description = input(f'Enter short description for your {os} App: \n')
         print()
+        repo_url = input(f'Enter your Repository URL for configuration. You must have admin access to the repository: \n')
+        print()
       else:
         app_display_name = f'hello'.lower()
         app_name = ''
         app_description = ''
+        repo_url = APP_CENTER_CONSTANTS.GITHUB_URL
 
-      
       app = AppCenterApp(
         display_name=app_display_name, 
         app_name=app_name, 
@@ -142,35 +217,290 @@ class AppCenter:
         platform=APP_CENTER_CONSTANTS.PLATFORM, 
         release_type=APP_CENTER_CONSTANTS.RELEASE_TYPE
       )
-      # Creating the app
-      app_json = app.get_json()
-      print(f"Creating {os} App with Display Name as {app_json['display_name']} and App ID as {app_json['name']}")
-      created_app = self.__app_center_api.create_app(app_json)
+      apps.append({'app': app, 'repo_url': repo_url})
 
-      # Configure Repository
-      self.__configure_repository(created_app=created_app)
+    return apps
 
-      # Configure pipeline
-      self.__configure_pipeline(created_app=created_app) 
+  def __create_app_center_app(self, app: AppCenterApp):
+    '''
+    Private method to create an App in App Center
 
-  def init_app(self):
+    Parameters
+    ----------
+    app : AppCenterApp
+      App to create
+
+    Returns
+    ----------
+    created_app : dict
+      Created app
     '''
-    Initiate the app creation process
+    app_json = app.get_json()
+    print(f"Creating {app_json['os']} App with Display Name as {app_json['display_name']} and App ID as {app_json['name']}")
+    with tracing.span('app_center.create_app', app=app_json['name'], os=app_json['os']):
+      return self.__app_center_api.create_app(app_json)
+
+  def __build_task_graph(self, apps, github: Github, plan: List[Dict] = None):
+    '''
+    Private method to model the provisioning as a task graph
+
+    The Github branches, the vault reads of every environment and the creation of every app are independent.
+    Each app is linked to its repository once it exists, and every branch of the app is configured
+    once the repository is linked, the branch exists and the secrets of its environment are read
+
+    Parameters
+    ----------
+    apps : list
+      AppCenterApp and repository url of every OS
+    github : Github
+      Github app that creates the branches
+    plan : list
+      Planned actions of every app from __plan_app. If given, only the resources that are missing or changed are written
+
+    Returns
+    ----------
+    graph : TaskGraph
+    '''
+    graph = TaskGraph(max_workers=APP_CENTER_CONSTANTS.PROVISIONING_MAX_WORKERS, host_limits=APP_CENTER_CONSTANTS.PROVISIONING_HOST_LIMITS)
+
+    if plan is None:
+      plan = [self.__get_create_plan(app_definition) for app_definition in apps]
+
+    github_task = graph.add_task('github:branches', lambda results: github.init_app(skip_existing_branches=True), host='github')
+
+    # Only read the vaults of the environments with a branch to configure
+    vault_tasks = {}
+    for env in APP_CENTER_CONSTANTS.ENVIRONMENTS:
+      env_name = env['env_name']
+      if not any(app_plan['actions'][env['branch']] in ['create', 'update'] for app_plan in plan):
+        continue
+      vault_tasks[env_name] = graph.add_task(
+        f'vault:{env_name}',
+        lambda results, env_name=env_name: self.__key_vault.prefetch_vault_secrets(env_name=env_name),
+        host='key_vault'
+      )
+
+    for app_definition, app_plan in zip(apps, plan):
+      app = app_definition['app']
+      repo_url = app_definition['repo_url']
+      app_key = app.get_json()['name']
+      actions = app_plan['actions']
+
+      if actions['app'] == 'create':
+        create_task = graph.add_task(
+          f'app:{app_key}:create',
+          lambda results, app=app: self.__create_app_center_app(app),
+          host='app_center'
+        )
+      else:
+        create_task = graph.add_task(f'app:{app_key}:create', lambda results, app_plan=app_plan: app_plan['existing_app'])
+
+      dependencies = [create_task]
+      if actions['repo_config'] == 'create':
+        dependencies.append(graph.add_task(
+          f'app:{app_key}:repo_config',
+          lambda results, create_task=create_task, repo_url=repo_url: self.__configure_repository(created_app=results[create_task], repo_url=repo_url),
+          dependencies=[create_task],
+          host='app_center'
+        ))
+
+      for env in APP_CENTER_CONSTANTS.ENVIRONMENTS:
+        action = actions[env['branch']]
+        if action not in ['create', 'update']:
+          continue
+        graph.add_task(
+          f"app:{app_key}:pipeline:{env['branch']}",
+          lambda results, create_task=create_task, env=env, action=action: self.__configure_pipeline(created_app=results[create_task], env=env, replace=action == 'update'),
+          dependencies=[*dependencies, github_task, vault_tasks[env['env_name']]],
+          host='app_center'
+        )
+
+    return graph
+
+  def __get_create_plan(self, app_definition: Dict):
+    '''
+    Private method to plan the creation of every resource of an app without reading the current state
+
+    Parameters
+    ----------
+    app_definition : dict
+      AppCenterApp and repository url
+
+    Returns
+    ----------
+    app_plan : dict
+      [app_name], [existing_app] and [actions] by resource
+    '''
+    actions = {'app': 'create', 'repo_config': 'create'}
+    for env in APP_CENTER_CONSTANTS.ENVIRONMENTS:
+      actions[env['branch']] = 'create'
+
+    return {'app_name': app_definition['app'].get_json()['name'], 'existing_app': None, 'actions': actions}
+
+  def __normalize_repo_url(self, repo_url: str):
+    repo_url = (repo_url or '').strip().rstrip('/')
+    return repo_url[:-len('.git')] if repo_url.endswith('.git') else repo_url
+
+  def __plan_app(self, app_definition: Dict):
+    '''
+    Private method to compare the current state of an app in App Center with the desired state
+
+    The app, its repository configuration and the configuration of every branch are read.
+    A branch is unchanged if its configuration matches the configuration built from the current Key Vault secrets.
+    Planning writes nothing: the certificates are not uploaded, a certificate is unchanged if the branch refers to
+    the upload of the same content recorded in the upload cache
+
+    Parameters
+    ----------
+    app_definition : dict
+      AppCenterApp and repository url
+
+    Returns
+    ----------
+    app_plan : dict
+      [app_name], [existing_app] and [actions] by resource. Actions are create, update, unchanged or conflict
     '''
+    app_plan = self.__get_create_plan(app_definition)
+    app_name = app_plan['app_name']
+    platform = app_definition['app'].get_json()['os']
+    actions = app_plan['actions']
+
+    existing_app = self.__app_center_api.get_app(app_name=app_name)
+    if existing_app is None:
+      return app_plan
+
+    app_plan['existing_app'] = existing_app
+    actions['app'] = 'unchanged'
+
+    repo_configs = self.__app_center_api.get_repo_config(app_name=app_name) or []
+    linked_repo_urls = [self.__normalize_repo_url(repo_config.get('repo_url')) for repo_config in repo_configs]
+    if self.__normalize_repo_url(app_definition['repo_url']) in linked_repo_urls:
+      actions['repo_config'] = 'unchanged'
+    elif linked_repo_urls:
+      # App Center links a single repository, the app has to be unlinked manually first
+      actions['repo_config'] = 'conflict'
+      for env in APP_CENTER_CONSTANTS.ENVIRONMENTS:
+        actions[env['branch']] = 'conflict'
+      return app_plan
+    else:
+      return app_plan
+
+    for env in APP_CENTER_CONSTANTS.ENVIRONMENTS:
+      branch = env['branch']
+      branch_config = self.__app_center_api.get_branch_config(app_name=app_name, branch=branch)
+      if branch_config is None:
+        continue
+
+      desired_config = self.__retrieve_pipeline_config_keyvault(app_name=app_name, platform=platform, env_name=env['env_name'], upload=False)
+      actions[branch] = 'unchanged' if self.__config_matches(desired_config, branch_config) else 'update'
+
+    return app_plan
 
+  def __config_matches(self, desired, current):
     '''
+    Private method to compare a desired pipeline configuration with the configuration returned by App Center
+
+    Every field of the desired configuration must have the same value in the current one. Fields only App Center sets,
+    such as the id, are ignored, and so are the write-only APP_CENTER_CONSTANTS.PIPELINE_WRITE_ONLY_FIELDS App Center does not return.
+    Environment variables are compared by name regardless of their order
+
+    Returns
+    ----------
+    matches : bool
+    '''
+    if isinstance(desired, dict):
+      if not isinstance(current, dict):
+        return False
+
+      for key, value in desired.items():
+        if key not in current:
+          if key in APP_CENTER_CONSTANTS.PIPELINE_WRITE_ONLY_FIELDS:
+            continue
+          return False
+        if key == 'environmentVariables':
+          if not self.__variables_match(value, current[key]):
+            return False
+        elif not self.__config_matches(value, current[key]):
+          return False
+      return True
+
+    if isinstance(desired, list):
+      return isinstance(current, list) and len(desired) == len(current) and all(self.__config_matches(value, current_value) for value, current_value in zip(desired, current))
+
+    return desired == current
+
+  def __variables_match(self, desired: List[Dict], current: List[Dict]):
+    '''
+    Private method to compare environment variables by name. An added or removed variable is drift as well
+    '''
+    current_variables = {variable.get('name'): variable for variable in current or []}
+    if set(current_variables) != {variable['name'] for variable in desired}:
+      return False
+
+    # Secret variables are returned without their value
+    return all(
+      'value' not in current_variables[variable['name']] or current_variables[variable['name']]['value'] == variable.get('value')
+      for variable in desired
+    )
+
+  def __print_plan(self, plan: List[Dict]):
+    '''
+    Private method to print the planned actions of every app
+    '''
+    for app_plan in plan:
+      print(f"Plan for {app_plan['app_name']}")
+      for resource, action in app_plan['actions'].items():
+        print(f'  {resource}: {action}')
+      print()
+
+  def __create_app_center_api(self):
+    '''
+    Private method to create the App Center api, unless one was passed to the constructor.
     If environment is dev, default constants are utilized.
     Else, user is promted with questions
     '''
-    if self.__environment != APP_CENTER_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
-      app_center_token = input(f'Enter your App Center API Token: \n')
-      print()
-    else:
-      app_center_token = APP_CENTER_CONSTANTS.APP_CENTER_TOKEN
+    if self.__app_center_api is None:
+      if self.__app_center_token is not None:
+        app_center_token = self.__app_center_token
+      elif self.__environment != APP_CENTER_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
+        app_center_token = input(f'Enter your App Center API Token: \n')
+        print()
+      else:
+        app_center_token = APP_CENTER_CONSTANTS.APP_CENTER_TOKEN
+
+      # Create a app_center api
+      self.__app_center_api = AppCenterApi(app_center_token=app_center_token)
+
+  def __resolve_inputs(self):
+    '''
+    Private method to collect every user input up front, the provisioning itself runs concurrently
+
+    Returns
+    ----------
+    github : Github
+      Github app with resolved credentials
+    apps : list
+      AppCenterApp and repository url of every OS
+    '''
+    github = self.__github or Github(environment=self.__environment)
+    github.resolve_credentials()
+    apps = self.__get_app_center_apps()
+    for env in APP_CENTER_CONSTANTS.ENVIRONMENTS:
+      self.__key_vault.resolve_vault_urls(env_name=env['env_name'])
+
+    return github, apps
+
+  def init_app(self):
+    '''
+    Initiate the app creation process
+
+    Returns
+    ----------
+    created_apps : list
+      Apps created in App Center
+    '''
+    self.__create_app_center_api()
 
-    # Create a app_center api
-    self.__app_center_api = AppCenterApi(app_center_token=app_center_token)
-    
     '''
     For Development ONLY,
     delete the apps created, before performing the next set of actions
@@ -180,30 +510,86 @@ class AppCenter:
         self.__app_center_api.delete_app(app_name=app_name)
         # pass
 
-    # Create develop and qa branches for github
-    print(f'Creating develop and qa branches for the selected repository')
-    print()
-    github = Github(environment=self.__environment)
-    github.init_app()
+    github, apps = self.__resolve_inputs()
+
+    # Create develop and qa branches for github, create app center apps and configure their pipelines
+    print(f'Creating develop and qa branches for the selected repository and the App Center apps')
     print()
+    graph = self.__build_task_graph(apps=apps, github=github)
+    with tracing.span('app_center.init_app'):
+      results = graph.run()
+
+    return [results[f"app:{app['app'].get_json()['name']}:create"] for app in apps]
+
+  def reconcile(self, apply: bool = True):
+    '''
+    Bring existing App Center apps to the desired state instead of recreating them
+
+    The current state of every app is read first and compared with the desired state.
+    Only missing apps, repository configurations and branches, and branches whose configuration differs from the one
+    built from the Key Vault secrets, are written. The secrets of an environment are read once.
+    Computing the plan uploads nothing, the certificates are only uploaded for the branches that are written
+
+    Parameters
+    ----------
+    apply : bool
+      Apply the planned actions. If False, only the plan is computed and printed
+
+    Returns
+    ----------
+    plan : list
+      [app_name] and [actions] by resource of every app
+    '''
+    self.__create_app_center_api()
+    github, apps = self.__resolve_inputs()
+
+    # Read the current state of the apps concurrently
+    graph = TaskGraph(max_workers=APP_CENTER_CONSTANTS.PROVISIONING_MAX_WORKERS, host_limits=APP_CENTER_CONSTANTS.PROVISIONING_HOST_LIMITS)
+    for app_definition in apps:
+      graph.add_task(app_definition['app'].get_json()['name'], lambda results, app_definition=app_definition: self.__plan_app(app_definition), host='app_center')
+    with tracing.span('app_center.plan'):
+      results = graph.run()
+    plan = [results[app_definition['app'].get_json()['name']] for app_definition in apps]
 
-    # Create app center apps
-    self.__create_app_center_apps()
+    self.__print_plan(plan)
+
+    if apply:
+      with tracing.span('app_center.reconcile'):
+        self.__build_task_graph(apps=apps, github=github, plan=plan).run()
+
+    return [{'app_name': app_plan['app_name'], 'actions': app_plan['actions']} for app_plan in plan]
 
 def main():
-  arg_length = len(sys.argv)
+  # --plan prints the actions reconcile would take, --reconcile applies them
+  flags = [arg for arg in sys.argv if arg.startswith('--')]
+  args = [arg for arg in sys.argv if not arg.startswith('--')]
+  arg_length = len(args)
 
   # Defaults to development environment
   environment = APP_CENTER_CONSTANTS.DEVELOPMENT_ENVIRONMENT
 
   # If non-dev environment, argument should be passed
   if arg_length == 2:
-    environment = str(sys.argv[0])
+    environment = str(args[0])
 
   appcenter_app = AppCenter(environment=environment)
+
+  if '--trace' in flags:
+    tracing.Tracer.shared().enable()
   
   # Invoke the appcenter app
-  appcenter_app.init_app()
+  try:
+    if '--plan' in flags:
+      appcenter_app.reconcile(apply=False)
+    elif '--reconcile' in flags:
+      appcenter_app.reconcile()
+    else:
+      appcenter_app.init_app()
+  finally:
+    # A failed run is the one worth looking at
+    if '--trace' in flags:
+      tracing.Tracer.shared().export(APP_CENTER_CONSTANTS.TRACE_PATH)
+      print(f'Trace written to {APP_CENTER_CONSTANTS.TRACE_PATH}')
 
 if __name__ == '__main__':
   main()
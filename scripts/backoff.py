@@ -0,0 +1,77 @@
+import random
+import time
+from typing import Callable, Tuple, Type
+
+def backoff_delay(attempt: int, initial_delay: float = 1.0, max_delay: float = 16.0, multiplier: float = 2.0):
+  '''
+  Compute the exponential backoff delay of an attempt with jitter
+
+  Parameters
+  ----------
+  attempt : int
+    Number of the failed attempt, starting at 1
+  initial_delay : float
+    Delay after the first failed attempt in seconds
+  max_delay : float
+    Upper bound of the delay in seconds
+  multiplier : float
+    Growth factor of the delay per attempt
+
+  Returns
+  ----------
+  delay : float
+    Half of the exponential delay plus a random share of the other half, so parallel callers do not retry in lockstep
+  '''
+  delay = min(max_delay, initial_delay * multiplier ** (attempt - 1))
+  return delay / 2 + random.uniform(0, delay / 2)
+
+def retry_with_backoff(operation: Callable, retry_on: Tuple[Type[BaseException], ...] = (Exception,), timeout: float = None, max_attempts: int = None, on_retry: Callable = None, retry_if: Callable = None, **kwargs):
+  '''
+  Call an operation until it succeeds, sleeping with exponential backoff and jitter between the attempts
+
+  Parameters
+  ----------
+  operation : Callable
+    Operation without arguments
+  retry_on : tuple
+    Exception types that trigger a retry. Any other exception is raised immediately
+  timeout : float
+    Overall deadline in seconds. The last exception is raised once it is exceeded
+  max_attempts : int
+    Maximum number of attempts. The last exception is raised once it is reached
+  on_retry : Callable
+    Called with the attempt number, the delay and the exception before sleeping
+  retry_if : Callable
+    Called with an exception of retry_on. The exception is raised immediately if it returns False
+  kwargs : dict
+    [initial_delay], [max_delay], [multiplier] passed to backoff_delay
+
+  Returns
+  ----------
+  result : Any
+    Return value of the operation
+  '''
+  deadline = time.monotonic() + timeout if timeout is not None else None
+  attempt = 0
+
+  while True:
+    try:
+      return operation()
+    except retry_on as e:
+      if retry_if is not None and not retry_if(e):
+        raise
+
+      attempt += 1
+      if max_attempts is not None and attempt >= max_attempts:
+        raise
+
+      delay = backoff_delay(attempt, **kwargs)
+      if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+          raise
+        delay = min(delay, remaining)
+
+      if on_retry is not None:
+        on_retry(attempt, delay, e)
+      time.sleep(delay)
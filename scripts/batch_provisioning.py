@@ -0,0 +1,275 @@
+import json
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import tracing
+from api.app_center_api import AppCenterApi
+from api.github_api import GithubApi
+from app_center import AppCenter
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+from credential_cache import CachedCredential
+from github import Github
+from key_vault import KeyVault, KeyVaultWriteException
+from local_secret_client import LocalSecretClient
+from upload_cache import UploadCache
+
+'''
+To run the app
+python3 batch_provisioning.py <manifest> [report]
+Ex: python3 batch_provisioning.py oems.json report.json
+
+The manifest lists every OEM to provision:
+{
+  "app_center_token": "...",
+  "github_token": "...",
+  "max_workers": 4,
+  "oems": [
+    {
+      "name": "oem-1",
+      "repo_name": "owner/repo_name",
+      "repo_url": "https://github.com/owner/repo_name",
+      "apps": {
+        "Android": {"display_name": "...", "app_name": "...", "description": "..."},
+        "iOS": {"display_name": "...", "app_name": "...", "description": "..."}
+      },
+      "vault_urls": {
+        "dev": {"common_vault_url": "...", "oem_vault_url": "..."},
+        "qa": {"common_vault_url": "...", "oem_vault_url": "..."},
+        "prod": {"common_vault_url": "...", "oem_vault_url": "..."}
+      },
+      "certificates": {
+        "mobileprovision_path": "...", "p12_path": "...", "keystore_path": "...",
+        "p12_password": "...", "keystore_password": "..."
+      },
+      "sync_vaults": true,
+      "template_directory": "..."
+    }
+  ],
+  "local_vaults": {"directory": "...", "latency": 0.05, "jitter": 0.01},
+  "trace": "trace.json"
+}
+Tokens can be set per OEM as well, they override the tokens of the manifest
+With [local_vaults], the secrets are kept in local vaults instead of Azure Key Vault, see LocalSecretClient
+With [trace], the spans of the run are written to the file in the Chrome trace format, see tracing.py
+'''
+
+class BatchProvisioning:
+  '''
+  Class to provision many OEMs from a manifest without user input
+
+  OEMs are provisioned concurrently by a bounded worker pool.
+  HTTP sessions are shared per token, the Azure credential and the upload cache are shared by every OEM
+  '''
+  def __init__(self, manifest: Dict, max_workers: int = None, upload_cache: UploadCache = None) -> None:
+    '''
+    Constructor for BatchProvisioning Class
+
+    Parameters
+    ----------
+    manifest : dict
+      Tokens and list of OEMs to provision
+    max_workers : int
+      Maximum number of OEMs provisioned at the same time. Defaults to the manifest value or BATCH_MAX_WORKERS
+    upload_cache : UploadCache
+      Cache of the certificate uploads shared by every OEM. Defaults to the UploadCache persisted in the user cache directory
+    '''
+    self.__manifest = manifest
+    self.__max_workers = max_workers or manifest.get('max_workers') or APP_CENTER_CONSTANTS.BATCH_MAX_WORKERS
+    self.__credential = CachedCredential.shared()
+    local_vaults = manifest.get('local_vaults')
+    self.__secret_client_factory = LocalSecretClient.factory(**local_vaults) if local_vaults is not None else None
+    self.__upload_cache = upload_cache or UploadCache()
+    self.__app_center_apis = {}
+    self.__github_apis = {}
+    self.__lock = threading.Lock()
+
+  def __get_app_center_api(self, app_center_token: str):
+    '''
+    Private method to get the App Center api of a token, so OEMs using the same token share the HTTP session
+    '''
+    with self.__lock:
+      if app_center_token not in self.__app_center_apis:
+        self.__app_center_apis[app_center_token] = AppCenterApi(app_center_token=app_center_token)
+      return self.__app_center_apis[app_center_token]
+
+  def __get_github_api(self, github_token: str):
+    '''
+    Private method to get the Github api of a token, so OEMs using the same token share the HTTP session
+    '''
+    with self.__lock:
+      if github_token not in self.__github_apis:
+        self.__github_apis[github_token] = GithubApi(github_token=github_token)
+      return self.__github_apis[github_token]
+
+  def __validate(self, oems: List[Dict]):
+    '''
+    Private method to check the manifest before anything is provisioned
+
+    Raises
+    ----------
+    ValueError
+      If an OEM misses a required field
+    '''
+    names = set()
+    for index, oem in enumerate(oems):
+      name = oem.get('name', f'#{index}')
+      missing = [field for field in APP_CENTER_CONSTANTS.BATCH_REQUIRED_FIELDS if field not in oem]
+      missing += [os for os in APP_CENTER_CONSTANTS.OS if os not in oem.get('apps', {})]
+      missing += [env['env_name'] for env in APP_CENTER_CONSTANTS.ENVIRONMENTS if env['env_name'] not in oem.get('vault_urls', {})]
+      if not oem.get('app_center_token', self.__manifest.get('app_center_token')):
+        missing.append('app_center_token')
+      if not oem.get('github_token', self.__manifest.get('github_token')):
+        missing.append('github_token')
+      # Syncing the vaults sets the certificates, nobody is there to be asked for them
+      if oem.get('sync_vaults', False):
+        certificates = oem.get('certificates') or {}
+        missing += [f'certificates.{field}' for field in APP_CENTER_CONSTANTS.BATCH_CERTIFICATE_FIELDS if field not in certificates]
+
+      if missing:
+        raise ValueError(f'OEM {name} is missing: {", ".join(missing)}')
+      if name in names:
+        raise ValueError(f'OEM {name} is listed more than once')
+      names.add(name)
+
+  def __provision_oem(self, oem: Dict):
+    '''
+    Private method to provision a single OEM
+
+    Parameters
+    ----------
+    oem : dict
+      OEM entry of the manifest
+
+    Returns
+    ----------
+    result : dict
+      Report of the OEM
+    '''
+    start = time.monotonic()
+    result = {
+      'name': oem['name'],
+      'status': 'succeeded',
+      'error': None,
+      'apps': [],
+      'vault_sync': None,
+    }
+
+    try:
+      app_center_token = oem.get('app_center_token', self.__manifest.get('app_center_token'))
+      github_token = oem.get('github_token', self.__manifest.get('github_token'))
+
+      key_vault = KeyVault(
+        environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+        vault_urls=oem['vault_urls'],
+        certificates=oem.get('certificates'),
+        template_directory=oem.get('template_directory'),
+        credential=self.__credential,
+        upload_cache=self.__upload_cache,
+        secret_client_factory=self.__secret_client_factory,
+      )
+
+      if oem.get('sync_vaults', False):
+        print(f"[{oem['name']}] Setting Key Vault secrets")
+        try:
+          result['vault_sync'] = key_vault.set_vault_secrets(incremental=True)
+        except KeyVaultWriteException as e:
+          # Keep the secrets that were set in the report
+          result['vault_sync'] = e.report
+          raise
+
+      github = Github(
+        environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+        github_token=github_token,
+        repo_name=oem['repo_name'],
+        github_api=self.__get_github_api(github_token=github_token),
+      )
+
+      apps = {
+        os: {**oem['apps'][os], 'repo_url': oem['apps'][os].get('repo_url', oem['repo_url'])}
+        for os in APP_CENTER_CONSTANTS.OS
+      }
+
+      app_center = AppCenter(
+        environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+        app_center_api=self.__get_app_center_api(app_center_token=app_center_token),
+        apps=apps,
+        github=github,
+        key_vault=key_vault,
+      )
+
+      print(f"[{oem['name']}] Provisioning App Center apps")
+      created_apps = app_center.init_app()
+      result['apps'] = [{'name': app['name'], 'display_name': app['display_name'], 'os': app['os']} for app in created_apps]
+    except Exception as e:
+      result['status'] = 'failed'
+      result['error'] = f'{type(e).__name__}: {e}'
+      result['traceback'] = traceback.format_exc()
+      print(f"[{oem['name']}] Failed: {result['error']}")
+
+    result['duration'] = time.monotonic() - start
+    return result
+
+  def run(self):
+    '''
+    Provision every OEM of the manifest. A failing OEM does not stop the others
+
+    Returns
+    ----------
+    report : dict
+      Report of every OEM in manifest order with the number of succeeded and failed OEMs
+    '''
+    oems = self.__manifest.get('oems', [])
+    self.__validate(oems)
+
+    def provision_oem(oem: Dict):
+      with tracing.span('batch.provision_oem', oem=oem['name']):
+        return self.__provision_oem(oem)
+
+    start = time.monotonic()
+    with tracing.span('batch.run', oems=len(oems)), ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='oem') as executor:
+      results = list(executor.map(tracing.propagate(provision_oem), oems))
+
+    succeeded = len([result for result in results if result['status'] == 'succeeded'])
+    return {
+      'succeeded': succeeded,
+      'failed': len(results) - succeeded,
+      'duration': time.monotonic() - start,
+      'oems': results,
+    }
+
+def main():
+  if len(sys.argv) < 2:
+    print('Usage: python3 batch_provisioning.py <manifest> [report]')
+    sys.exit(1)
+
+  manifest_path = sys.argv[1]
+  report_path = sys.argv[2] if len(sys.argv) > 2 else APP_CENTER_CONSTANTS.BATCH_REPORT_PATH
+
+  with open(manifest_path, 'r') as file:
+    manifest = json.load(file)
+
+  trace_path = manifest.get('trace')
+  if trace_path:
+    tracing.Tracer.shared().enable()
+
+  report = BatchProvisioning(manifest=manifest).run()
+
+  if trace_path:
+    tracing.Tracer.shared().export(trace_path)
+    print(f'Trace written to {trace_path}')
+
+  with open(report_path, 'w') as file:
+    json.dump(report, file, indent=2)
+
+  print()
+  print(f"{report['succeeded']} OEMs succeeded, {report['failed']} OEMs failed. Report written to {report_path}")
+
+  if report['failed']:
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
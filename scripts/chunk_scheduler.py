@@ -0,0 +1,178 @@
+import threading
+from collections import deque
+from typing import Iterable, List
+
+class ChunkScheduler:
+  '''
+  Class to schedule the chunks of a file upload
+
+  Every chunk moves through an explicit state machine
+  NEW -> QUEUED -> INFLIGHT -> COMPLETED, and back to QUEUED when an upload attempt fails.
+  The state of every chunk is kept in a bytearray indexed by the chunk number and the queued chunks in a deque,
+  so enqueueing, scheduling and completing a chunk are all O(1) and independent of the size of the file
+  '''
+  NEW = 0
+  QUEUED = 1
+  INFLIGHT = 2
+  COMPLETED = 3
+
+  def __init__(self, total_blocks: int) -> None:
+    '''
+    Constructor for ChunkScheduler Class
+
+    Parameters
+    ----------
+    total_blocks : int
+      Total number of chunks of the file. Chunk numbers start at 1
+    '''
+    self.__total_blocks = total_blocks
+    self.__states = bytearray(total_blocks + 1)
+    self.__queue = deque()
+    self.__queued_count = 0
+    self.__inflight_count = 0
+    self.__completed_count = 0
+    self.__lock = threading.Lock()
+
+  @property
+  def total_blocks(self):
+    return self.__total_blocks
+
+  @property
+  def queued_count(self):
+    return self.__queued_count
+
+  @property
+  def inflight_count(self):
+    return self.__inflight_count
+
+  @property
+  def completed_count(self):
+    return self.__completed_count
+
+  def __validate(self, chunk_number: int):
+    if not 1 <= chunk_number <= self.__total_blocks:
+      raise ValueError(f'Chunk number {chunk_number} is out of range 1-{self.__total_blocks}')
+
+  def enqueue(self, chunks: Iterable[int]):
+    '''
+    Queue the chunks that must be uploaded. Chunks that are already queued, inflight or completed are ignored
+
+    Parameters
+    ----------
+    chunks : list(int)
+      Chunk numbers to upload
+    '''
+    with self.__lock:
+      for chunk_number in chunks:
+        self.__validate(chunk_number)
+        if self.__states[chunk_number] == self.NEW:
+          self.__states[chunk_number] = self.QUEUED
+          self.__queued_count += 1
+          self.__queue.append(chunk_number)
+
+  def mark_completed(self, chunks: Iterable[int]):
+    '''
+    Mark chunks as completed without uploading them. Used for chunks the server already has
+
+    Parameters
+    ----------
+    chunks : list(int)
+      Chunk numbers that are already uploaded
+    '''
+    with self.__lock:
+      for chunk_number in chunks:
+        self.__validate(chunk_number)
+        if self.__states[chunk_number] == self.COMPLETED:
+          continue
+        if self.__states[chunk_number] == self.QUEUED:
+          self.__queued_count -= 1
+        elif self.__states[chunk_number] == self.INFLIGHT:
+          self.__inflight_count -= 1
+        self.__states[chunk_number] = self.COMPLETED
+        self.__completed_count += 1
+
+  def next_chunk(self):
+    '''
+    Pop the next queued chunk and mark it as inflight
+
+    Returns
+    ----------
+    chunk_number : int
+      Chunk number to upload or None if no chunk is queued
+    '''
+    with self.__lock:
+      while self.__queue:
+        chunk_number = self.__queue.popleft()
+        # A queued chunk can be completed in the meantime by mark_completed
+        if self.__states[chunk_number] != self.QUEUED:
+          continue
+        self.__states[chunk_number] = self.INFLIGHT
+        self.__queued_count -= 1
+        self.__inflight_count += 1
+        return chunk_number
+      return None
+
+  def complete(self, chunk_number: int):
+    '''
+    Transition an inflight chunk to completed
+
+    Parameters
+    ----------
+    chunk_number : int
+      Chunk number that was uploaded successfully
+    '''
+    with self.__lock:
+      if self.__states[chunk_number] == self.COMPLETED:
+        return
+      if self.__states[chunk_number] != self.INFLIGHT:
+        raise ValueError(f'Chunk number {chunk_number} is not inflight')
+      self.__states[chunk_number] = self.COMPLETED
+      self.__inflight_count -= 1
+      self.__completed_count += 1
+
+  def retry(self, chunk_number: int):
+    '''
+    Transition an inflight chunk back to the queue after a failed upload attempt
+
+    Parameters
+    ----------
+    chunk_number : int
+      Chunk number that failed to upload
+    '''
+    with self.__lock:
+      if self.__states[chunk_number] != self.INFLIGHT:
+        raise ValueError(f'Chunk number {chunk_number} is not inflight')
+      self.__states[chunk_number] = self.QUEUED
+      self.__inflight_count -= 1
+      self.__queued_count += 1
+      self.__queue.append(chunk_number)
+
+  def is_done(self):
+    '''
+    Returns
+    ----------
+    done : bool
+      True when no chunk is queued or inflight
+    '''
+    with self.__lock:
+      return self.__queued_count == 0 and self.__inflight_count == 0
+
+  def completed_chunks(self) -> List[int]:
+    '''
+    Returns
+    ----------
+    chunks : list(int)
+      Chunk numbers that are completed in ascending order
+    '''
+    with self.__lock:
+      return [chunk_number for chunk_number in range(1, self.__total_blocks + 1) if self.__states[chunk_number] == self.COMPLETED]
+
+  def queued_chunks(self) -> List[int]:
+    '''
+    Returns
+    ----------
+    chunks : list(int)
+      Chunk numbers that are still queued in scheduling order
+    '''
+    with self.__lock:
+      return [chunk_number for chunk_number in self.__queue if self.__states[chunk_number] == self.QUEUED]
@@ -0,0 +1,213 @@
+import threading
+import time
+
+class AdaptiveConcurrencyController:
+  '''
+  Class to adapt the number of parallel chunk uploads to the measured throughput
+
+  The controller works like TCP congestion control (AIMD).
+  It starts at initial_concurrency and doubles the limit after every round of successful chunks (slow start)
+  until the first congestion signal. After that it adds one upload per round as long as the throughput of the round improves.
+  A failed chunk or a round whose average latency spikes is treated as congestion and multiplies the limit by decrease_factor,
+  at most once per round. A round is complete once as many chunks succeeded as the limit allows
+  '''
+  def __init__(self, max_concurrency: int, min_concurrency: int = 1, initial_concurrency: int = 2, decrease_factor: float = 0.5, latency_threshold: float = 2.0, throughput_tolerance: float = 0.05) -> None:
+    '''
+    Constructor for AdaptiveConcurrencyController Class
+
+    Parameters
+    ----------
+    max_concurrency : int
+      Upper bound of parallel uploads
+    min_concurrency : int
+      Lower bound of parallel uploads
+    initial_concurrency : int
+      Parallel uploads of the first round
+    decrease_factor : float
+      Factor the limit is multiplied with on congestion
+    latency_threshold : float
+      A round whose average latency exceeds the lowest observed latency by this factor is treated as congestion
+    throughput_tolerance : float
+      Relative throughput drop of a round after an increase that undoes the increase
+    '''
+    self.__max_concurrency = max(max_concurrency, 1)
+    self.__min_concurrency = max(min(min_concurrency, self.__max_concurrency), 1)
+    self.__limit = max(min(initial_concurrency, self.__max_concurrency), self.__min_concurrency)
+    self.__decrease_factor = decrease_factor
+    self.__latency_threshold = latency_threshold
+    self.__throughput_tolerance = throughput_tolerance
+    self.__condition = threading.Condition()
+
+    self.__inflight = 0
+    self.__slow_start = True
+    self.__previous_round_speed = 0
+    self.__round_start = None
+    self.__round_bytes = 0
+    self.__round_latency = 0
+    self.__round_successes = 0
+    self.__decreased_in_round = False
+
+    # Statistics
+    self.__start_time = None
+    self.__end_time = None
+    self.__bytes_uploaded = 0
+    self.__chunks_succeeded = 0
+    self.__chunks_failed = 0
+    self.__total_latency = 0
+    self.__min_latency = None
+    self.__max_latency = 0
+    self.__peak_concurrency = self.__limit
+    self.__transfer_queue_rate = []
+    self.__concurrency_history = [self.__limit]
+
+  @property
+  def limit(self):
+    return self.__limit
+
+  @property
+  def chunks_failed_count(self):
+    return self.__chunks_failed
+
+  def acquire(self, abort_controller: threading.Event = None):
+    '''
+    Block until an upload slot is free
+
+    Parameters
+    ----------
+    abort_controller : Event
+      Stop waiting once the event is set
+
+    Returns
+    ----------
+    acquired : bool
+      False if the upload was aborted while waiting
+    '''
+    with self.__condition:
+      while self.__inflight >= self.__limit:
+        if abort_controller is not None and abort_controller.is_set():
+          return False
+        self.__condition.wait(timeout=0.1)
+
+      if self.__start_time is None:
+        self.__start_time = time.monotonic()
+        self.__round_start = self.__start_time
+      self.__inflight += 1
+      return True
+
+  def release(self):
+    '''
+    Free an upload slot acquired by acquire
+    '''
+    with self.__condition:
+      self.__inflight -= 1
+      self.__condition.notify_all()
+
+  def __set_limit(self, limit: int):
+    limit = max(min(limit, self.__max_concurrency), self.__min_concurrency)
+    if limit != self.__limit:
+      self.__limit = limit
+      self.__concurrency_history.append(limit)
+      self.__peak_concurrency = max(self.__peak_concurrency, limit)
+      self.__condition.notify_all()
+
+  def __start_round(self, now: float):
+    self.__round_start = now
+    self.__round_bytes = 0
+    self.__round_latency = 0
+    self.__round_successes = 0
+
+  def __decrease(self, now: float):
+    # Several chunks of the same round usually fail together, only back off once for them
+    if self.__decreased_in_round:
+      return
+    self.__slow_start = False
+    self.__previous_round_speed = 0
+    self.__set_limit(int(self.__limit * self.__decrease_factor))
+    self.__start_round(now)
+    self.__decreased_in_round = True
+
+  def record_success(self, size: int, latency: float):
+    '''
+    Record a successfully uploaded chunk
+
+    Parameters
+    ----------
+    size : int
+      Bytes uploaded
+    latency : float
+      Seconds the upload took
+    '''
+    with self.__condition:
+      now = time.monotonic()
+      self.__end_time = now
+      self.__bytes_uploaded += size
+      self.__chunks_succeeded += 1
+      self.__total_latency += latency
+      self.__max_latency = max(self.__max_latency, latency)
+      self.__round_bytes += size
+      self.__round_latency += latency
+      self.__round_successes += 1
+
+      if self.__min_latency is None or latency < self.__min_latency:
+        self.__min_latency = latency
+
+      if self.__round_successes < self.__limit:
+        return
+
+      # The round is complete, compare its throughput with the previous round
+      elapsed = max(now - self.__round_start, 1e-6)
+      round_speed = self.__round_bytes / elapsed
+      round_latency = self.__round_latency / self.__round_successes
+      self.__transfer_queue_rate.append(round_speed)
+      self.__decreased_in_round = False
+
+      if round_latency > self.__min_latency * self.__latency_threshold and self.__limit > self.__min_concurrency:
+        # Latency grows with the queue in front of the server, back off before it starts throttling
+        self.__decrease(now)
+        return
+
+      if self.__slow_start:
+        self.__set_limit(self.__limit * 2)
+      elif round_speed >= self.__previous_round_speed * (1 - self.__throughput_tolerance):
+        self.__set_limit(self.__limit + 1)
+      else:
+        # The additional upload did not increase the throughput
+        self.__set_limit(self.__limit - 1)
+
+      self.__previous_round_speed = round_speed
+      self.__start_round(now)
+
+  def record_failure(self):
+    '''
+    Record a failed chunk upload. Failures are treated as congestion
+    '''
+    with self.__condition:
+      self.__chunks_failed += 1
+      self.__decrease(time.monotonic())
+
+  def stats(self):
+    '''
+    Returns
+    ----------
+    stats : dict
+      Throughput, latency and concurrency statistics of the upload
+    '''
+    with self.__condition:
+      duration = 0
+      if self.__start_time is not None and self.__end_time is not None:
+        duration = self.__end_time - self.__start_time
+
+      return {
+        'bytes_uploaded': self.__bytes_uploaded,
+        'duration': duration,
+        'average_speed': self.__bytes_uploaded / duration if duration > 0 else 0,
+        'chunks_succeeded': self.__chunks_succeeded,
+        'chunks_failed_count': self.__chunks_failed,
+        'average_latency': self.__total_latency / self.__chunks_succeeded if self.__chunks_succeeded else 0,
+        'min_latency': self.__min_latency or 0,
+        'max_latency': self.__max_latency,
+        'concurrency': self.__limit,
+        'peak_concurrency': self.__peak_concurrency,
+        'concurrency_history': list(self.__concurrency_history),
+        'transfer_queue_rate': list(self.__transfer_queue_rate),
+      }
@@ -1,6 +1,7 @@
 '''
 App Center Related Constants
 '''
+import os
 
 '''
 App Center Token for all App Center API requests. Must be changed
@@ -96,3 +97,181 @@ In development environment, the user inputs are bypassed and default values are
 If environment !== 'dev' then user is prompted with questions for user input 
 '''
 DEVELOPMENT_ENVIRONMENT = 'dev'
+
+'''
+Per user directory of the state the scripts keep across runs, outside of any repository
+'''
+USER_CACHE_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'appcenter-provisioning')
+
+'''
+Directory in which resumable uploads persist their checkpoint
+A checkpoint holds the asset id, token, chunk size and completed blocks of an unfinished upload, it is readable by the current user only
+'''
+UPLOAD_CHECKPOINT_DIRECTORY = os.path.join(USER_CACHE_DIRECTORY, 'upload_checkpoints')
+
+'''
+Minimum number of seconds between two checkpoint writes while chunks are being uploaded
+'''
+UPLOAD_CHECKPOINT_INTERVAL = 1
+
+'''
+JSON file in which the uploaded certificates are cached by their SHA-256 digest and app name
+It holds the asset tokens of the uploads, it is readable by the current user only
+'''
+UPLOAD_CACHE_PATH = os.path.join(USER_CACHE_DIRECTORY, 'upload_cache.json')
+
+'''
+Number of seconds a cached upload is reused before the file is uploaded again
+'''
+UPLOAD_CACHE_MAX_AGE = 24 * 60 * 60
+
+'''
+Readiness polling of a newly created app
+The repository configuration is retried with exponential backoff and jitter,
+starting at APP_READINESS_INITIAL_DELAY seconds and growing up to APP_READINESS_MAX_DELAY seconds,
+until App Center accepts it or APP_READINESS_TIMEOUT seconds have passed
+'''
+APP_READINESS_INITIAL_DELAY = 1
+APP_READINESS_MAX_DELAY = 16
+APP_READINESS_TIMEOUT = 180
+
+'''
+Status codes with which App Center answers while a new app is not ready yet. They are retried with 429 and 5xx,
+any other error such as an invalid token or payload fails at once
+'''
+APP_READINESS_RETRY_STATUS_CODES = [404, 409, 429]
+
+'''
+Maximum number of provisioning tasks running at the same time
+'''
+PROVISIONING_MAX_WORKERS = 8
+
+'''
+Maximum number of provisioning tasks running at the same time per service
+'''
+PROVISIONING_HOST_LIMITS = {
+  'app_center': 6,
+  'github': 2,
+  'key_vault': 3,
+}
+
+'''
+Environment name used by the batch provisioning. It is not the development environment, so no example apps are deleted
+'''
+BATCH_ENVIRONMENT = 'batch'
+
+'''
+Maximum number of OEMs provisioned at the same time by the batch provisioning
+'''
+BATCH_MAX_WORKERS = 4
+
+'''
+Fields every OEM of a batch manifest must define
+'''
+BATCH_REQUIRED_FIELDS = ['name', 'repo_name', 'repo_url', 'apps', 'vault_urls']
+
+'''
+Fields of the certificates of an OEM of a batch manifest, required when its vaults are synced
+'''
+BATCH_CERTIFICATE_FIELDS = ['mobileprovision_path', 'p12_path', 'keystore_path', 'p12_password', 'keystore_password']
+
+'''
+File the batch provisioning report is written to if no path is given
+'''
+BATCH_REPORT_PATH = 'batch_provisioning_report.json'
+
+'''
+Fields of the pipeline configuration App Center accepts but does not return, such as the certificate passwords
+The reconcile mode does not count them as drift when the current configuration lacks them
+'''
+PIPELINE_WRITE_ONLY_FIELDS = ['certificatePassword', 'keystorePassword', 'keyPassword']
+
+'''
+Requests per second and burst size of every host, shared by every api of the process
+Hosts without an entry are not throttled, but still honour Retry-After and X-RateLimit headers
+'''
+API_RATE_LIMITS = {
+  'api.appcenter.ms': {'rate': 20, 'burst': 40},
+  'api.github.com': {'rate': 5, 'burst': 10},
+}
+
+'''
+Retries of a request that was rate limited (429) or, for idempotent methods, failed with API_RETRY_STATUS_CODES or without response
+The retries wait for Retry-After if given, else for an exponential backoff with jitter
+starting at API_RETRY_INITIAL_DELAY seconds and growing up to API_RETRY_MAX_DELAY seconds
+'''
+API_MAX_RETRIES = 5
+API_RETRY_INITIAL_DELAY = 1
+API_RETRY_MAX_DELAY = 32
+API_RETRY_STATUS_CODES = [502, 503, 504]
+
+'''
+HTTP methods that can be sent again without side effects
+'''
+API_IDEMPOTENT_METHODS = ['GET', 'PUT', 'DELETE']
+
+'''
+Maximum number of seconds a request waits for a rate limit to reset. Longer waits fail the request
+'''
+API_MAX_RATE_LIMIT_WAIT = 300
+
+'''
+Maximum number of idle keep-alive connections kept open per host, shared by every api of the process
+Hosts without an entry, like the upload domains, use API_DEFAULT_CONNECTION_POOL_SIZE
+'''
+API_CONNECTION_POOL_SIZES = {
+  'api.appcenter.ms': 16,
+  'api.github.com': 8,
+}
+API_DEFAULT_CONNECTION_POOL_SIZE = 16
+
+'''
+Base urls that replace the https url of a host, with scheme and port. Ex: {'api.github.com': 'http://127.0.0.1:8080'}
+Used to run against a local stand-in of the services, see local_api_server.py
+'''
+API_HOST_OVERRIDES = {}
+
+'''
+Chunk size of the uploads to the local stand-in server, the chunk size App Center uses
+'''
+LOCAL_API_CHUNK_SIZE = 4 * 1024 * 1024
+
+'''
+JSON file the provisioning benchmark writes its report to
+'''
+BENCHMARK_REPORT_PATH = 'benchmark_report.json'
+
+'''
+Synthetic input sizes of the microbenchmarks by scale, see microbenchmarks.py
+file_sizes are in bytes, secret_counts are secrets per template, chunk_counts are chunks per upload and api_calls are calls per sample
+'''
+MICROBENCHMARK_SCALES = {
+  'small': {
+    'file_sizes': [1024, 1024 * 1024],
+    'secret_counts': [10, 100],
+    'chunk_counts': [100, 10000],
+    'api_calls': 20,
+  },
+  'medium': {
+    'file_sizes': [1024, 1024 * 1024, 64 * 1024 * 1024],
+    'secret_counts': [10, 100, 1000],
+    'chunk_counts': [100, 10000, 100000],
+    'api_calls': 100,
+  },
+  'large': {
+    'file_sizes': [1024, 1024 * 1024, 64 * 1024 * 1024, 1024 * 1024 * 1024],
+    'secret_counts': [10, 100, 1000],
+    'chunk_counts': [100, 10000, 1000000],
+    'api_calls': 500,
+  },
+}
+
+'''
+JSON file the microbenchmarks write their report to
+'''
+MICROBENCHMARK_REPORT_PATH = 'microbenchmark_report.json'
+
+'''
+JSON file the spans of a traced run are written to, in the Chrome trace format. See tracing.py
+'''
+TRACE_PATH = 'provisioning_trace.json'
@@ -33,6 +33,12 @@ If environment !== 'dev' then user is prompted with questions for user input
 '''
 DEVELOPMENT_ENVIRONMENT = 'dev'
 
+'''
+Environment name used by the batch provisioning, see APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT
+A batch run has no user to prompt, missing vault urls and certificates are errors
+'''
+BATCH_ENVIRONMENT = 'batch'
+
 '''
 Since each environment has its own key vault.
 The env_name specifies the environment from which the secrets should be extracted from
@@ -100,3 +106,71 @@ Used only if development environment === 'dev'
 Else, user is prompted for Android Keystore Certificate Password
 '''
 KEY_STORE_CERTIFICATE_PASSWORD = 'River123'
+
+'''
+Maximum number of secrets fetched from a Key Vault at the same time
+'''
+MAX_CONCURRENT_SECRET_FETCHES = 16
+
+'''
+Maximum number of secrets written to a Key Vault at the same time
+'''
+MAX_CONCURRENT_SECRET_WRITES = 16
+
+'''
+Number of secrets listed per request by the local secret client, as many as Azure Key Vault returns per page
+'''
+LOCAL_VAULT_PAGE_SIZE = 25
+
+'''
+Number of seconds the secrets read from a vault are reused before the vault is read again
+If None, every vault is read at most once per run
+'''
+SECRET_SNAPSHOT_TTL = None
+
+'''
+JSON file in which the Azure access tokens are persisted, so the next run does not authenticate again
+The tokens are bearer tokens stored in plain text, readable by the current user only. Persisting them is opt-in:
+if None, the tokens are kept in memory only unless the TOKEN_CACHE_PATH_VARIABLE environment variable names a file
+'''
+TOKEN_CACHE_PATH = None
+
+'''
+Environment variable naming the JSON file in which the Azure access tokens are persisted. Ex: AZURE_TOKEN_CACHE_PATH=~/.cache/azure_token_cache.json
+'''
+TOKEN_CACHE_PATH_VARIABLE = 'AZURE_TOKEN_CACHE_PATH'
+
+'''
+Number of seconds before the expiry of an access token at which a new one is acquired
+'''
+TOKEN_REFRESH_MARGIN = 5 * 60
+
+'''
+Tag holding the SHA-256 hash of the secret value. Used by the incremental sync to skip unchanged secrets
+'''
+CONTENT_HASH_TAG = 'content-sha256'
+
+'''
+Tag holding the comma separated platforms that consume a secret. Secrets without the tag are consumed by every platform
+'''
+PLATFORM_TAG = 'platforms'
+
+'''
+Platforms consuming the secrets of a single platform by tag key
+Used to tag the secrets when they are set and for secrets that were set without the platform tag
+'''
+SECRET_PLATFORMS = {
+  'mobileprovision': ['iOS'],
+  'mobileprovision_filename': ['iOS'],
+  'p12': ['iOS'],
+  'p12_filename': ['iOS'],
+  'p12_password': ['iOS'],
+  'keystore': ['Android'],
+  'keystore_filename': ['Android'],
+  'keystore_password': ['Android'],
+}
+
+'''
+Tags that are not used as the key of the secret in the pipeline configuration
+'''
+RESERVED_TAGS = [CONTENT_HASH_TAG, PLATFORM_TAG]
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+
+from constants import key_vault_constants as KEY_VAULT_CONSTANTS
+
+class CachedCredential:
+  '''
+  Azure credential caching the access tokens of another credential
+
+  Tokens are kept in memory by scopes and tenant until they are about to expire, and optionally persisted to a JSON file
+  so the next run does not authenticate again. The wrapped credential is only created when a token has to be acquired,
+  so a run whose tokens are all cached never probes the credential chain
+  '''
+  __shared = None
+  __shared_lock = threading.Lock()
+
+  def __init__(self, credential = None, cache_path: str = None, refresh_margin: float = KEY_VAULT_CONSTANTS.TOKEN_REFRESH_MARGIN) -> None:
+    '''
+    Constructor for CachedCredential Class
+
+    Parameters
+    ----------
+    credential : TokenCredential
+      Credential acquiring the tokens. Defaults to a DefaultAzureCredential created on first use
+    cache_path : str
+      JSON file in which the tokens are persisted across runs. If None, the tokens are kept in memory only
+    refresh_margin : float
+      Seconds before the expiry of a token at which a new one is acquired
+    '''
+    self.__credential = credential
+    self.__cache_path = cache_path
+    self.__refresh_margin = refresh_margin
+    self.__lock = threading.Lock()
+    self.__tokens = self.__load()
+
+  @classmethod
+  def shared(cls):
+    '''
+    Get the credential shared by the whole process
+
+    Its tokens are only persisted if the KEY_VAULT_CONSTANTS.TOKEN_CACHE_PATH_VARIABLE environment variable
+    or KEY_VAULT_CONSTANTS.TOKEN_CACHE_PATH names a file
+
+    Returns
+    ----------
+    credential : CachedCredential
+    '''
+    with cls.__shared_lock:
+      if cls.__shared is None:
+        cache_path = os.environ.get(KEY_VAULT_CONSTANTS.TOKEN_CACHE_PATH_VARIABLE) or KEY_VAULT_CONSTANTS.TOKEN_CACHE_PATH
+        cls.__shared = cls(cache_path=os.path.expanduser(cache_path) if cache_path else None)
+      return cls.__shared
+
+  def __load(self):
+    '''
+    Private method to load the persisted tokens, dropping the expired ones
+    '''
+    if not self.__cache_path:
+      return {}
+
+    try:
+      with open(self.__cache_path, 'r') as file:
+        entries = json.load(file)
+    except (OSError, ValueError):
+      return {}
+
+    # The Azure SDK is only imported once it is used, so local vaults run without it
+    from azure.core.credentials import AccessToken
+
+    now = time.time()
+    return {key: AccessToken(entry['token'], entry['expires_on']) for key, entry in entries.items() if entry['expires_on'] > now}
+
+  def __save(self):
+    '''
+    Private method to persist the tokens. Must be called with the lock held
+    '''
+    if not self.__cache_path:
+      return
+
+    directory = os.path.dirname(self.__cache_path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+
+    # The file holds bearer tokens, only the current user may read it
+    temporary_path = f'{self.__cache_path}.tmp'
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as file:
+      json.dump({key: {'token': token.token, 'expires_on': token.expires_on} for key, token in self.__tokens.items()}, file)
+    os.replace(temporary_path, self.__cache_path)
+
+  def __key(self, scopes, tenant_id: str):
+    return ' '.join(sorted(scopes)) + (f'@{tenant_id}' if tenant_id else '')
+
+  def get_token(self, *scopes: str, claims: str = None, tenant_id: str = None, **kwargs):
+    '''
+    Get an access token, acquiring it from the wrapped credential if none is cached or the cached one is about to expire
+
+    Parameters
+    ----------
+    scopes : str
+      Scopes of the token
+    claims : str
+      Additional claims. Tokens requested with claims are never taken from the cache
+    tenant_id : str
+      Tenant of the token
+
+    Returns
+    ----------
+    token : AccessToken
+    '''
+    key = self.__key(scopes, tenant_id)
+
+    # Acquiring under the lock means concurrent callers wait for one acquisition instead of all authenticating
+    with self.__lock:
+      token = self.__tokens.get(key)
+      if claims is None and token is not None and token.expires_on - self.__refresh_margin > time.time():
+        return token
+
+      if self.__credential is None:
+        from azure.identity import DefaultAzureCredential
+        self.__credential = DefaultAzureCredential()
+
+      token = self.__credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+      self.__tokens[key] = token
+      self.__save()
+      return token
+
+  def close(self):
+    if self.__credential is not None and hasattr(self.__credential, 'close'):
+      self.__credential.close()
+
+class SecretClientPool:
+  '''
+  Registry of the SecretClients of the process by vault url
+
+  A SecretClient keeps its token and its HTTP connections, reusing it avoids authenticating once per client
+  '''
+  __clients = {}
+  __lock = threading.Lock()
+
+  @classmethod
+  def get_client(cls, vault_url: str, credential = None):
+    '''
+    Get the SecretClient of a vault, creating it on first use
+
+    Parameters
+    ----------
+    vault_url : str
+      Ex: https://vault-name.vault.azure.net/
+    credential : TokenCredential
+      Credential of the client. Defaults to the shared CachedCredential
+
+    Returns
+    ----------
+    secret_client : SecretClient
+    '''
+    credential = credential or CachedCredential.shared()
+    key = (vault_url.rstrip('/'), id(credential))
+
+    from azure.keyvault.secrets import SecretClient
+
+    with cls.__lock:
+      # The credential is kept with its client so its id is not reused while the client exists
+      if key not in cls.__clients:
+        cls.__clients[key] = (SecretClient(vault_url=vault_url, credential=credential), credential)
+      return cls.__clients[key][0]
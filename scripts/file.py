@@ -1,14 +1,42 @@
 import base64
+import io
+import mmap
 import os
+import threading
+
+'''
+Number of bytes encoded or decoded at once by the streaming Base 64 codec. A multiple of 3 and 4
+'''
+BASE64_BLOCK_SIZE = 3 * 4 * 64 * 1024
 
 class File:
   '''
   Class to create a File 
   '''
-  def __init__(self, file_path: str) -> None:
+  def __init__(self, file_path: str, memory_map: bool = False) -> None:
+    '''
+    Constructor for File Class
+
+    Parameters
+    ----------
+    file_path : str
+      Absolute path of the file
+    memory_map : bool
+      If True, the file is memory mapped once and chunks are returned as memoryview slices of the mapping
+    '''
     self.__file_path = file_path
     self.__file_name = os.path.basename(file_path)
     self.__file_size = self.__get_file_size(file_path=file_path)
+    self.__memory_map = memory_map
+    self.__mapped_file = None
+    self.__mapped_view = None
+    self.__lock = threading.Lock()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
 
   def __get_file_size(self, file_path: str):
     file_stats = os.stat(file_path)
@@ -35,10 +63,35 @@ class File:
     encoded_string : bytes
       Encoded string in bytes
     '''
-    encoded_string = ''
+    return self.encode_base64_stream(target=io.BytesIO()).getvalue()
+
+  def encode_base64_stream(self, target = None, block_size: int = BASE64_BLOCK_SIZE):
+    '''
+    Encode the file using Base 64 block by block, so only one block of the file is in memory at a time
+
+    Parameters
+    ----------
+    target : BinaryIO
+      Writable binary stream the encoded bytes are written to. Defaults to a new BytesIO
+    block_size : int
+      Number of bytes read at once. Rounded down to a multiple of 3, so the encoded blocks can be concatenated
+
+    Returns
+    ----------
+    target : BinaryIO
+      The target stream
+    '''
+    target = target if target is not None else io.BytesIO()
+    block_size = max(block_size - block_size % 3, 3)
+
     with open(self.__file_path, 'rb') as file:
-      encoded_string = base64.b64encode(file.read())
-    return encoded_string
+      while True:
+        block = file.read(block_size)
+        if not block:
+          break
+        target.write(base64.b64encode(block))
+
+    return target
   
   def decode_base64(self, data: bytes, file_path: str):
     '''
@@ -52,11 +105,79 @@ class File:
       Save the file locally
     '''
     with open(f'{file_path}', 'wb') as file:
-      file.write(base64.b64decode(data))
+      File.decode_base64_stream(data=data, target=file)
+
+  @staticmethod
+  def decode_base64_stream(data, target = None, block_size: int = BASE64_BLOCK_SIZE):
+    '''
+    Decode Base 64 data block by block and write every decoded block to the target as soon as it is decoded
+
+    Parameters
+    ----------
+    data : str | bytes | BinaryIO
+      Encoded data or a readable stream of encoded bytes
+    target : BinaryIO
+      Writable binary stream the decoded bytes are written to. Defaults to a new BytesIO
+    block_size : int
+      Number of encoded characters decoded at once. Rounded down to a multiple of 4, so every block decodes on its own
+
+    Returns
+    ----------
+    target : BinaryIO
+      The target stream
+    '''
+    target = target if target is not None else io.BytesIO()
+    block_size = max(block_size - block_size % 4, 4)
+
+    if hasattr(data, 'read'):
+      blocks = iter(lambda: data.read(block_size), b'')
+    else:
+      blocks = (data[start:start + block_size] for start in range(0, len(data), block_size))
+
+    # Whitespace shifts the 4 character alignment, the remainder is carried over to the next block
+    remainder = b''
+    for block in blocks:
+      if isinstance(block, str):
+        block = block.encode('ascii')
+      block = remainder + b''.join(block.split())
+      aligned_size = len(block) - len(block) % 4
+      target.write(base64.b64decode(block[:aligned_size]))
+      remainder = block[aligned_size:]
+
+    if remainder:
+      # Same error as decoding the data at once
+      base64.b64decode(remainder)
+
+    return target
+
+  def __get_mapped_view(self):
+    '''
+    Private method to memory map the file on first use and return a memoryview over the whole mapping
+    '''
+    with self.__lock:
+      if self.__mapped_view is None:
+        with open(self.__file_path, 'rb') as file:
+          # The mapping stays valid after the file descriptor is closed
+          self.__mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__mapped_view = memoryview(self.__mapped_file)
+      return self.__mapped_view
+
+  def close(self):
+    '''
+    Release the memory mapping of the file, if any.
+    Every chunk returned by read_file_chunk must be released before closing
+    '''
+    with self.__lock:
+      if self.__mapped_view is not None:
+        self.__mapped_view.release()
+        self.__mapped_view = None
+      if self.__mapped_file is not None:
+        self.__mapped_file.close()
+        self.__mapped_file = None
 
   def read_file_chunk(self, start: int, end: int):
     '''
-    Private method to read a file in chunk
+    Read a file in chunk
 
     Parameters
     ----------
@@ -67,9 +188,76 @@ class File:
     
     Returns
     ----------
-    chunk : bytes
-      A chunk of file based on start and end position
+    chunk : bytes | memoryview
+      A chunk of file based on start and end position.
+      In memory map mode, a zero-copy memoryview slice of the mapping that should be released once it is consumed
+    '''
+    # Empty files cannot be memory mapped
+    if self.__memory_map and self.__file_size > 0:
+      return self.__get_mapped_view()[start:end]
+
+    with open(f'{self.__file_path}', 'rb') as file:
+      file.seek(start, 0)
+      return file.read(end-start)
+
+class MemoryFile:
+  '''
+  Class to use bytes held in memory wherever a File is read, without writing them to disk
+  '''
+  def __init__(self, data, file_name: str) -> None:
+    '''
+    Constructor for MemoryFile Class
+
+    Parameters
+    ----------
+    data : bytes | bytearray | memoryview | BytesIO
+      Content of the file
+    file_name : str
+      Name of the file
+    '''
+    self.__file_name = file_name
+    # BytesIO exposes its buffer without a copy
+    self.__view = data.getbuffer() if isinstance(data, io.BytesIO) else memoryview(data)
+    self.__file_size = self.__view.nbytes
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  @property
+  def file_name(self):
+    return self.__file_name
+
+  @property
+  def file_path(self):
+    return None
+
+  @property
+  def file_size(self):
+    return self.__file_size
+
+  def close(self):
+    '''
+    Release the buffer. Every chunk returned by read_file_chunk must be released before closing
+    '''
+    self.__view.release()
+
+  def read_file_chunk(self, start: int, end: int):
+    '''
+    Read a file in chunk
+
+    Parameters
+    ----------
+    start : int
+      Start position of the chunk
+    end : int
+      End position of the chunk
+
+    Returns
+    ----------
+    chunk : memoryview
+      A zero-copy slice of the buffer that should be released once it is consumed
     '''
-    file = open(f'{self.__file_path}', 'rb')
-    file.seek(start, 0)
-    return file.read(end-start)
+    return self.__view[start:end]
@@ -1,5 +1,7 @@
 import sys
 
+import tracing
+from api.exceptions import ApiException
 from api.github_api import GithubApi
 from constants import github_constants as GITHUB_CONSTANTS
 
@@ -13,28 +15,88 @@ Ex: python3 github.py qa
 '''
 
 class Github:
-  def __init__(self, environment: str) -> None:
+  def __init__(self, environment: str, github_token: str = None, repo_name: str = None, github_api: GithubApi = None) -> None:
+    '''
+    Constructor for Github Class
+
+    Parameters
+    ----------
+    environment : str
+      Environment name
+    github_token : str
+      Github token. If provided together with repo_name, the user is not prompted
+    repo_name : str
+      The repository name in the owner/repo_name format
+    github_api : GithubApi
+      Github api to share its HTTP session with other apps
+    '''
     self.__environment = environment
+    self.__github_token = github_token if repo_name is not None else None
+    self.__repo_name = repo_name
+    self.__github_api = github_api
+
+  def resolve_credentials(self):
+    '''
+    Obtain the Github token and repository name.
+    If environment is dev, default constants are utilized.
+    Else, user is promted with questions, only once
+    '''
+    if self.__github_token is not None:
+      return
 
-  def init_app(self):
     if self.__environment != GITHUB_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
-      github_token = input(f'Enter your Github token: \n')
+      self.__github_token = input(f'Enter your Github token: \n')
       print()
-      repo_name = input(f'Enter your Github Repo name: Example: <Organization>/<Repository Name>\n')
+      self.__repo_name = input(f'Enter your Github Repo name: Example: <Organization>/<Repository Name>\n')
       print()
     else:
-      github_token = GITHUB_CONSTANTS.GITHUB_TOKEN
-      repo_name = GITHUB_CONSTANTS.REPO_NAME
+      self.__github_token = GITHUB_CONSTANTS.GITHUB_TOKEN
+      self.__repo_name = GITHUB_CONSTANTS.REPO_NAME
+
+  def __branch_exists(self, github_api: GithubApi, repo_name: str, branch: str):
+    '''
+    Private method to check if a branch exists
+
+    Returns
+    ----------
+    exists : bool
+    '''
+    try:
+      github_api.get_branch_sha(repo_name=repo_name, branch_name=branch)
+      return True
+    except ApiException as e:
+      if e.status_code == 404:
+        return False
+      raise
+
+  def init_app(self, skip_existing_branches: bool = False):
+    '''
+    Create the branches of GITHUB_CONSTANTS.BRANCHES from the main branch
+
+    Parameters
+    ----------
+    skip_existing_branches : bool
+      Only create the branches that do not exist yet, so the app can be run again on the same repository
+    '''
+    self.resolve_credentials()
+    github_token = self.__github_token
+    repo_name = self.__repo_name
 
     # Create a github api
-    github_api = GithubApi(github_token=github_token)
+    github_api = self.__github_api or GithubApi(github_token=github_token)
 
     # Get the SHA from the master branch
     sha = github_api.get_branch_sha(repo_name=repo_name)
     
     for branch in GITHUB_CONSTANTS.BRANCHES:
-      new_branch = github_api.create_new_branch(repo_name, sha, branch)
-      print(f'Successfully created new branch: {branch} branch in {repo_name}')
+      with tracing.span('github.create_branch', repo=repo_name, branch=branch) as span:
+        if skip_existing_branches and self.__branch_exists(github_api=github_api, repo_name=repo_name, branch=branch):
+          span.set(existing=True)
+          print(f'Branch {branch} already exists in {repo_name}')
+          continue
+
+        new_branch = github_api.create_new_branch(repo_name, sha, branch)
+        print(f'Successfully created new branch: {branch} branch in {repo_name}')
     
 def main():
   arg_length = len(sys.argv)
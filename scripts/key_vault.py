@@ -1,14 +1,22 @@
+import hashlib
 import json
 import sys
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from functools import partial
 from typing import Dict, List
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
 
+import tracing
+from api.app_center_api import AppCenterApi
+from api.exceptions import ApiException
 from constants import key_vault_constants as KEY_VAULT_CONSTANTS
-from file import File
+from credential_cache import SecretClientPool
+from file import File, MemoryFile
+from secret_snapshot_cache import SecretSnapshot, SecretSnapshotCache
 from upload_app_center_attachments import UploadAppCenterAttachments
+from upload_cache import UploadCache
 
 '''
 To run the app
@@ -19,12 +27,84 @@ python3 key_vault.py <arg> # arg can be anything except dev
 Ex: python3 key_vault.py qa
 '''
 
+class KeyVaultWriteException(Exception):
+  '''
+  Raised once every vault has been written, when secrets could not be set
+  '''
+  def __init__(self, errors: Dict[str, List[str]], report: Dict) -> None:
+    '''
+    Parameters
+    ----------
+    errors : dict
+      Error messages by vault url
+    report : dict
+      Sync report of set_vault_secrets
+    '''
+    super().__init__('; '.join(f'{vault_url}: {", ".join(messages)}' for vault_url, messages in errors.items()))
+    self.errors = errors
+    self.report = report
+
+class CertificateUploadException(Exception):
+  '''
+  Raised when a certificate stored in Key Vault could not be uploaded to App Center
+  '''
+  def __init__(self, certificate: str, env_name: str, app_name: str, message: str = None) -> None:
+    '''
+    Parameters
+    ----------
+    certificate : str
+      Tag key of the certificate. Ex: mobileprovision
+    env_name : str
+      Environment of the certificate
+    app_name : str
+      App the certificate was uploaded to
+    message : str
+      Error of the upload
+    '''
+    super().__init__(f'Upload of the {certificate} certificate of the {env_name} environment to {app_name} failed' + (f': {message}' if message else ''))
+    self.certificate = certificate
+    self.env_name = env_name
+    self.app_name = app_name
+
 class KeyVault():
   '''
   Class to create and retrieve secrets from Azure Key Vault
   '''
-  def __init__(self, environment) -> None:
+  def __init__(self, environment, snapshot_cache: SecretSnapshotCache = None, **kwargs) -> None:
+    '''
+    Constructor for KeyVault Class
+
+    Parameters
+    ----------
+    environment : str
+      Environment name
+    snapshot_cache : SecretSnapshotCache
+      Cache of the secrets read from the vaults. Can be shared to read every vault at most once per run
+    kwargs : dict
+      Used to run without user input.
+      [vault_urls] common_vault_url and oem_vault_url by environment name,
+      [certificates] mobileprovision_path, p12_path, keystore_path, p12_password and keystore_password,
+      [template_directory] directory of the key vault template files,
+      [credential] Azure credential shared by every vault. Defaults to the CachedCredential shared by the process,
+      [upload_cache] UploadCache shared by every upload,
+      [secret_client_factory] called with the vault_url and the credential, returns a client with the set_secret, get_secret,
+      list_properties_of_secrets and begin_delete_secret methods of SecretClient. Defaults to SecretClientPool.get_client.
+      Ex: LocalSecretClient.factory() to run against local vaults
+    '''
     self.__environment = environment
+    self.__snapshot_cache = snapshot_cache or SecretSnapshotCache(ttl=KEY_VAULT_CONSTANTS.SECRET_SNAPSHOT_TTL)
+    self.__certificates = kwargs.get('certificates')
+    self.__template_directory = kwargs.get('template_directory')
+    self.__credential = kwargs.get('credential')
+    self.__secret_client_factory = kwargs.get('secret_client_factory') or SecretClientPool.get_client
+    self.__authentication_lock = threading.Lock()
+    self.__incremental = False
+    self.__vault_state = {}
+    self.__sync_report = {}
+    self.__sync_errors = {}
+    self.__sync_lock = threading.Lock()
+    # Certificates are identical across branches, upload them once per app
+    self.__upload_cache = kwargs.get('upload_cache') or UploadCache()
     self.__secret_clients = {
       'dev': {
         'common_vault_url': None,
@@ -46,19 +126,25 @@ class KeyVault():
       }
     }
 
-  def __authenticate_key_vault(self, env_name: str):
+    for env_name, vault_urls in (kwargs.get('vault_urls') or {}).items():
+      self.__secret_clients[env_name]['common_vault_url'] = vault_urls['common_vault_url']
+      self.__secret_clients[env_name]['oem_vault_url'] = vault_urls['oem_vault_url']
+
+  def resolve_vault_urls(self, env_name: str):
     '''
-    Private method to authenticate the users via the default method
+    Public method to obtain the common and OEM specific vault urls of an environment.
+    Call it before reading vaults from several threads, so the user is prompted up front
 
     Parameters
     ----------
     env_name : str
       Environment name for which the common vault url and oem specific vault urls are utilized
-    '''
 
-    # If environment variable does not contain AZURE_TENANT_ID use the default Azure Tenant ID
-    if not os.environ.get('AZURE_TENANT_ID'):
-      os.environ['AZURE_TENANT_ID'] = KEY_VAULT_CONSTANTS.TENANT_ID
+    Raises
+    ----------
+    ValueError
+      In batch mode, if the vault urls of the environment were not passed to the constructor
+    '''
 
     '''
     Store the common and OEM specific vault url for each environment in a dictonary
@@ -67,6 +153,12 @@ class KeyVault():
     If environment is dev, default constants are utilized.
     Else, user is promted with questions
     '''
+    if self.__secret_clients[env_name]['common_vault_url'] and self.__secret_clients[env_name]['oem_vault_url']:
+      return
+
+    if self.__environment == KEY_VAULT_CONSTANTS.BATCH_ENVIRONMENT:
+      raise ValueError(f'The vault urls of the {env_name} environment are required in batch mode')
+
     if self.__environment != KEY_VAULT_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
       if not self.__secret_clients[env_name]['common_vault_url'] and not self.__secret_clients[env_name]['oem_vault_url']:
         self.__secret_clients[env_name]['common_vault_url'] = input(f'Enter your {env_name} Environment vault url for Common Variables: \n')
@@ -77,9 +169,27 @@ class KeyVault():
       self.__secret_clients[env_name]['common_vault_url'] = KEY_VAULT_CONSTANTS.COMMON_ENV_VAULT_URL
       self.__secret_clients[env_name]['oem_vault_url'] = KEY_VAULT_CONSTANTS.OEM_VAULT_URL
 
-    credential = DefaultAzureCredential()
-    self.__secret_clients[env_name]['common_client'] = SecretClient(vault_url=self.__secret_clients[env_name]['common_vault_url'], credential=credential)
-    self.__secret_clients[env_name]['oem_client'] = SecretClient(vault_url=self.__secret_clients[env_name]['oem_vault_url'], credential=credential)
+  def __authenticate_key_vault(self, env_name: str):
+    '''
+    Private method to authenticate the users via the default method
+
+    The credential and the clients are shared by the process, the credential chain is probed at most once per run
+
+    Parameters
+    ----------
+    env_name : str
+      Environment name for which the common vault url and oem specific vault urls are utilized
+    '''
+
+    # If environment variable does not contain AZURE_TENANT_ID use the default Azure Tenant ID
+    if not os.environ.get('AZURE_TENANT_ID'):
+      os.environ['AZURE_TENANT_ID'] = KEY_VAULT_CONSTANTS.TENANT_ID
+
+    with self.__authentication_lock:
+      self.resolve_vault_urls(env_name=env_name)
+
+      self.__secret_clients[env_name]['common_client'] = self.__secret_client_factory(vault_url=self.__secret_clients[env_name]['common_vault_url'], credential=self.__credential)
+      self.__secret_clients[env_name]['oem_client'] = self.__secret_client_factory(vault_url=self.__secret_clients[env_name]['oem_vault_url'], credential=self.__credential)
 
   '''
   Set secrets in Key Vault
@@ -99,26 +209,151 @@ class KeyVault():
     kwargs : dict
       Other arguments that can be passed such as tags, content_type, enabled flag
     '''
+    # Store a hash of the value in the tags, so later syncs can detect changes from the secret properties alone
+    content_hash = hashlib.sha256(str(secret_value).encode('utf-8')).hexdigest()
+    tags = {**kwargs.get('tags', {}), KEY_VAULT_CONSTANTS.CONTENT_HASH_TAG: content_hash}
+    kwargs = {**kwargs, 'tags': tags}
+
+    report = self.__get_sync_report(secret_client.vault_url)
+
+    status = 'updated'
+    if self.__incremental:
+      existing_secrets = self.__get_vault_state(secret_client)
+      existing_secret = existing_secrets.get(secret_name)
+
+      if existing_secret is not None and existing_secret.content_type == kwargs.get('content_type') and existing_secret.tags == tags:
+        report['unchanged'].append(secret_name)
+        return
+
+      status = 'created' if existing_secret is None else 'updated'
+
     secret = secret_client.set_secret(secret_name, secret_value, **kwargs)
+    report[status].append(secret_name)
+
+    # Keep the vault state current, the same secret can be written again for another environment sharing the vault
+    if self.__incremental:
+      existing_secrets[secret_name] = secret.properties
 
-  def __set_secrets_list(self, secret_client, list: List, **kwargs):
+  def __get_sync_report(self, vault_url: str):
+    with self.__sync_lock:
+      return self.__sync_report.setdefault(vault_url, {'created': [], 'updated': [], 'unchanged': [], 'orphaned': [], 'failed': []})
+
+  def __set_secrets(self, secret_client, secrets: List[Dict]):
     '''
-    Private method to set a list of secrets
+    Private method to set the secrets of a vault concurrently
+
+    A failed secret does not stop the others, it is added to the [failed] secrets of the sync report
 
     Parameters
     ----------
     secret_client : Any
       Secret Client contains the vault url and other properties/methods to perform operations on the key vault
+    secrets : list
+      Arguments of __set_secret for every secret
+
+    Returns
+    ----------
+    failed : list
+      Names of the secrets that could not be set
+    '''
+    if len(secrets) == 0:
+      return []
+
+    # List the vault before the writes start, so the workers do not list it concurrently
+    if self.__incremental:
+      self.__get_vault_state(secret_client)
+
+    # Writes of the same secret name keep their order, the last one wins as when they are written one after another
+    secrets_by_name = {}
+    for secret in secrets:
+      secrets_by_name.setdefault(secret['secret_name'], []).append(secret)
+
+    def set_secrets(secret_name: str):
+      try:
+        for secret in secrets_by_name[secret_name]:
+          self.__set_secret(secret_client=secret_client, **secret)
+        return None
+      except Exception as e:
+        return secret_name, f'{type(e).__name__}: {e}'
+
+    max_workers = min(KEY_VAULT_CONSTANTS.MAX_CONCURRENT_SECRET_WRITES, len(secrets_by_name))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='set-secret') as executor:
+      failures = [failure for failure in executor.map(set_secrets, secrets_by_name.keys()) if failure is not None]
+
+    if failures:
+      report = self.__get_sync_report(secret_client.vault_url)
+      with self.__sync_lock:
+        report['failed'].extend(secret_name for secret_name, _ in failures)
+        self.__sync_errors.setdefault(secret_client.vault_url, []).extend(f'{secret_name}: {error}' for secret_name, error in failures)
+
+    return [secret_name for secret_name, _ in failures]
+
+  def __get_vault_state(self, secret_client):
+    '''
+    Private method to list the current secret properties of a vault once per sync
+
+    Parameters
+    ----------
+    secret_client : Any
+      Secret Client contains the vault url and other properties/methods to perform operations on the key vault
+
+    Returns
+    ----------
+    secrets : dict
+      Secret properties by secret name
+    '''
+    vault_url = secret_client.vault_url
+    if vault_url not in self.__vault_state:
+      self.__vault_state[vault_url] = {property.name: property for property in secret_client.list_properties_of_secrets()}
+    return self.__vault_state[vault_url]
+
+  def __report_orphaned_secrets(self, delete_orphans: bool):
+    '''
+    Private method to find the secrets of the synced vaults that are not in the local templates
+
+    Parameters
+    ----------
+    delete_orphans : bool
+      Delete the orphaned secrets from the vault
+    '''
+    for env in KEY_VAULT_CONSTANTS.ENVIRONMENTS:
+      for client_key in ['common_client', 'oem_client']:
+        secret_client = self.__secret_clients[env['name']][client_key]
+        if secret_client is None or secret_client.vault_url not in self.__vault_state:
+          continue
+
+        report = self.__sync_report[secret_client.vault_url]
+        synced_secrets = set(report['created'] + report['updated'] + report['unchanged'] + report['failed'])
+        orphaned_secrets = [secret_name for secret_name in self.__vault_state[secret_client.vault_url] if secret_name not in synced_secrets and secret_name not in report['orphaned']]
+
+        for secret_name in orphaned_secrets:
+          report['orphaned'].append(secret_name)
+          if delete_orphans:
+            secret_client.begin_delete_secret(secret_name)
+
+  def __get_secrets_list(self, list: List, **kwargs):
+    '''
+    Private method to construct the secrets of a list
+
+    Parameters
+    ----------
     list : list
       A list that will be iterated over and added/updated in the key vault
     kwargs : dict
       Other arguments that can be passed such as tags, content_type, enabled flag
+
+    Returns
+    ----------
+    secrets : list
+      Arguments of __set_secret for every entry of the list
     '''
+    secrets = []
     for secret in list:
       name = secret.get('name', 'name')
       secret_value = secret.get('value', 'value')
       secret_name = f'{name.replace("_", "-")}'
-      self.__set_secret(secret_client=secret_client, secret_name=secret_name, secret_value=secret_value, **kwargs)
+      secrets.append({'secret_name': secret_name, 'secret_value': secret_value, **kwargs})
+    return secrets
 
   def __set_key_vault(self, json_data: Dict, env_name: str, key_vault_type = 'common'):
     '''
@@ -132,6 +367,11 @@ class KeyVault():
       Environment to store the secrets into
     key_vault_type : str
       Used to set the appropriate secret client based on the vault_type
+
+    Returns
+    ----------
+    failed : list
+      Names of the secrets that could not be set
     '''
 
     if key_vault_type == 'common':
@@ -139,6 +379,11 @@ class KeyVault():
     else:
       secret_client = self.__secret_clients[env_name]['oem_client']
 
+    # The vault is about to change, the cached snapshot is stale for every environment reading this vault
+    self.__snapshot_cache.invalidate(vault_url=secret_client.vault_url)
+
+    secrets = []
+
     # Construct the content type. Very important feature, used extensively while extracting the secrets from the vault
     for key, value in json_data.items():
       if isinstance(value, type({})):
@@ -160,11 +405,15 @@ class KeyVault():
         f'{key}': f'{key_vault_type}_{key}'
       }
 
+      # Tag the secrets consumed by a single platform, so the other platform does not fetch them
+      platforms = KEY_VAULT_CONSTANTS.SECRET_PLATFORMS.get(key)
+      if platforms is not None:
+        tags[KEY_VAULT_CONSTANTS.PLATFORM_TAG] = ','.join(platforms)
+
       enabled = True
 
       if content_type == 'list':
-        self.__set_secrets_list(
-          secret_client=secret_client, 
+        secrets += self.__get_secrets_list(
           list=value, 
           content_type=content_type, 
           tags=tags, 
@@ -173,16 +422,17 @@ class KeyVault():
       else:
         secret_value = json.dumps(value) if content_type == 'dict' else value
         secret_name = f'{key.replace("_", "-")}'
-        self.__set_secret(
-          secret_client=secret_client, 
-          secret_name=secret_name, 
-          secret_value=secret_value, 
-          content_type=content_type, 
-          tags=tags, 
-          enabled=enabled
-        )
+        secrets.append({
+          'secret_name': secret_name, 
+          'secret_value': secret_value, 
+          'content_type': content_type, 
+          'tags': tags, 
+          'enabled': enabled
+        })
+
+    return self.__set_secrets(secret_client=secret_client, secrets=secrets)
 
-  def __set_certificates(self, env_name: str):
+  def __get_certificates(self, env_name: str):
     '''
     Obtain the file path for the certificates/provision files stored on the users machine
     If environment is dev, default constants are utilized.
@@ -192,87 +442,232 @@ class KeyVault():
     ----------
     env_name : str
       Environment to store the secrets into
+
+    Returns
+    ----------
+    certificates : dict
+      mobileprovision_path, p12_path, keystore_path, p12_password and keystore_password
+
+    Raises
+    ----------
+    ValueError
+      In batch mode, if no certificates were passed to the constructor
     '''
+    if self.__certificates is not None:
+      return self.__certificates
+
+    # Batch runs prompt from worker threads without anybody to answer, the run would hang
+    if self.__environment == KEY_VAULT_CONSTANTS.BATCH_ENVIRONMENT:
+      raise ValueError(f'The certificates of the {env_name} environment are required in batch mode')
+
     if self.__environment != KEY_VAULT_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
-      mobile_provision_path = input(f'Please enter the Absolute Path of your Mobile Provision that is used for {env_name} Environment: \n')
+      certificates = {}
+      certificates['mobileprovision_path'] = input(f'Please enter the Absolute Path of your Mobile Provision that is used for {env_name} Environment: \n')
       print()
-      p12_certificate_path = input(f'Please enter the Absolute Path of your p12 Certificate that is used for {env_name} Environment: \n')
+      certificates['p12_path'] = input(f'Please enter the Absolute Path of your p12 Certificate that is used for {env_name} Environment: \n')
       print()
-      keystore_certificate_path = input(f'Please enter the Absolute Path of your KeyStore Certificate that is used for {env_name} Environment: \n')
+      certificates['keystore_path'] = input(f'Please enter the Absolute Path of your KeyStore Certificate that is used for {env_name} Environment: \n')
       print()
-      p12_certificate_password = input(f'Please enter the Password for your p12 Certificate that is used for {env_name} Environment: \n')
+      certificates['p12_password'] = input(f'Please enter the Password for your p12 Certificate that is used for {env_name} Environment: \n')
       print()
-      keystore_certificate_password = input(f'Please enter the Password for your KeyStore Certificate that is used for {env_name} Environment: \n')
+      certificates['keystore_password'] = input(f'Please enter the Password for your KeyStore Certificate that is used for {env_name} Environment: \n')
       print()
-    else:
-      mobile_provision_path = KEY_VAULT_CONSTANTS.MOBILE_PROVISON_PATH
-      p12_certificate_path = KEY_VAULT_CONSTANTS.P12_CERTIFICATE_PATH
-      keystore_certificate_path = KEY_VAULT_CONSTANTS.KEY_STORE_CERTIFICATE_PATH
-      p12_certificate_password = KEY_VAULT_CONSTANTS.P12_CERTIFICATE_PASSWORD
-      keystore_certificate_password = KEY_VAULT_CONSTANTS.KEY_STORE_CERTIFICATE_PASSWORD
+      return certificates
+
+    return {
+      'mobileprovision_path': KEY_VAULT_CONSTANTS.MOBILE_PROVISON_PATH,
+      'p12_path': KEY_VAULT_CONSTANTS.P12_CERTIFICATE_PATH,
+      'keystore_path': KEY_VAULT_CONSTANTS.KEY_STORE_CERTIFICATE_PATH,
+      'p12_password': KEY_VAULT_CONSTANTS.P12_CERTIFICATE_PASSWORD,
+      'keystore_password': KEY_VAULT_CONSTANTS.KEY_STORE_CERTIFICATE_PASSWORD,
+    }
+
+  def __set_certificates(self, env_name: str, certificates: Dict):
+    '''
+    Private method to set the certificates/provision files, their names and passwords in the OEM vault
 
+    Parameters
+    ----------
+    env_name : str
+      Environment to store the secrets into
+    certificates : dict
+      mobileprovision_path, p12_path, keystore_path, p12_password and keystore_password
+    '''
     # Construct File objects
-    mobile_provision_file = File(file_path=mobile_provision_path)
-    p12_certificate_file = File(file_path=p12_certificate_path)
-    keystore_certificate_file = File(file_path=keystore_certificate_path)
+    mobile_provision_file = File(file_path=certificates['mobileprovision_path'])
+    p12_certificate_file = File(file_path=certificates['p12_path'])
+    keystore_certificate_file = File(file_path=certificates['keystore_path'])
 
-    # Construct the dictionary after encode the file into base64
+    # Construct the dictionary of the file names and passwords
     data = {
-      'mobileprovision': mobile_provision_file.encode_base64(),
-      'p12': p12_certificate_file.encode_base64(),
-      'keystore': keystore_certificate_file.encode_base64(),
       'mobileprovision_filename': mobile_provision_file.file_name,
       'p12_filename': p12_certificate_file.file_name,
       'keystore_filename': keystore_certificate_file.file_name,
-      'p12_password': p12_certificate_password,
-      'keystore_password': keystore_certificate_password
+      'p12_password': certificates['p12_password'],
+      'keystore_password': certificates['keystore_password']
     }
 
     print(f"Setting OEM Certificates in Key Vault for {env_name}")
-    self.__set_key_vault(json_data=data, env_name=env_name, key_vault_type='oem')
-    print(f"Successfully set OEM Certificates in Key Vault for {env_name}")
+    failed = self.__set_key_vault(json_data=data, env_name=env_name, key_vault_type='oem')
+
+    # Encode the files into base64 one at a time, so a single encoded certificate is held in memory
+    certificate_files = {
+      'mobileprovision': mobile_provision_file,
+      'p12': p12_certificate_file,
+      'keystore': keystore_certificate_file,
+    }
+    for key, certificate_file in certificate_files.items():
+      failed += self.__set_key_vault(json_data={key: certificate_file.encode_base64()}, env_name=env_name, key_vault_type='oem')
+
+    if failed:
+      print(f"Failed to set {len(failed)} OEM Certificate secrets in Key Vault for {env_name}")
+    else:
+      print(f"Successfully set OEM Certificates in Key Vault for {env_name}")
+
+  def __get_template_path(self, env_name: str, key_vault_type: str):
+    '''
+    Private method to construct the path of the template file of a vault
+
+    Parameters
+    ----------
+    env_name : str
+      Environment name
+    key_vault_type : str
+      Type of vault. Either Common/OEM Specific
+
+    Returns
+    ----------
+    file_path : str
+      Path of the json template
+    '''
+    file_name = KEY_VAULT_CONSTANTS.BASE_COMMON_FILE_NAME if key_vault_type == 'common' else KEY_VAULT_CONSTANTS.BASE_OEM_FILE_NAME
+    full_file_name = f"{file_name}_{env_name}.json"
+    ADDITIONAL = 'template/scripts'
+    # Constuct the appropriate file name based on the environment
+    if self.__template_directory is not None:
+      return os.path.join(self.__template_directory, full_file_name)
+    return os.path.join(os.getcwd(), ADDITIONAL, KEY_VAULT_CONSTANTS.KEY_VAULT_TEMPLATE_PATH, full_file_name)
+
+  def __set_template(self, env_name: str, key_vault_type: str):
+    '''
+    Private method to read the template of a vault and set its secrets
+
+    Parameters
+    ----------
+    env_name : str
+      Environment name
+    key_vault_type : str
+      Type of vault. Either Common/OEM Specific
+    '''
+    # Read the json file
+    with open(self.__get_template_path(env_name=env_name, key_vault_type=key_vault_type)) as file:
+      # Load the json data
+      json_data = json.load(file)
+
+    print(f"Setting {key_vault_type} Key Vault for {env_name}")
+    failed = self.__set_key_vault(json_data=json_data, env_name=env_name, key_vault_type=key_vault_type)
+    if failed:
+      print(f"Failed to set {len(failed)} {key_vault_type} Key Vault secrets for {env_name}")
+    else:
+      print(f"Successfully set {key_vault_type} Key Vault for {env_name}")
+
+  def __run_vault_writes(self, writes: List):
+    '''
+    Private method to run the writes of every vault concurrently
 
-  def set_vault_secrets(self):
+    Writes to the same vault run one after another in the given order, so environments sharing a vault
+    end up with the same secrets as a sequential sync. An exception of a write is recorded for its vault
+    and does not stop the other writes
+
+    Parameters
+    ----------
+    writes : list
+      Tuples of the secret client and the operation writing to its vault
+    '''
+    writes_by_vault = {}
+    for secret_client, operation in writes:
+      writes_by_vault.setdefault(secret_client.vault_url, []).append(operation)
+
+    def run_writes(vault_url: str):
+      with tracing.span('key_vault.write_vault', vault_url=vault_url, writes=len(writes_by_vault[vault_url])):
+        for operation in writes_by_vault[vault_url]:
+          try:
+            operation()
+          except Exception as e:
+            with self.__sync_lock:
+              self.__sync_errors.setdefault(vault_url, []).append(f'{type(e).__name__}: {e}')
+
+    with tracing.span('key_vault.write_vaults', vaults=len(writes_by_vault)), ThreadPoolExecutor(max_workers=len(writes_by_vault), thread_name_prefix='set-vault') as executor:
+      list(executor.map(tracing.propagate(run_writes), writes_by_vault.keys()))
+
+  def set_vault_secrets(self, incremental: bool = False, delete_orphans: bool = False):
     '''
     Public method to set secrets in Azure Key Vault
+
+    The vaults are written concurrently and the secrets of a vault are written concurrently.
+    Every vault url and certificate is requested before the first write
+
+    Parameters
+    ----------
+    incremental : bool
+      Compare the local templates and certificates with the current vault state and write only the secrets that are new or changed
+    delete_orphans : bool
+      In incremental mode, delete the secrets of the vault that are not in the local templates
+
+    Returns
+    ----------
+    report : dict
+      Names of the created, updated, unchanged, orphaned and failed secrets by vault url
+
+    Raises
+    ----------
+    KeyVaultWriteException
+      If any secret could not be set, once every vault has been written
     '''
+    self.__incremental = incremental
+    self.__vault_state = {}
+    self.__sync_report = {}
+    self.__sync_errors = {}
+
+    for env in KEY_VAULT_CONSTANTS.ENVIRONMENTS:
+      self.__authenticate_key_vault(env_name=env['name'])
+
+    # The certificates are stored in the OEM vault of the last environment
+    certificates_env_name = KEY_VAULT_CONSTANTS.ENVIRONMENTS[-1]['name']
+    certificates = self.__get_certificates(env_name=certificates_env_name)
 
     '''
     Iterate through each environment and read the json data from environment specific file and add/update secrets in Azure Key vault
     '''
+    writes = []
     for env in KEY_VAULT_CONSTANTS.ENVIRONMENTS:
       env_name = env['name']
-      self.__authenticate_key_vault(env_name=env_name)
       # Do the same process for common env secrets and oem env secrets
-      for i in range(2):
-        if i == 0:
-          file_name = KEY_VAULT_CONSTANTS.BASE_COMMON_FILE_NAME
-          key_vault_type = 'common'
-        else:
-          file_name = KEY_VAULT_CONSTANTS.BASE_OEM_FILE_NAME
-          key_vault_type = 'oem'
-      
-        full_file_name = f"{file_name}_{env['name']}.json"
-        ADDITIONAL = 'template/scripts'
-        # Constuct the appropriate file name based on the environment
-        if self.__environment != KEY_VAULT_CONSTANTS.DEVELOPMENT_ENVIRONMENT:
-          file_path = os.path.join(os.getcwd(), ADDITIONAL, KEY_VAULT_CONSTANTS.KEY_VAULT_TEMPLATE_PATH, full_file_name)
-        else:
-          file_path = os.path.join(os.getcwd(), ADDITIONAL, KEY_VAULT_CONSTANTS.KEY_VAULT_TEMPLATE_PATH, full_file_name)
+      for key_vault_type in ['common', 'oem']:
+        writes.append((
+          self.__secret_clients[env_name][f'{key_vault_type}_client'],
+          partial(self.__set_template, env_name=env_name, key_vault_type=key_vault_type),
+        ))
 
-        # Read the json file
-        file = open(file_path)
+    # Get certificate path and upload it to Key Vault
+    writes.append((
+      self.__secret_clients[certificates_env_name]['oem_client'],
+      partial(self.__set_certificates, env_name=certificates_env_name, certificates=certificates),
+    ))
 
-        # Load the json data
-        json_data = json.load(file)
+    self.__run_vault_writes(writes)
 
-        print(f"Setting {key_vault_type} Key Vault for {env['name']}")
-        self.__set_key_vault(json_data=json_data, env_name=env_name, key_vault_type=key_vault_type)
-        print(f"Successfully set {key_vault_type} Key Vault for {env['name']}")
-        print()
+    if incremental:
+      self.__report_orphaned_secrets(delete_orphans=delete_orphans)
 
-    # Get certificate path and upload it to Key Vault
-    self.__set_certificates(env_name=env_name)
+    print()
+    for vault_url, report in self.__sync_report.items():
+      print(f"{vault_url}: {len(report['created'])} created, {len(report['updated'])} updated, {len(report['unchanged'])} unchanged, {len(report['orphaned'])} {'deleted' if delete_orphans else 'orphaned'}, {len(report['failed'])} failed")
+
+    if self.__sync_errors:
+      raise KeyVaultWriteException(errors=self.__sync_errors, report=self.__sync_report)
+
+    return self.__sync_report
 
   '''
   Get secrets in Key Vault
@@ -284,7 +679,7 @@ class KeyVault():
   3. Append the uploadId, filename and password(if any) to the response object
   4. Return the response object to appcenter for pipeline config
   '''
-  def __handle_file_uploads(self, data, app_name: str, env_name: str, tag_key: str):
+  def __handle_file_uploads(self, data, app_name: str, env_name: str, tag_key: str, app_center_api: AppCenterApi = None):
     '''
     Private method to handle base 64 encoded data stored in Key Vault
 
@@ -295,47 +690,80 @@ class KeyVault():
     app_name : str
       App name to upload the decoded file
     env_name : str
-      Save the file locally as [env_name].[tag_key]
+      The file is named [env_name].[tag_key]
     tag_key : str
       Used as an extension  
+    app_center_api : AppCenterApi
+      Api of the App Center account of the app. Defaults to the api of UploadAppCenterAttachments
+
+    Returns
+    ----------
+    upload : dict
+      [upload_id] and [filename] of the uploaded file
+
+    Raises
+    ----------
+    CertificateUploadException
+      If the upload failed or was cancelled
     '''
     
-    # Create File object
+    # Decode the vault value into memory, the certificate never touches the disk
     file_name = f'{env_name}.{tag_key}'
-    file_path = os.path.join(os.getcwd(), file_name)
-    # Create an empty file
-    with open(file_path, 'w') as f:
-      pass
-    
-    file = File(file_path=file_path)
-
-    # Decode and download the file
-    file.decode_base64(data=data, file_path=file_path)
-
-    file = File(file_path=file_path)
+    buffer = File.decode_base64_stream(data=data)
 
-    # Create UploadAttachments Object and upload file
-    upload_app_center_attachments = UploadAppCenterAttachments(self.__environment)
-    result = upload_app_center_attachments.init_app(app_name=app_name, file=file)
+    # Create UploadAttachments Object and upload the decoded file from memory
+    upload_app_center_attachments = UploadAppCenterAttachments(self.__environment, upload_cache=self.__upload_cache, app_center_api=app_center_api)
+    with tracing.span('key_vault.upload_certificate', app=app_name, env=env_name, certificate=tag_key), MemoryFile(data=buffer, file_name=file_name) as file:
+      try:
+        result = upload_app_center_attachments.init_app(app_name=app_name, file=file)
+      except ApiException as e:
+        raise CertificateUploadException(certificate=tag_key, env_name=env_name, app_name=app_name, message=str(e)) from e
 
     if result['error'] == False:
       # Step 3. Extract upload id and file name
-      if tag_key == 'mobileprovision':
-        self.__provisioning_profile_upload_id = os.path.basename(result['location'])
-        self.__provisioning_profile_filename = os.path.basename(result['absolute_uri'])
-      elif tag_key == 'p12':
-        self.__certificate_upload_id = os.path.basename(result['location'])
-        self.__certificate_filename = os.path.basename(result['absolute_uri'])
-      
-      # We can delete the locally created file
-      os.remove(file_path)
-      print(f'Successfully deleted {file_name}')
-      print()
-    else:
-      # Upload failed
-      print('Upload Failed. Try again later')
+      return {
+        'upload_id': os.path.basename(result['location']),
+        'filename': os.path.basename(result['absolute_uri'])
+      }
 
-  def __construct_certificate_params(self, response, **kwargs):
+    # Upload failed, the pipeline configuration cannot refer to the certificate
+    raise CertificateUploadException(certificate=tag_key, env_name=env_name, app_name=app_name, message=result.get('message'))
+
+  def __find_previous_upload(self, data, app_name: str, env_name: str, tag_key: str):
+    '''
+    Private method to find the upload of a certificate without uploading it, by the content digest of its previous upload to the app
+
+    Parameters
+    ----------
+    data : byte
+      Encoded string in bytes
+    app_name : str
+      App name the certificate was uploaded to
+    env_name : str
+      The file is named [env_name].[tag_key]
+    tag_key : str
+      Used as an extension
+
+    Returns
+    ----------
+    upload : dict
+      [upload_id] and [filename] of the previous upload of the same content, even if its cache entry expired.
+      [upload_id] is None if the content was never uploaded to the app, so it matches no branch configuration
+    '''
+    file_name = f'{env_name}.{tag_key}'
+    with MemoryFile(data=File.decode_base64_stream(data=data), file_name=file_name) as file:
+      digest = self.__upload_cache.digest(file)
+
+    entry = self.__upload_cache.get(digest, app_name, include_expired=True)
+    if entry is None:
+      return {'upload_id': None, 'filename': file_name}
+
+    return {
+      'upload_id': os.path.basename(entry['response']['location']),
+      'filename': os.path.basename(entry['response']['absolute_uri'])
+    }
+
+  def __construct_certificate_params(self, response, platform: str, **kwargs):
     '''
     Private method to construct params related to certificates and provisioning
 
@@ -343,6 +771,8 @@ class KeyVault():
     ----------
     response : dict
       Update the response dictionary
+    platform : str
+      Only the toolset of the platform is updated
     kwargs : dict
       Other arguments used to update the response dictionary
     
@@ -351,18 +781,174 @@ class KeyVault():
     response : dict
       Updated response dictionary
     '''
-    response['toolsets']['xcode']['provisioningProfileUploadId'] = self.__provisioning_profile_upload_id
-    response['toolsets']['xcode']['provisioningProfileFilename'] = self.__provisioning_profile_filename
-    response['toolsets']['xcode']['certificateUploadId'] = self.__certificate_upload_id
-    response['toolsets']['xcode']['certificateFilename'] = self.__certificate_filename
-    response['toolsets']['xcode']['certificatePassword'] = kwargs['certificatePassword']
-    response['toolsets']['android']['keystoreEncoded'] = kwargs['keystore']
-    response['toolsets']['android']['keystorePassword'] = kwargs['keystore_password']
-    response['toolsets']['android']['keystoreFilename'] = kwargs['keystore_filename']
+    if platform == 'iOS':
+      response['toolsets']['xcode']['provisioningProfileUploadId'] = kwargs['mobileprovision']['upload_id']
+      response['toolsets']['xcode']['provisioningProfileFilename'] = kwargs['mobileprovision']['filename']
+      response['toolsets']['xcode']['certificateUploadId'] = kwargs['p12']['upload_id']
+      response['toolsets']['xcode']['certificateFilename'] = kwargs['p12']['filename']
+      response['toolsets']['xcode']['certificatePassword'] = kwargs['certificatePassword']
+    else:
+      response['toolsets']['android']['keystoreEncoded'] = kwargs['keystore']
+      response['toolsets']['android']['keystorePassword'] = kwargs['keystore_password']
+      response['toolsets']['android']['keystoreFilename'] = kwargs['keystore_filename']
 
     return response
 
-  def __get_key_vault(self, app_name: str, env_name: str, vault_type: str):
+  def __get_secret_values(self, secret_client, secret_names: List[str]):
+    '''
+    Private method to fetch the values of secrets concurrently
+
+    Parameters
+    ----------
+    secret_client : Any
+      Secret Client contains the vault url and other properties/methods to perform operations on the key vault
+    secret_names : list
+      Names of the secrets to fetch
+
+    Returns
+    ----------
+    values : dict
+      Secret values by secret name
+    '''
+    if len(secret_names) == 0:
+      return {}
+
+    max_workers = min(KEY_VAULT_CONSTANTS.MAX_CONCURRENT_SECRET_FETCHES, len(secret_names))
+    with tracing.span('key_vault.get_secrets', vault_url=secret_client.vault_url, secrets=len(secret_names)) as span, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='get-secret') as executor:
+      values = dict(zip(secret_names, executor.map(lambda secret_name: secret_client.get_secret(secret_name).value, secret_names)))
+      span.set(bytes_received=sum(len(value) for value in values.values() if isinstance(value, str)))
+      return values
+
+  def __load_snapshot(self, env_name: str, vault_type: str):
+    '''
+    Private method to list the secret properties of a vault
+
+    Parameters
+    ----------
+    env_name : str
+      To extract the secrets from the correct environment
+    vault_type : str
+      Type of vault. Either Common/OEM Specific
+
+    Returns
+    ----------
+    snapshot : SecretSnapshot
+      Snapshot that fetches the secret values on first use
+    '''
+    with self.__authentication_lock:
+      authenticated = self.__secret_clients[env_name]['common_client'] is not None
+
+    if not authenticated:
+      self.__authenticate_key_vault(env_name=env_name)
+
+    if vault_type == 'common':
+      secret_client = self.__secret_clients[env_name]['common_client']
+    else:
+      secret_client = self.__secret_clients[env_name]['oem_client']
+
+    # Secrets without content type or tags are not part of the pipeline configuration
+    with tracing.span('key_vault.list_secrets', env=env_name, vault_type=vault_type) as span:
+      secret_properties = [property for property in secret_client.list_properties_of_secrets() if property.content_type and property.tags]
+      span.set(secrets=len(secret_properties))
+
+    return SecretSnapshot(
+      properties=secret_properties,
+      fetch_values=lambda secret_names: self.__get_secret_values(secret_client=secret_client, secret_names=secret_names)
+    )
+
+  def __get_snapshot(self, env_name: str, vault_type: str):
+    '''
+    Private method to get the cached snapshot of a vault, reading the vault only if it is not cached yet
+    '''
+    with self.__authentication_lock:
+      self.resolve_vault_urls(env_name=env_name)
+
+    vault_url = self.__secret_clients[env_name][f'{vault_type}_vault_url']
+    return self.__snapshot_cache.get(vault_url, load=lambda: self.__load_snapshot(env_name=env_name, vault_type=vault_type))
+
+  def prefetch_vault_secrets(self, env_name: str):
+    '''
+    Public method to read the common and OEM vaults of an environment into the snapshot cache
+
+    Parameters
+    ----------
+    env_name : str
+      Environment name
+    '''
+    with tracing.span('key_vault.fetch', env=env_name):
+      for vault_type in ['common', 'oem']:
+        snapshot = self.__get_snapshot(env_name=env_name, vault_type=vault_type)
+        snapshot.get_values([property.name for property in snapshot.properties])
+
+  def invalidate_snapshots(self, env_name: str = None, vault_type: str = None):
+    '''
+    Public method to drop the cached secrets, so the next call reads the vaults again
+
+    Parameters
+    ----------
+    env_name : str
+      Environment name. If None, every environment is dropped
+    vault_type : str
+      Type of vault. Either Common/OEM Specific. If None, both vaults are dropped
+    '''
+    if env_name is None and vault_type is None:
+      self.__snapshot_cache.invalidate()
+      return
+
+    # Snapshots are cached by vault url, every environment sharing a dropped vault reads it again
+    for name, secret_clients in self.__secret_clients.items():
+      for secret_vault_type in ['common', 'oem']:
+        vault_url = secret_clients[f'{secret_vault_type}_vault_url']
+        if vault_url and (env_name is None or name == env_name) and (vault_type is None or secret_vault_type == vault_type):
+          self.__snapshot_cache.invalidate(vault_url=vault_url)
+
+  def __get_tag_key(self, tags: Dict):
+    '''
+    Private method to find the tag that holds the key of the secret in the pipeline configuration
+
+    Parameters
+    ----------
+    tags : dict
+      Tags of the secret
+
+    Returns
+    ----------
+    tag_key : str
+    '''
+    return next((key for key in tags.keys() if key not in KEY_VAULT_CONSTANTS.RESERVED_TAGS), None)
+
+  def __get_platforms(self, property):
+    '''
+    Private method to find the platforms that consume a secret
+
+    Parameters
+    ----------
+    property : SecretProperties
+      Properties of the secret
+
+    Returns
+    ----------
+    platforms : list
+      Platforms of the platform tag. Secrets written without the tag fall back to SECRET_PLATFORMS by tag key.
+      None if every platform consumes the secret
+    '''
+    platforms = property.tags.get(KEY_VAULT_CONSTANTS.PLATFORM_TAG)
+    if platforms is not None:
+      return platforms.split(',')
+    return KEY_VAULT_CONSTANTS.SECRET_PLATFORMS.get(self.__get_tag_key(property.tags))
+
+  def __get_platform_properties(self, snapshot: SecretSnapshot, platform: str):
+    '''
+    Private method to select the secrets of a snapshot consumed by a platform
+    '''
+    properties = []
+    for property in snapshot.properties:
+      platforms = self.__get_platforms(property)
+      if platforms is None or platform in platforms:
+        properties.append(property)
+    return properties
+
+  def __get_key_vault(self, app_name: str, env_name: str, vault_type: str, platform: str, app_center_api: AppCenterApi = None, upload: bool = True):
     '''
     Private method to get secrets from the Azure Key Vault
 
@@ -374,18 +960,23 @@ class KeyVault():
       To extract the secrets from the correct environment
     vault_type : str
       Type of vault. Either Common/OEM Specific
+    platform : str
+      Only the secrets consumed by the platform are fetched, so the certificates of the other platform are not uploaded
+    app_center_api : AppCenterApi
+      Api the certificates are uploaded with
+    upload : bool
+      Upload the certificates. If False, their previous uploads are looked up instead
     
     Returns
     ----------
     response : dict
       Pipeline configuration
     '''
-    if vault_type == 'common':
-      secret_client = self.__secret_clients[env_name]['common_client']
-    else:
-      secret_client = self.__secret_clients[env_name]['oem_client']
+    snapshot = self.__get_snapshot(env_name=env_name, vault_type=vault_type)
+    secret_properties = self.__get_platform_properties(snapshot=snapshot, platform=platform)
 
-    secret_properties = secret_client.list_properties_of_secrets()
+    # Fetch all the values at once, the responses are processed in the listing order below
+    secret_values = snapshot.get_values([property.name for property in secret_properties])
 
     response = {
       'environmentVariables': [],
@@ -394,17 +985,18 @@ class KeyVault():
         'xcode': {}
       }
     }
+    certificates = {}
 
     for property in secret_properties:
       content_type = property.content_type
       tags = property.tags
 
-      if not content_type or not tags:
+      tag_key = self.__get_tag_key(tags)
+      if tag_key is None:
         continue
 
-      tag_key = list(tags.keys())[0]
       name = property.name.replace('-', '_')
-      value = secret_client.get_secret(property.name).value
+      value = secret_values[property.name]
 
       if content_type == 'list':
         response[tag_key].append({
@@ -415,35 +1007,27 @@ class KeyVault():
         response[tag_key] = json.loads(value)
       elif content_type == 'bool':
         response[tag_key] = bool(value)
+      elif content_type == 'cert' and tag_key != 'keystore' and not upload:
+        certificates[tag_key] = self.__find_previous_upload(data=value, app_name=app_name, env_name=env_name, tag_key=tag_key)
       elif content_type == 'cert' and tag_key != 'keystore':
-        self.__handle_file_uploads(data=value, app_name=app_name, env_name=env_name, tag_key=tag_key)
+        certificates[tag_key] = self.__handle_file_uploads(data=value, app_name=app_name, env_name=env_name, tag_key=tag_key, app_center_api=app_center_api)
       else:
         # content_type == str
         if tag_key == 'p12_password':
-          certificatePassword = value
-        elif tag_key == 'keystore':
-          keystore = value
-        elif tag_key == 'keystore_password':
-          keystore_password = value
-        elif tag_key == 'keystore_filename':
-          keystore_filename = value
+          certificates['certificatePassword'] = value
+        elif tag_key in ['keystore', 'keystore_password', 'keystore_filename']:
+          certificates[tag_key] = value
         elif tag_key == 'p12_filename' or tag_key == 'mobileprovision_filename':
           continue
         else:
           response[tag_key] = value
     
     if vault_type == 'oem':
-      response = self.__construct_certificate_params(
-        response,
-        certificatePassword = certificatePassword,
-        keystore = keystore,
-        keystore_password = keystore_password,
-        keystore_filename = keystore_filename
-      )
+      response = self.__construct_certificate_params(response, platform=platform, **certificates)
     
     return response
 
-  def __construct_response(self, app_name: str, platform: str, env_name: str):
+  def __construct_response(self, app_name: str, platform: str, env_name: str, app_center_api: AppCenterApi = None, upload: bool = True):
     '''
     Private method to construct response pertaining to each platform
 
@@ -455,6 +1039,10 @@ class KeyVault():
       Platform type and delete certain properties from the response that are not required by the platform
     env_name : str
       To extract the secrets from the correct environment
+    app_center_api : AppCenterApi
+      Api the certificates are uploaded with
+    upload : bool
+      Upload the certificates. If False, their previous uploads are looked up instead
     
     Returns
     ----------
@@ -466,13 +1054,13 @@ class KeyVault():
       if i == 0:
         # Get Common ENV
         print(f'Retrieving Common Key Vault for {env_name} Environment')
-        response_common = self.__get_key_vault(app_name=app_name, env_name=env_name, vault_type='common')
+        response_common = self.__get_key_vault(app_name=app_name, env_name=env_name, vault_type='common', platform=platform, app_center_api=app_center_api, upload=upload)
         print(f'Successfully retrieved Common Key Vault for {env_name} Environment')
         print()
       else:
         # Set OEM ENV
         print(f'Retrieving OEM Key Vault for {env_name} Environment')
-        response_oem = self.__get_key_vault(app_name=app_name, env_name=env_name, vault_type='oem')
+        response_oem = self.__get_key_vault(app_name=app_name, env_name=env_name, vault_type='oem', platform=platform, app_center_api=app_center_api, upload=upload)
         print(f'Successfully retrieved OEM Key Vault for {env_name} Environment')
         print()
     
@@ -502,7 +1090,7 @@ class KeyVault():
         'environmentVariables': [*response_common['environmentVariables'], *response_oem['environmentVariables']]
       }
 
-  def get_vault_secrets(self, app_name = 'hello-ios-2', platform: str = 'iOS', env_name = 'dev'):
+  def get_vault_secrets(self, app_name = 'hello-ios-2', platform: str = 'iOS', env_name = 'dev', app_center_api: AppCenterApi = None, upload: bool = True):
     '''
     Public method to get secrets from the vault
 
@@ -514,6 +1102,12 @@ class KeyVault():
       Return platform specific configuration
     env_name : str
       To save the file locally
+    app_center_api : AppCenterApi
+      Api of the App Center account of the app, the certificates are uploaded with its token.
+      Defaults to an api with APP_CENTER_CONSTANTS.APP_CENTER_TOKEN
+    upload : bool
+      Upload the certificates. If False, nothing is written: the upload ids are the ones of the previous uploads
+      of the same content to the app, or None if the content was never uploaded. Used to compare with existing configurations
     
     Returns
     ----------
@@ -521,10 +1115,8 @@ class KeyVault():
       Pipeline configuration
     '''
     
-    # Since this module can be accessed outside, we need to authenticate the users for token
-    self.__authenticate_key_vault(env_name=env_name)
-
-    return self.__construct_response(app_name=app_name, platform=platform, env_name=env_name)
+    # Since this module can be accessed outside, the users are authenticated when a vault is read for the first time
+    return self.__construct_response(app_name=app_name, platform=platform, env_name=env_name, app_center_api=app_center_api, upload=upload)
 
 # Main function is used only to set the secrets
 def main():
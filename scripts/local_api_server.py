@@ -0,0 +1,485 @@
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote_plus, urlparse
+
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+
+'''
+To run the server
+python3 local_api_server.py [port]
+Ex: python3 local_api_server.py 8080
+
+Serves the App Center, App Center upload and Github endpoints used by the scripts on one port.
+Point the apis to it with APP_CENTER_CONSTANTS.API_HOST_OVERRIDES, see LocalApiServer.override_hosts
+'''
+
+class LocalApiState:
+  '''
+  Apps, configurations, uploads and Github branches of the local server
+  '''
+  def __init__(self) -> None:
+    self.apps = {}
+    # App Center token that created every app
+    self.app_tokens = {}
+    self.repo_configs = {}
+    self.branch_configs = {}
+    self.uploads = {}
+    self.branches = {}
+    self.lock = threading.Lock()
+
+  def get_branches(self, repo_name: str):
+    '''
+    Branches of a repository by name. Every repository starts with a main branch
+    '''
+    if repo_name not in self.branches:
+      self.branches[repo_name] = {'main': hashlib.sha1(repo_name.encode('utf-8')).hexdigest()}
+    return self.branches[repo_name]
+
+class LocalApiHandler(BaseHTTPRequestHandler):
+  '''
+  Request handler of LocalApiServer
+  '''
+  # Keep-alive connections, like the real services
+  protocol_version = 'HTTP/1.1'
+  # The headers and the body are written separately, with Nagle's algorithm every response would wait for a delayed ACK
+  disable_nagle_algorithm = True
+
+  ROUTES = [
+    ('POST', r'v0\.1/orgs/(?P<owner>[^/]+)/apps', 'create_app'),
+    ('GET', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)', 'get_app'),
+    ('DELETE', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)', 'delete_app'),
+    ('GET', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)/repo_config', 'get_repo_config'),
+    ('POST', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)/repo_config', 'repo_config'),
+    ('GET', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)/branches/(?P<branch>[^/]+)/config', 'get_branch_config'),
+    ('POST', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)/branches/(?P<branch>[^/]+)/config', 'branch_config'),
+    ('PUT', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)/branches/(?P<branch>[^/]+)/config', 'branch_config'),
+    ('POST', r'v0\.1/apps/(?P<owner>[^/]+)/(?P<app>[^/]+)/file_asset', 'file_asset'),
+    ('POST', r'upload/set_metadata/(?P<id>[^/]+)/?', 'set_metadata'),
+    ('POST', r'upload/upload_chunk/(?P<id>[^/]+)', 'upload_chunk'),
+    ('POST', r'upload/finished/(?P<id>[^/]+)', 'upload_finished'),
+    ('GET', r'upload/status/(?P<id>[^/]+)', 'upload_status'),
+    ('POST', r'upload/cancel/(?P<id>[^/]+)', 'cancel_upload'),
+    ('GET', r'repos/(?P<repo>[^/]+/[^/]+)/branches/(?P<branch>.+)', 'get_branch'),
+    ('POST', r'repos/(?P<repo>[^/]+/[^/]+)/git/refs', 'create_ref'),
+  ]
+
+  # Endpoints authenticated by the Github token instead of the App Center token
+  GITHUB_ENDPOINTS = ['get_branch', 'create_ref']
+
+  def log_message(self, format, *args):
+    # Requests are counted in the statistics instead of being printed
+    return
+
+  def do_GET(self):
+    self.__handle('GET')
+
+  def do_POST(self):
+    self.__handle('POST')
+
+  def do_PUT(self):
+    self.__handle('PUT')
+
+  def do_DELETE(self):
+    self.__handle('DELETE')
+
+  def __handle(self, method: str):
+    url = urlparse(self.path)
+    path = url.path.strip('/')
+    query = {key: values[0] for key, values in parse_qs(url.query).items()}
+    length = int(self.headers.get('Content-Length') or 0)
+    body = self.rfile.read(length) if length else b''
+
+    endpoint, route_params = self.__route(method, path)
+    server = self.server.local_api_server
+
+    injected = server.inject(endpoint=endpoint)
+    if injected is not None:
+      status_code, headers, response = injected
+    elif endpoint is None:
+      status_code, headers, response = 404, {}, {'message': f'No route for {method} {path}'}
+    else:
+      with server.state.lock:
+        status_code, response = self.__authorize(endpoint, route_params) or getattr(self, f'_{endpoint}')(route_params=route_params, query=query, body=body)
+      headers = {}
+
+    data = json.dumps(response).encode('utf-8')
+    server.throttle(len(body) + len(data))
+
+    self.send_response(status_code)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    for key, value in headers.items():
+      self.send_header(key, value)
+    self.end_headers()
+    self.wfile.write(data)
+
+    server.record(endpoint=endpoint or 'unknown', status_code=status_code, bytes_received=len(body), bytes_sent=len(data))
+
+  def __route(self, method: str, path: str):
+    for route_method, pattern, endpoint in self.ROUTES:
+      match = re.fullmatch(pattern, path)
+      if route_method == method and match is not None:
+        return endpoint, {key: unquote_plus(value) for key, value in match.groupdict().items()}
+    return None, {}
+
+  def __authorize(self, endpoint: str, route_params):
+    '''
+    Check the App Center token of a request, if the server only accepts some tokens
+
+    Apps and uploads belong to the token that created them, other tokens get a 404 like for an app of another account
+
+    Returns
+    ----------
+    error : tuple
+      Status code and body of the rejected request or None
+    '''
+    state = self.server.local_api_server.state
+    app_center_tokens = self.server.local_api_server.app_center_tokens
+    if app_center_tokens is None or endpoint in self.GITHUB_ENDPOINTS:
+      return None
+
+    token = self.headers.get('X-API-Token')
+    if token not in app_center_tokens:
+      return 401, {'code': 'Unauthorized', 'message': 'Invalid API token'}
+
+    if 'app' in route_params:
+      owner_token = state.app_tokens.get((route_params['owner'], route_params['app']))
+    else:
+      owner_token = state.uploads.get(route_params.get('id'), {}).get('api_token')
+
+    if owner_token is not None and owner_token != token:
+      return 404, {'code': 'NotFound', 'message': 'App not found', 'error': True}
+    return None
+
+  def __json(self, body: bytes):
+    try:
+      return json.loads(body) if body else {}
+    except ValueError:
+      return {}
+
+  '''
+  App Center
+  '''
+  def _create_app(self, route_params, query, body):
+    app = self.__json(body)
+    key = (route_params['owner'], app.get('name'))
+    if key in self.server.local_api_server.state.apps:
+      return 409, {'code': 'Conflict', 'message': f"An app with the name {app.get('name')} already exists"}
+
+    app = {**app, 'id': str(uuid.uuid4()), 'owner': {'name': route_params['owner']}, 'app_secret': str(uuid.uuid4())}
+    self.server.local_api_server.state.apps[key] = app
+    self.server.local_api_server.state.app_tokens[key] = self.headers.get('X-API-Token')
+    return 201, app
+
+  def _get_app(self, route_params, query, body):
+    app = self.server.local_api_server.state.apps.get((route_params['owner'], route_params['app']))
+    if app is None:
+      return 404, {'code': 'NotFound', 'message': 'App not found'}
+    return 200, app
+
+  def _delete_app(self, route_params, query, body):
+    state = self.server.local_api_server.state
+    key = (route_params['owner'], route_params['app'])
+    if state.apps.pop(key, None) is None:
+      return 404, {'code': 'NotFound', 'message': 'App not found'}
+    state.app_tokens.pop(key, None)
+    state.repo_configs.pop(key, None)
+    for branch_key in [branch_key for branch_key in state.branch_configs if branch_key[:2] == key]:
+      del state.branch_configs[branch_key]
+    return 200, {}
+
+  def _get_repo_config(self, route_params, query, body):
+    repo_configs = self.server.local_api_server.state.repo_configs.get((route_params['owner'], route_params['app']))
+    if repo_configs is None:
+      return 404, {'code': 'NotFound', 'message': 'Repository configuration not found'}
+    return 200, repo_configs
+
+  def _repo_config(self, route_params, query, body):
+    state = self.server.local_api_server.state
+    key = (route_params['owner'], route_params['app'])
+    if key not in state.apps:
+      return 404, {'code': 'NotFound', 'message': 'App not found'}
+    state.repo_configs[key] = [{**self.__json(body), 'id': str(uuid.uuid4()), 'state': 'active'}]
+    return 200, {'message': 'Repository configuration created'}
+
+  def _get_branch_config(self, route_params, query, body):
+    branch_config = self.server.local_api_server.state.branch_configs.get((route_params['owner'], route_params['app'], route_params['branch']))
+    if branch_config is None:
+      return 404, {'code': 'NotFound', 'message': 'Branch configuration not found'}
+    return 200, branch_config
+
+  def _branch_config(self, route_params, query, body):
+    state = self.server.local_api_server.state
+    if (route_params['owner'], route_params['app']) not in state.apps:
+      return 404, {'code': 'NotFound', 'message': 'App not found'}
+    branch_config = {**self.__json(body), 'id': len(state.branch_configs) + 1}
+    state.branch_configs[(route_params['owner'], route_params['app'], route_params['branch'])] = branch_config
+    return 200, branch_config
+
+  def _file_asset(self, route_params, query, body):
+    server = self.server.local_api_server
+    id = str(uuid.uuid4())
+    token = uuid.uuid4().hex
+    server.state.uploads[id] = {'token': token, 'api_token': self.headers.get('X-API-Token'), 'app': route_params['app'], 'file_name': None, 'file_size': 0, 'chunks': {}, 'state': 'Created'}
+    return 200, {
+      'id': id,
+      'location': f'{server.base_url}/assets/{id}',
+      'token': token,
+      'urlEncodedToken': token,
+      'uploadDomain': server.base_url,
+      'uploadWindowLocation': f'{server.base_url}/upload',
+    }
+
+  '''
+  App Center upload
+  '''
+  def __get_upload(self, route_params, query):
+    upload = self.server.local_api_server.state.uploads.get(route_params['id'])
+    if upload is None or upload['token'] != query.get('token'):
+      return None
+    return upload
+
+  def __missing_chunks(self, upload):
+    total_blocks = math.ceil(upload['file_size'] / self.server.local_api_server.chunk_size) if upload['file_size'] else 0
+    return [chunk for chunk in range(1, total_blocks + 1) if chunk not in upload['chunks']]
+
+  def _set_metadata(self, route_params, query, body):
+    upload = self.__get_upload(route_params, query)
+    if upload is None:
+      return 404, {'error': True, 'message': 'Upload not found'}
+
+    upload['file_name'] = query.get('file_name')
+    upload['file_size'] = int(query.get('file_size') or 0)
+    upload['state'] = 'Uploading'
+    return 200, {
+      'id': route_params['id'],
+      'chunk_size': self.server.local_api_server.chunk_size,
+      'chunk_list': self.__missing_chunks(upload),
+      'blob_partitions': 1,
+      'resume_restart': False,
+      'error': False,
+      'status_code': 'Success',
+    }
+
+  def _upload_chunk(self, route_params, query, body):
+    upload = self.__get_upload(route_params, query)
+    if upload is None:
+      return 404, {'error': True, 'message': 'Upload not found'}
+
+    chunk_number = int(query.get('block_number') or 0)
+    upload['chunks'][chunk_number] = len(body)
+    return 200, {'error': False, 'chunk_num': chunk_number, 'error_code': 'None'}
+
+  def _upload_finished(self, route_params, query, body):
+    server = self.server.local_api_server
+    upload = self.__get_upload(route_params, query)
+    if upload is None:
+      return 404, {'error': True, 'message': 'Upload not found'}
+
+    missing_chunks = self.__missing_chunks(upload)
+    if missing_chunks or sum(upload['chunks'].values()) != upload['file_size']:
+      return 200, {'error': True, 'chunk_num': 0, 'error_code': 'ChunksMissing', 'message': f'{len(missing_chunks)} chunks are missing'}
+
+    upload['state'] = 'Done'
+    return 200, {
+      'error': False,
+      'chunk_num': 0,
+      'error_code': 'None',
+      'state': 'Done',
+      'location': f"{server.base_url}/assets/{route_params['id']}",
+      'raw_location': f"{server.base_url}/assets/{route_params['id']}",
+      'absolute_uri': f"{server.base_url}/files/{route_params['id']}/{upload['file_name']}",
+    }
+
+  def _upload_status(self, route_params, query, body):
+    upload = self.__get_upload(route_params, query)
+    if upload is None:
+      return 404, {'error': True, 'message': 'Upload not found'}
+    if upload['state'] == 'Cancelled':
+      return 200, {'error': True, 'message': 'Upload was cancelled'}
+    return 200, {'error': False, 'state': upload['state'], 'chunk_list': self.__missing_chunks(upload)}
+
+  def _cancel_upload(self, route_params, query, body):
+    upload = self.__get_upload(route_params, query)
+    if upload is None:
+      return 404, {'error': True, 'message': 'Upload not found'}
+    upload['state'] = 'Cancelled'
+    return 200, {'error': False, 'state': 'Cancelled'}
+
+  '''
+  Github
+  '''
+  def _get_branch(self, route_params, query, body):
+    sha = self.server.local_api_server.state.get_branches(route_params['repo']).get(route_params['branch'])
+    if sha is None:
+      return 404, {'message': 'Branch not found'}
+    return 200, {'name': route_params['branch'], 'commit': {'sha': sha}}
+
+  def _create_ref(self, route_params, query, body):
+    ref = self.__json(body)
+    branch = ref.get('ref', '').replace('refs/heads/', '', 1)
+    branches = self.server.local_api_server.state.get_branches(route_params['repo'])
+    if branch in branches:
+      return 422, {'message': 'Reference already exists'}
+    branches[branch] = ref.get('sha')
+    return 201, {'ref': ref.get('ref'), 'object': {'sha': ref.get('sha'), 'type': 'commit'}}
+
+class LocalApiServer:
+  '''
+  Local HTTP stand-in of App Center, the App Center upload domain and Github
+
+  Every request waits for the injected latency and for its bytes at the given bandwidth.
+  Requests can fail at random with 503 or be rate limited with 429, to exercise the retries
+  '''
+  def __init__(self, host: str = '127.0.0.1', port: int = 0, **kwargs) -> None:
+    '''
+    Constructor for LocalApiServer Class
+
+    Parameters
+    ----------
+    host : str
+      Interface to listen on
+    port : int
+      Port to listen on. 0 picks a free port
+    kwargs : dict
+      [latency] seconds every request waits, [jitter] maximum random seconds added to the latency,
+      [bandwidth] bytes per second of every request, [error_rate] share of requests failing with 503,
+      [rate_limit_rate] share of requests answered with 429, [retry_after] seconds of the Retry-After header of a 429,
+      [error_endpoints] endpoint names the errors are injected to, all if None,
+      [chunk_size] upload chunk size,
+      [app_center_tokens] App Center tokens accepted by the server. If given, other tokens are rejected with 401
+      and apps and uploads are only visible to the token that created them. If None, every token is accepted
+    '''
+    self.__latency = kwargs.get('latency', 0)
+    self.__jitter = kwargs.get('jitter', 0)
+    self.__bandwidth = kwargs.get('bandwidth')
+    self.__error_rate = kwargs.get('error_rate', 0)
+    self.__rate_limit_rate = kwargs.get('rate_limit_rate', 0)
+    self.__retry_after = kwargs.get('retry_after', 0)
+    self.__error_endpoints = kwargs.get('error_endpoints')
+    self.chunk_size = kwargs.get('chunk_size', APP_CENTER_CONSTANTS.LOCAL_API_CHUNK_SIZE)
+    self.app_center_tokens = kwargs.get('app_center_tokens')
+    self.state = LocalApiState()
+    self.__stats_lock = threading.Lock()
+    self.__stats = {}
+    self.__server = ThreadingHTTPServer((host, port), LocalApiHandler)
+    self.__server.daemon_threads = True
+    self.__server.local_api_server = self
+    self.__thread = None
+    self.__previous_overrides = None
+
+  @property
+  def base_url(self):
+    host, port = self.__server.server_address[:2]
+    return f'http://{host}:{port}'
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.stop()
+
+  def start(self):
+    '''
+    Serve the requests on a background thread
+    '''
+    self.__thread = threading.Thread(target=self.__server.serve_forever, name='local-api-server', daemon=True)
+    self.__thread.start()
+    return self
+
+  def stop(self):
+    '''
+    Stop serving and restore the host overrides
+    '''
+    self.restore_hosts()
+    self.__server.shutdown()
+    self.__server.server_close()
+
+  def override_hosts(self, hostnames=('api.appcenter.ms', 'api.github.com')):
+    '''
+    Send the requests of the apis to this server
+
+    Parameters
+    ----------
+    hostnames : list
+      Hosts replaced by the server. Apis created afterwards use the server
+    '''
+    self.__previous_overrides = dict(APP_CENTER_CONSTANTS.API_HOST_OVERRIDES)
+    for hostname in hostnames:
+      APP_CENTER_CONSTANTS.API_HOST_OVERRIDES[hostname] = self.base_url
+
+  def restore_hosts(self):
+    if self.__previous_overrides is not None:
+      APP_CENTER_CONSTANTS.API_HOST_OVERRIDES.clear()
+      APP_CENTER_CONSTANTS.API_HOST_OVERRIDES.update(self.__previous_overrides)
+      self.__previous_overrides = None
+
+  def inject(self, endpoint: str):
+    '''
+    Wait for the latency and pick an injected error for a request
+
+    Returns
+    ----------
+    error : tuple
+      Status code, headers and body of the injected error or None
+    '''
+    delay = self.__latency + (random.uniform(0, self.__jitter) if self.__jitter else 0)
+    if delay > 0:
+      time.sleep(delay)
+
+    if self.__error_endpoints is not None and endpoint not in self.__error_endpoints:
+      return None
+
+    draw = random.random()
+    if draw < self.__rate_limit_rate:
+      return 429, {'Retry-After': str(self.__retry_after)}, {'message': 'Rate limit exceeded'}
+    if draw < self.__rate_limit_rate + self.__error_rate:
+      return 503, {}, {'message': 'Service unavailable'}
+    return None
+
+  def throttle(self, size: int):
+    '''
+    Wait for the bytes of a request at the configured bandwidth
+    '''
+    if self.__bandwidth:
+      time.sleep(size / self.__bandwidth)
+
+  def record(self, endpoint: str, status_code: int, bytes_received: int, bytes_sent: int):
+    with self.__stats_lock:
+      stats = self.__stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'bytes_received': 0, 'bytes_sent': 0})
+      stats['requests'] += 1
+      stats['errors'] += 1 if status_code >= 400 else 0
+      stats['bytes_received'] += bytes_received
+      stats['bytes_sent'] += bytes_sent
+
+  def stats(self):
+    '''
+    Returns
+    ----------
+    stats : dict
+      Number of requests, error responses, bytes received and bytes sent by endpoint
+    '''
+    with self.__stats_lock:
+      return {endpoint: dict(stats) for endpoint, stats in self.__stats.items()}
+
+def main():
+  port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+  server = LocalApiServer(port=port)
+  print(f'Serving App Center, upload and Github endpoints on {server.base_url}')
+  try:
+    server.start()
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    server.stop()
+
+if __name__ == '__main__':
+  main()
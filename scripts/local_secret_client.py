@@ -0,0 +1,321 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict
+from urllib.parse import urlparse
+
+from constants import key_vault_constants as KEY_VAULT_CONSTANTS
+
+try:
+  from azure.core.exceptions import ResourceNotFoundError
+except ImportError:
+  class ResourceNotFoundError(Exception):
+    '''
+    Raised for a missing secret when the Azure SDK is not installed, like azure.core.exceptions.ResourceNotFoundError
+    '''
+
+class LocalSecretProperties:
+  '''
+  Properties of a secret version, with the attributes of azure.keyvault.secrets.SecretProperties used by KeyVault
+  '''
+  def __init__(self, vault_url: str, name: str, version: str, content_type: str = None, tags: Dict = None, enabled: bool = True, created_on: datetime = None, updated_on: datetime = None) -> None:
+    self.vault_url = vault_url
+    self.name = name
+    self.version = version
+    self.content_type = content_type
+    self.tags = tags
+    self.enabled = enabled
+    self.created_on = created_on
+    self.updated_on = updated_on
+
+  @property
+  def id(self):
+    return f'{self.vault_url.rstrip("/")}/secrets/{self.name}/{self.version}'
+
+class LocalSecret:
+  '''
+  Secret version with its value, like azure.keyvault.secrets.KeyVaultSecret
+  '''
+  def __init__(self, properties: LocalSecretProperties, value: str) -> None:
+    self.properties = properties
+    self.value = value
+
+  @property
+  def name(self):
+    return self.properties.name
+
+  @property
+  def id(self):
+    return self.properties.id
+
+class LocalDeleteSecretPoller:
+  '''
+  Completed poller returned by begin_delete_secret
+  '''
+  def __init__(self, properties: LocalSecretProperties) -> None:
+    self.__properties = properties
+
+  def result(self, timeout: float = None):
+    return self.__properties
+
+  def wait(self, timeout: float = None):
+    return None
+
+  def done(self):
+    return True
+
+class LocalVault:
+  '''
+  Secrets of a vault url kept in memory and optionally persisted to a JSON file per vault
+
+  Every client of the same vault url and directory shares the same LocalVault, like clients of a real vault share its secrets
+  '''
+  __vaults = {}
+  __registry_lock = threading.Lock()
+
+  def __init__(self, vault_url: str, file_path: str = None) -> None:
+    '''
+    Constructor for LocalVault Class
+
+    Parameters
+    ----------
+    vault_url : str
+      Ex: https://vault-name.vault.azure.net/
+    file_path : str
+      JSON file in which the secrets are persisted. If None, the secrets are kept in memory only
+    '''
+    self.__vault_url = vault_url
+    self.__file_path = file_path
+    self.__lock = threading.Lock()
+    # Versions of every secret by name, the last version is the current one
+    self.__secrets = self.__load()
+
+  @classmethod
+  def for_url(cls, vault_url: str, directory: str = None):
+    '''
+    Get the vault of a url, creating it on first use
+
+    Parameters
+    ----------
+    vault_url : str
+      Ex: https://vault-name.vault.azure.net/
+    directory : str
+      Directory of the JSON files of the vaults. If None, the vault is kept in memory only
+
+    Returns
+    ----------
+    vault : LocalVault
+    '''
+    key = (vault_url.rstrip('/'), directory)
+    with cls.__registry_lock:
+      if key not in cls.__vaults:
+        file_path = os.path.join(directory, f'{urlparse(vault_url).netloc or vault_url.strip("/")}.json') if directory else None
+        cls.__vaults[key] = cls(vault_url=vault_url, file_path=file_path)
+      return cls.__vaults[key]
+
+  def __load(self):
+    '''
+    Private method to load the persisted secrets
+    '''
+    if not self.__file_path:
+      return {}
+
+    try:
+      with open(self.__file_path, 'r') as file:
+        entries = json.load(file)
+    except (OSError, ValueError):
+      return {}
+
+    return {
+      name: [
+        LocalSecret(
+          properties=LocalSecretProperties(
+            vault_url=self.__vault_url,
+            name=name,
+            version=entry['version'],
+            content_type=entry['content_type'],
+            tags=entry['tags'],
+            enabled=entry['enabled'],
+            created_on=datetime.fromisoformat(entry['created_on']),
+            updated_on=datetime.fromisoformat(entry['updated_on']),
+          ),
+          value=entry['value'],
+        )
+        for entry in versions
+      ]
+      for name, versions in entries.items()
+    }
+
+  def __save(self):
+    '''
+    Private method to persist the secrets. Must be called with the lock held
+    '''
+    if not self.__file_path:
+      return
+
+    directory = os.path.dirname(self.__file_path)
+    if directory:
+      os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    entries = {
+      name: [
+        {
+          'version': secret.properties.version,
+          'value': secret.value,
+          'content_type': secret.properties.content_type,
+          'tags': secret.properties.tags,
+          'enabled': secret.properties.enabled,
+          'created_on': secret.properties.created_on.isoformat(),
+          'updated_on': secret.properties.updated_on.isoformat(),
+        }
+        for secret in versions
+      ]
+      for name, versions in self.__secrets.items()
+    }
+
+    # The file holds the secret values in plain text, only the current user may read it
+    temporary_path = f'{self.__file_path}.tmp'
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as file:
+      json.dump(entries, file)
+    os.replace(temporary_path, self.__file_path)
+
+  def set_secret(self, name: str, value, content_type: str = None, tags: Dict = None, enabled: bool = None):
+    with self.__lock:
+      now = datetime.now(timezone.utc)
+      properties = LocalSecretProperties(
+        vault_url=self.__vault_url,
+        name=name,
+        version=uuid.uuid4().hex,
+        content_type=content_type,
+        tags=dict(tags) if tags is not None else None,
+        enabled=True if enabled is None else enabled,
+        created_on=now,
+        updated_on=now,
+      )
+      # The service stores every value as a string
+      secret = LocalSecret(properties=properties, value=str(value))
+      self.__secrets.setdefault(name, []).append(secret)
+      self.__save()
+      return secret
+
+  def get_secret(self, name: str, version: str = None):
+    with self.__lock:
+      versions = self.__secrets.get(name, [])
+      matching = [secret for secret in versions if version is None or secret.properties.version == version]
+      if not matching:
+        raise ResourceNotFoundError(f'Secret not found: {name}' + (f'/{version}' if version else ''))
+      return matching[-1]
+
+  def list_properties(self, name: str = None):
+    with self.__lock:
+      if name is not None:
+        return [secret.properties for secret in self.__secrets.get(name, [])]
+      return [versions[-1].properties for versions in self.__secrets.values()]
+
+  def delete_secret(self, name: str):
+    with self.__lock:
+      versions = self.__secrets.pop(name, None)
+      if versions is None:
+        raise ResourceNotFoundError(f'Secret not found: {name}')
+      self.__save()
+      return versions[-1].properties
+
+class LocalSecretClient:
+  '''
+  In-process stand-in of azure.keyvault.secrets.SecretClient
+
+  Secrets are kept in a LocalVault, in memory or in a JSON file per vault, and every call waits for an injected latency
+  so the fetch, caching and concurrency of KeyVault can be measured without Azure
+  '''
+  def __init__(self, vault_url: str, credential = None, directory: str = None, latency: float = 0, jitter: float = 0, page_size: int = KEY_VAULT_CONSTANTS.LOCAL_VAULT_PAGE_SIZE) -> None:
+    '''
+    Constructor for LocalSecretClient Class
+
+    Parameters
+    ----------
+    vault_url : str
+      Ex: https://vault-name.vault.azure.net/
+    credential : Any
+      Ignored, accepted to be called like SecretClient
+    directory : str
+      Directory of the JSON files of the vaults. If None, the secrets are kept in memory only
+    latency : float
+      Seconds every request waits
+    jitter : float
+      Maximum number of random seconds added to the latency of a request
+    page_size : int
+      Number of secrets listed per request, listing a vault waits for the latency once per page
+    '''
+    self.vault_url = vault_url
+    self.__vault = LocalVault.for_url(vault_url=vault_url, directory=directory)
+    self.__latency = latency
+    self.__jitter = jitter
+    self.__page_size = page_size
+
+  @classmethod
+  def factory(cls, directory: str = None, latency: float = 0, jitter: float = 0):
+    '''
+    Create a secret client factory for KeyVault
+
+    Parameters
+    ----------
+    directory : str
+      Directory of the JSON files of the vaults. If None, the secrets are kept in memory only
+    latency : float
+      Seconds every request waits
+    jitter : float
+      Maximum number of random seconds added to the latency of a request
+
+    Returns
+    ----------
+    secret_client_factory : Callable
+      Called with the vault url and the credential, returns a LocalSecretClient
+    '''
+    return lambda vault_url, credential = None: cls(vault_url=vault_url, credential=credential, directory=directory, latency=latency, jitter=jitter)
+
+  def __wait(self):
+    delay = self.__latency + (random.uniform(0, self.__jitter) if self.__jitter else 0)
+    if delay > 0:
+      time.sleep(delay)
+
+  def __paged(self, properties):
+    # Like ItemPaged, every page is requested when the iteration reaches it
+    self.__wait()
+    for index, property in enumerate(properties):
+      if index > 0 and index % self.__page_size == 0:
+        self.__wait()
+      yield property
+
+  def set_secret(self, name: str, value, **kwargs):
+    self.__wait()
+    return self.__vault.set_secret(name, value, content_type=kwargs.get('content_type'), tags=kwargs.get('tags'), enabled=kwargs.get('enabled'))
+
+  def get_secret(self, name: str, version: str = None, **kwargs):
+    self.__wait()
+    return self.__vault.get_secret(name, version=version)
+
+  def list_properties_of_secrets(self, **kwargs):
+    properties = self.__vault.list_properties()
+    return self.__paged(properties)
+
+  def list_properties_of_secret_versions(self, name: str, **kwargs):
+    properties = self.__vault.list_properties(name=name)
+    return self.__paged(properties)
+
+  def begin_delete_secret(self, name: str, **kwargs):
+    self.__wait()
+    return LocalDeleteSecretPoller(self.__vault.delete_secret(name))
+
+  def close(self):
+    return None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
@@ -0,0 +1,369 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+from api.api_wrapper import ApiWrapper
+from chunk_scheduler import ChunkScheduler
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+from constants import key_vault_constants as KEY_VAULT_CONSTANTS
+from file import File
+from key_vault import KeyVault
+from local_api_server import LocalApiServer
+from local_secret_client import LocalSecretClient
+from upload_cache import UploadCache
+
+'''
+To run the microbenchmarks
+python3 microbenchmarks.py [options]
+Ex: python3 microbenchmarks.py --scale medium --report microbenchmarks.json --baseline baseline.json
+
+Measures the hot paths of the scripts on synthetic files, secrets and chunks, sized by the scale.
+With --baseline, exits with 1 if the median of a benchmark is slower than the baseline allows
+'''
+
+class Microbenchmark:
+  '''
+  Operation measured by the MicrobenchmarkSuite
+  '''
+  def __init__(self, name: str, operation: Callable, setup: Callable = None, bytes: int = None, items: int = None) -> None:
+    '''
+    Parameters
+    ----------
+    name : str
+      Unique benchmark name
+    operation : Callable
+      Called without arguments once per sample
+    setup : Callable
+      Called without arguments before every sample, outside of the measurement
+    bytes : int
+      Bytes processed per sample, to report the throughput
+    items : int
+      Items processed per sample, to report the time per item
+    '''
+    self.name = name
+    self.operation = operation
+    self.setup = setup
+    self.bytes = bytes
+    self.items = items
+
+class MicrobenchmarkSuite:
+  '''
+  Class to run the microbenchmarks of the scripts
+
+  Every benchmark is run warmup times without measurement and then repeat times.
+  The printed output of the scripts is discarded while measuring
+  '''
+  def __init__(self, scale: str = 'small', repeat: int = 5, warmup: int = 1) -> None:
+    '''
+    Constructor for MicrobenchmarkSuite Class
+
+    Parameters
+    ----------
+    scale : str
+      Key of APP_CENTER_CONSTANTS.MICROBENCHMARK_SCALES with the file sizes, secret counts, chunk counts and api calls
+    repeat : int
+      Measured samples per benchmark
+    warmup : int
+      Samples per benchmark that are not measured
+    '''
+    self.__scale = scale
+    self.__sizes = APP_CENTER_CONSTANTS.MICROBENCHMARK_SCALES[scale]
+    self.__repeat = repeat
+    self.__warmup = warmup
+    self.__filter = None
+    self.__benchmarks = []
+
+  def __is_selected(self, *names: str):
+    '''
+    Private method to check if any of the benchmark names matches the filter of the run.
+    The benchmarks are added by parameter, the files and vaults of a parameter are only created if one of its benchmarks runs
+    '''
+    return self.__filter is None or any(self.__filter in name for name in names)
+
+  def add(self, name: str, operation: Callable, setup: Callable = None, bytes: int = None, items: int = None):
+    if not self.__is_selected(name):
+      return
+    if any(benchmark.name == name for benchmark in self.__benchmarks):
+      raise ValueError(f'Benchmark {name} already exists')
+    self.__benchmarks.append(Microbenchmark(name=name, operation=operation, setup=setup, bytes=bytes, items=items))
+
+  def __measure(self, benchmark: Microbenchmark):
+    samples = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+      for index in range(self.__warmup + self.__repeat):
+        if benchmark.setup is not None:
+          benchmark.setup()
+        start = time.perf_counter()
+        benchmark.operation()
+        duration = time.perf_counter() - start
+        if index >= self.__warmup:
+          samples.append(duration)
+
+    median = statistics.median(samples)
+    result = {
+      'samples': samples,
+      'min': min(samples),
+      'median': median,
+      'mean': statistics.mean(samples),
+      'stdev': statistics.stdev(samples) if len(samples) > 1 else 0,
+    }
+    if benchmark.bytes:
+      result['bytes'] = benchmark.bytes
+      result['throughput'] = benchmark.bytes / median if median > 0 else None
+    if benchmark.items:
+      result['items'] = benchmark.items
+      result['per_item'] = median / benchmark.items
+    return result
+
+  def __add_file_benchmarks(self, directory: str):
+    '''
+    Private method to add the Base 64 and chunked read benchmarks of every file size
+    '''
+    chunk_size = APP_CENTER_CONSTANTS.LOCAL_API_CHUNK_SIZE
+    for size in self.__sizes['file_sizes']:
+      names = [f'file.encode_base64[{size}]', f'file.decode_base64[{size}]', f'file.read_file_chunk[{size}]', f'file.read_file_chunk.memory_map[{size}]']
+      if not self.__is_selected(*names):
+        continue
+
+      path = os.path.join(directory, f'file-{size}.bin')
+      with open(path, 'wb') as file:
+        # Written block by block, so gigabyte files are not held in memory
+        remaining = size
+        while remaining > 0:
+          file.write(os.urandom(min(remaining, 16 * 1024 * 1024)))
+          remaining -= 16 * 1024 * 1024
+
+      encoded = File(file_path=path).encode_base64()
+      decoded_path = os.path.join(directory, f'decoded-{size}.bin')
+
+      def read_chunks(file: File):
+        with file:
+          for start in range(0, file.file_size, chunk_size):
+            chunk = file.read_file_chunk(start, min(start + chunk_size, file.file_size))
+            if isinstance(chunk, memoryview):
+              chunk.release()
+
+      self.add(names[0], lambda path=path: File(file_path=path).encode_base64(), bytes=size)
+      self.add(names[1], lambda path=path, encoded=encoded, decoded_path=decoded_path: File(file_path=path).decode_base64(encoded, decoded_path), bytes=size)
+      self.add(names[2], lambda path=path: read_chunks(File(file_path=path)), bytes=size)
+      self.add(names[3], lambda path=path: read_chunks(File(file_path=path, memory_map=True)), bytes=size)
+
+  def __add_chunk_benchmarks(self):
+    '''
+    Private method to add the chunk scheduling benchmarks of every chunk count, the work of __enqueue_chunks and the upload workers
+    '''
+    for count in self.__sizes['chunk_counts']:
+      def schedule(count: int = count):
+        scheduler = ChunkScheduler(total_blocks=count)
+        scheduler.enqueue(range(1, count + 1))
+        # Chunks reported again by the server are ignored
+        scheduler.enqueue(range(1, count + 1))
+        chunk_number = scheduler.next_chunk()
+        while chunk_number is not None:
+          scheduler.complete(chunk_number)
+          chunk_number = scheduler.next_chunk()
+
+      self.add(f'chunk_scheduler.enqueue[{count}]', schedule, items=count)
+
+  def __create_template_directory(self, directory: str, count: int):
+    '''
+    Private method to copy the key vault templates with count additional environment variables in every template
+    '''
+    template_directory = os.path.join(directory, f'templates-{count}')
+    os.makedirs(template_directory, exist_ok=True)
+    source_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), KEY_VAULT_CONSTANTS.KEY_VAULT_TEMPLATE_PATH)
+    for file_name in os.listdir(source_directory):
+      with open(os.path.join(source_directory, file_name), 'r') as file:
+        template = json.load(file)
+      template['environmentVariables'] = template.get('environmentVariables', []) + [{'name': f'BENCHMARK_VARIABLE_{index}', 'value': f'value-{index}'} for index in range(count)]
+      with open(os.path.join(template_directory, file_name), 'w') as file:
+        json.dump(template, file)
+    return template_directory
+
+  def __add_key_vault_benchmarks(self, directory: str, certificates: Dict):
+    '''
+    Private method to add the secret type dispatch and the pipeline configuration benchmarks of every secret count
+    '''
+    for count in self.__sizes['secret_counts']:
+      names = [f'key_vault.set_key_vault[{count}]', f'key_vault.construct_response[{count}]']
+      if not self.__is_selected(*names):
+        continue
+
+      vault_urls = {
+        env['name']: {
+          'common_vault_url': f"https://benchmark-{count}-{env['name']}-common.vault.azure.net/",
+          'oem_vault_url': f'https://benchmark-{count}-oem.vault.azure.net/',
+        }
+        for env in KEY_VAULT_CONSTANTS.ENVIRONMENTS
+      }
+      key_vault = KeyVault(
+        environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+        vault_urls=vault_urls,
+        certificates=certificates,
+        template_directory=self.__create_template_directory(directory, count),
+        upload_cache=UploadCache(cache_path=None),
+        secret_client_factory=LocalSecretClient.factory(),
+      )
+      with contextlib.redirect_stdout(io.StringIO()):
+        key_vault.set_vault_secrets()
+
+      # A secret of every content type, repeated up to count secrets
+      secrets = {}
+      for index in range(count):
+        kind = index % 5
+        if kind == 0:
+          secrets[f'benchmark_str_{index}'] = f'value-{index}'
+        elif kind == 1:
+          secrets[f'benchmark_bool_{index}'] = index % 2 == 0
+        elif kind == 2:
+          secrets[f'benchmark_dict_{index}'] = {'name': f'value-{index}', 'nested': {'index': index}}
+        elif kind == 3:
+          secrets[f'benchmark_list_{index}'] = [{'name': f'BENCHMARK_LIST_{index}', 'value': f'value-{index}'}]
+        else:
+          secrets[f'benchmark_cert_{index}'] = f'value-{index}'.encode('utf-8')
+
+      # Private hot paths are called through their mangled names, so they are measured without the code around them
+      self.add(names[0], lambda key_vault=key_vault, secrets=secrets: key_vault._KeyVault__set_key_vault(json_data=secrets, env_name='dev', key_vault_type='common'), items=count)
+      self.add(names[1], lambda key_vault=key_vault: key_vault.get_vault_secrets(app_name='benchmark-android', platform='Android', env_name='prod'), items=count)
+
+  def __add_api_benchmarks(self, server: LocalApiServer):
+    '''
+    Private method to add the per call overhead benchmarks of ApiWrapper against the loopback server
+    '''
+    calls = self.__sizes['api_calls']
+    # The base url of the server has no rate limit, unlike the overridden hosts
+    api = ApiWrapper(server.base_url, headers={'accept': 'application/json'})
+
+    def get():
+      for _ in range(calls):
+        api.get(endpoint='repos/benchmark/benchmark/branches/main')
+
+    def post():
+      for index in range(calls):
+        api.post(endpoint='repos/benchmark/benchmark/git/refs', json={'ref': f'refs/heads/benchmark-{time.monotonic_ns()}-{index}', 'sha': '0' * 40})
+
+    self.add('api_wrapper.get', get, items=calls)
+    self.add('api_wrapper.post', post, items=calls)
+
+  def run(self, filter: str = None):
+    '''
+    Run every benchmark whose name contains the filter
+
+    Parameters
+    ----------
+    filter : str
+      Part of the benchmark names to run. Runs every benchmark if None
+
+    Returns
+    ----------
+    report : dict
+      Environment of the run and the samples, min, median, mean, stdev and throughput of every benchmark
+    '''
+    directory = tempfile.mkdtemp(prefix='microbenchmarks-')
+    try:
+      with LocalApiServer() as server:
+        server.override_hosts()
+
+        certificates = {'p12_password': 'benchmark', 'keystore_password': 'benchmark'}
+        for key in ['mobileprovision', 'p12', 'keystore']:
+          path = os.path.join(directory, f'benchmark.{key}')
+          with open(path, 'wb') as file:
+            file.write(os.urandom(4 * 1024))
+          certificates[f'{key}_path'] = path
+
+        # The filter is applied while adding the benchmarks, before their files and vaults are created
+        self.__filter = filter
+        self.__benchmarks = []
+        self.__add_file_benchmarks(directory)
+        self.__add_chunk_benchmarks()
+        self.__add_key_vault_benchmarks(directory, certificates)
+        self.__add_api_benchmarks(server)
+
+        results = {}
+        for benchmark in self.__benchmarks:
+          results[benchmark.name] = self.__measure(benchmark)
+          print(f"{benchmark.name:<48}{results[benchmark.name]['median'] * 1000:>12.3f} ms")
+    finally:
+      shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+      'scale': self.__scale,
+      'repeat': self.__repeat,
+      'python': platform.python_version(),
+      'platform': platform.platform(),
+      'results': results,
+    }
+
+def compare_results(report: Dict, baseline: Dict, tolerance: float):
+  '''
+  Compare the medians of a microbenchmark report with a baseline report
+
+  Parameters
+  ----------
+  report : dict
+    Report of MicrobenchmarkSuite.run
+  baseline : dict
+    Earlier report
+  tolerance : float
+    Allowed relative increase of the median. Ex: 0.2 for 20%
+
+  Returns
+  ----------
+  comparison : dict
+    Ratio of the median to the baseline median by benchmark name, for the benchmarks of both reports
+  regressions : list
+    Descriptions of the benchmarks that are slower than the tolerance allows
+  '''
+  comparison = {}
+  regressions = []
+  for name, result in report['results'].items():
+    baseline_result = baseline.get('results', {}).get(name)
+    if baseline_result is None or baseline_result['median'] <= 0:
+      continue
+    ratio = result['median'] / baseline_result['median']
+    comparison[name] = ratio
+    if ratio > 1 + tolerance:
+      regressions.append(f"{name}: {result['median'] * 1000:.3f} ms instead of {baseline_result['median'] * 1000:.3f} ms")
+  return comparison, regressions
+
+def main():
+  parser = argparse.ArgumentParser(description='Run the microbenchmarks of the scripts')
+  parser.add_argument('--scale', default='small', choices=sorted(APP_CENTER_CONSTANTS.MICROBENCHMARK_SCALES), help='Sizes of the synthetic inputs')
+  parser.add_argument('--filter', default=None, help='Only run the benchmarks whose name contains the filter')
+  parser.add_argument('--repeat', type=int, default=5, help='Measured samples per benchmark')
+  parser.add_argument('--warmup', type=int, default=1, help='Samples per benchmark that are not measured')
+  parser.add_argument('--report', default=APP_CENTER_CONSTANTS.MICROBENCHMARK_REPORT_PATH, help='JSON file the report is written to')
+  parser.add_argument('--baseline', default=None, help='Report of an earlier run to compare with')
+  parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative increase of the median of a benchmark')
+  args = parser.parse_args()
+
+  report = MicrobenchmarkSuite(scale=args.scale, repeat=args.repeat, warmup=args.warmup).run(filter=args.filter)
+
+  with open(args.report, 'w') as file:
+    json.dump(report, file, indent=2)
+  print(f'Report written to {args.report}')
+
+  if args.baseline:
+    with open(args.baseline, 'r') as file:
+      baseline = json.load(file)
+
+    comparison, regressions = compare_results(report, baseline, tolerance=args.tolerance)
+    print()
+    for name, ratio in comparison.items():
+      print(f'{name:<48}{ratio:>8.2f}x')
+    for regression in regressions:
+      print(f'Regression in {regression}')
+    if regressions:
+      sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import tracing
+from api.app_center_api import AppCenterApi
+from api.github_api import GithubApi
+from app_center import AppCenter
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+from constants import key_vault_constants as KEY_VAULT_CONSTANTS
+from file import MemoryFile
+from github import Github
+from key_vault import KeyVault
+from local_api_server import LocalApiServer
+from local_secret_client import LocalSecretClient
+from upload_app_center_attachments import UploadAppCenterAttachments
+from upload_cache import UploadCache
+
+'''
+To run the benchmark
+python3 provisioning_benchmark.py [options]
+Ex: python3 provisioning_benchmark.py --oems 2 --latency 0.05 --bandwidth 10000000 --report report.json --baseline baseline.json
+
+Provisions OEMs end to end against LocalApiServer and local vaults, and reports the wall clock time,
+requests and bytes of every phase. With --baseline, exits with 1 if a phase is slower or sends more requests than the baseline allows
+'''
+
+class ProvisioningBenchmark:
+  '''
+  Class to measure the provisioning phases against the local stand-ins of App Center, Github and Azure Key Vault
+  '''
+  PHASES = ['vault_sync', 'github', 'upload', 'provisioning', 'reconcile']
+
+  def __init__(self, oems: int = 1, upload_size: int = 16 * 1024 * 1024, certificate_size: int = 64 * 1024, vault_latency: float = 0, server_options: Dict = None) -> None:
+    '''
+    Constructor for ProvisioningBenchmark Class
+
+    Parameters
+    ----------
+    oems : int
+      Number of OEMs provisioned one after another
+    upload_size : int
+      Size in bytes of the file uploaded by the upload phase
+    certificate_size : int
+      Size in bytes of every certificate stored in the vaults and uploaded by the provisioning
+    vault_latency : float
+      Seconds every request to the local vaults waits
+    server_options : dict
+      Latency, bandwidth and error injection of LocalApiServer
+    '''
+    self.__oems = oems
+    self.__upload_size = upload_size
+    self.__certificate_size = certificate_size
+    self.__secret_client_factory = LocalSecretClient.factory(latency=vault_latency)
+    self.__server_options = server_options or {}
+    self.__phases = {phase: {'duration': 0, 'requests': 0, 'errors': 0, 'bytes_received': 0, 'bytes_sent': 0, 'endpoints': {}} for phase in self.PHASES}
+
+  def __measure(self, server: LocalApiServer, phase: str, operation):
+    '''
+    Private method to run an operation and add its duration and the server requests to a phase
+    '''
+    before = server.stats()
+    start = time.monotonic()
+    with tracing.span(f'benchmark.{phase}', category='benchmark'):
+      result = operation()
+    duration = time.monotonic() - start
+    after = server.stats()
+
+    report = self.__phases[phase]
+    report['duration'] += duration
+    for endpoint, stats in after.items():
+      previous = before.get(endpoint, {})
+      delta = {key: value - previous.get(key, 0) for key, value in stats.items()}
+      if delta['requests'] == 0:
+        continue
+      endpoint_report = report['endpoints'].setdefault(endpoint, {key: 0 for key in delta})
+      for key, value in delta.items():
+        endpoint_report[key] += value
+        report[key] += value
+
+    return result
+
+  def __create_certificates(self, directory: str):
+    certificates = {'p12_password': 'benchmark', 'keystore_password': 'benchmark'}
+    for key, extension in [('mobileprovision_path', 'mobileprovision'), ('p12_path', 'p12'), ('keystore_path', 'keystore')]:
+      path = os.path.join(directory, f'benchmark.{extension}')
+      with open(path, 'wb') as file:
+        file.write(os.urandom(self.__certificate_size))
+      certificates[key] = path
+    return certificates
+
+  def __provision_oem(self, server: LocalApiServer, index: int, certificates: Dict):
+    '''
+    Private method to provision one OEM phase by phase
+    '''
+    name = f'benchmark-oem-{index}'
+    repo_name = f'benchmark/{name}'
+    template_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), KEY_VAULT_CONSTANTS.KEY_VAULT_TEMPLATE_PATH)
+    # The certificates are only set in the OEM vault of the last environment, every environment shares it like the default vault urls
+    vault_urls = {
+      env['name']: {
+        'common_vault_url': f"https://{name}-{env['name']}-common.vault.azure.net/",
+        'oem_vault_url': f"https://{name}-oem.vault.azure.net/",
+      }
+      for env in KEY_VAULT_CONSTANTS.ENVIRONMENTS
+    }
+
+    key_vault = KeyVault(
+      environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+      vault_urls=vault_urls,
+      certificates=certificates,
+      template_directory=template_directory,
+      upload_cache=UploadCache(cache_path=None),
+      secret_client_factory=self.__secret_client_factory,
+    )
+    self.__measure(server, 'vault_sync', lambda: key_vault.set_vault_secrets(incremental=True))
+
+    github = Github(
+      environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+      github_token='benchmark',
+      repo_name=repo_name,
+      github_api=GithubApi(github_token='benchmark'),
+    )
+    self.__measure(server, 'github', github.init_app)
+
+    apps = {
+      os_name: {
+        'display_name': f'{name} {os_name}',
+        'app_name': f'{name}-{os_name.lower()}',
+        'description': f'{name} {os_name} benchmark app',
+        'repo_url': f'https://github.com/{repo_name}',
+      }
+      for os_name in APP_CENTER_CONSTANTS.OS
+    }
+    app_center_api = AppCenterApi(app_center_token='benchmark')
+
+    upload = UploadAppCenterAttachments(APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT, app_center_api=app_center_api)
+    with MemoryFile(data=os.urandom(self.__upload_size), file_name='benchmark.bin') as file:
+      self.__measure(server, 'upload', lambda: upload.init_app(app_name=apps[APP_CENTER_CONSTANTS.OS[0]]['app_name'], file=file))
+
+    app_center = AppCenter(environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT, app_center_api=app_center_api, apps=apps, github=github, key_vault=key_vault)
+    self.__measure(server, 'provisioning', app_center.init_app)
+
+    # A second run finds everything in place, it measures the cost of an idempotent run
+    app_center = AppCenter(environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT, app_center_api=app_center_api, apps=apps, github=github, key_vault=key_vault)
+    self.__measure(server, 'reconcile', app_center.reconcile)
+
+  def run(self):
+    '''
+    Run every phase for every OEM
+
+    Returns
+    ----------
+    report : dict
+      Duration, requests, errors and bytes of every phase, by endpoint as well, and the total duration
+    '''
+    start = time.monotonic()
+    with tempfile.TemporaryDirectory() as directory, LocalApiServer(**self.__server_options) as server:
+      server.override_hosts()
+      certificates = self.__create_certificates(directory)
+      for index in range(self.__oems):
+        self.__provision_oem(server, index, certificates)
+
+    return {
+      'oems': self.__oems,
+      'duration': time.monotonic() - start,
+      'phases': self.__phases,
+    }
+
+def compare_reports(report: Dict, baseline: Dict, tolerance: float):
+  '''
+  Compare the phases of a benchmark report with a baseline report
+
+  Parameters
+  ----------
+  report : dict
+    Report of ProvisioningBenchmark.run
+  baseline : dict
+    Earlier report
+  tolerance : float
+    Allowed relative increase of the duration of a phase. Ex: 0.2 for 20%
+
+  Returns
+  ----------
+  regressions : list
+    Descriptions of the phases that are slower or send more requests than the baseline
+  '''
+  regressions = []
+  for phase, stats in report['phases'].items():
+    baseline_stats = baseline.get('phases', {}).get(phase)
+    if baseline_stats is None:
+      continue
+    if stats['duration'] > baseline_stats['duration'] * (1 + tolerance):
+      regressions.append(f"{phase}: {stats['duration']:.3f}s instead of {baseline_stats['duration']:.3f}s")
+    if stats['requests'] > baseline_stats['requests']:
+      regressions.append(f"{phase}: {stats['requests']} requests instead of {baseline_stats['requests']}")
+  return regressions
+
+def print_report(report: Dict):
+  print()
+  print(f"{'phase':<14}{'seconds':>10}{'requests':>10}{'errors':>8}{'received':>14}{'sent':>12}")
+  for phase, stats in report['phases'].items():
+    print(f"{phase:<14}{stats['duration']:>10.3f}{stats['requests']:>10}{stats['errors']:>8}{stats['bytes_received']:>14}{stats['bytes_sent']:>12}")
+  print(f"{'total':<14}{report['duration']:>10.3f}")
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the provisioning against local stand-ins of App Center, Github and Azure Key Vault')
+  parser.add_argument('--oems', type=int, default=1, help='Number of OEMs to provision')
+  parser.add_argument('--upload-size', type=int, default=16 * 1024 * 1024, help='Bytes of the file uploaded by the upload phase')
+  parser.add_argument('--certificate-size', type=int, default=64 * 1024, help='Bytes of every certificate')
+  parser.add_argument('--latency', type=float, default=0, help='Seconds every request to the server waits')
+  parser.add_argument('--jitter', type=float, default=0, help='Maximum random seconds added to the latency')
+  parser.add_argument('--bandwidth', type=float, default=None, help='Bytes per second of every request to the server')
+  parser.add_argument('--error-rate', type=float, default=0, help='Share of requests failing with 503')
+  parser.add_argument('--rate-limit-rate', type=float, default=0, help='Share of requests answered with 429')
+  parser.add_argument('--vault-latency', type=float, default=0, help='Seconds every request to the local vaults waits')
+  parser.add_argument('--report', default=APP_CENTER_CONSTANTS.BENCHMARK_REPORT_PATH, help='JSON file the report is written to')
+  parser.add_argument('--baseline', default=None, help='Report of an earlier run to compare with')
+  parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative increase of the duration of a phase')
+  parser.add_argument('--trace', default=None, help='JSON file the spans of the run are written to, in the Chrome trace format')
+  args = parser.parse_args()
+
+  if args.trace:
+    tracing.Tracer.shared().enable()
+
+  benchmark = ProvisioningBenchmark(
+    oems=args.oems,
+    upload_size=args.upload_size,
+    certificate_size=args.certificate_size,
+    vault_latency=args.vault_latency,
+    server_options={
+      'latency': args.latency,
+      'jitter': args.jitter,
+      'bandwidth': args.bandwidth,
+      'error_rate': args.error_rate,
+      'rate_limit_rate': args.rate_limit_rate,
+    },
+  )
+  report = benchmark.run()
+
+  with open(args.report, 'w') as file:
+    json.dump(report, file, indent=2)
+
+  print_report(report)
+  print(f'Report written to {args.report}')
+
+  if args.trace:
+    tracing.Tracer.shared().export(args.trace)
+    print(f'Trace written to {args.trace}')
+
+  if args.baseline:
+    with open(args.baseline, 'r') as file:
+      baseline = json.load(file)
+
+    regressions = compare_reports(report, baseline, tolerance=args.tolerance)
+    for regression in regressions:
+      print(f'Regression in {regression}')
+    if regressions:
+      sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,124 @@
+import threading
+import time
+from typing import Callable, Dict, List
+
+class SecretSnapshot:
+  '''
+  Class to hold the secrets of a Key Vault as they were read at one point in time
+
+  The secret properties are listed once when the snapshot is created.
+  Secret values are fetched on first use and kept for the lifetime of the snapshot
+  '''
+  def __init__(self, properties: List, fetch_values: Callable[[List[str]], Dict]) -> None:
+    '''
+    Constructor for SecretSnapshot Class
+
+    Parameters
+    ----------
+    properties : list
+      Secret properties listed from the vault
+    fetch_values : Callable
+      Fetches the values of a list of secret names from the vault and returns them by name
+    '''
+    self.__properties = properties
+    self.__fetch_values = fetch_values
+    self.__values = {}
+    self.__lock = threading.Lock()
+    self.__created_at = time.monotonic()
+
+  @property
+  def properties(self):
+    return self.__properties
+
+  @property
+  def created_at(self):
+    return self.__created_at
+
+  def get_values(self, secret_names: List[str]):
+    '''
+    Get the values of secrets, fetching the ones that were not fetched yet
+
+    Parameters
+    ----------
+    secret_names : list
+      Names of the secrets
+
+    Returns
+    ----------
+    values : dict
+      Secret values by secret name
+    '''
+    with self.__lock:
+      missing_names = [secret_name for secret_name in secret_names if secret_name not in self.__values]
+      if missing_names:
+        self.__values.update(self.__fetch_values(missing_names))
+      return {secret_name: self.__values[secret_name] for secret_name in secret_names}
+
+class SecretSnapshotCache:
+  '''
+  Class to cache secret snapshots by vault url, so every vault is read at most once per run
+
+  Environments sharing a vault share its snapshot, and a write to the vault invalidates it for all of them
+  '''
+  def __init__(self, ttl: float = None) -> None:
+    '''
+    Constructor for SecretSnapshotCache Class
+
+    Parameters
+    ----------
+    ttl : float
+      Seconds after which a snapshot is read again from the vault. If None, snapshots never expire
+    '''
+    self.__ttl = ttl
+    self.__snapshots = {}
+    self.__locks = {}
+    self.__lock = threading.Lock()
+
+  def __is_fresh(self, snapshot: SecretSnapshot):
+    return self.__ttl is None or time.monotonic() - snapshot.created_at < self.__ttl
+
+  def __key(self, vault_url: str):
+    return vault_url.rstrip('/')
+
+  def get(self, vault_url: str, load: Callable[[], SecretSnapshot]):
+    '''
+    Get the snapshot of a vault, loading it if it is not cached or expired
+
+    Parameters
+    ----------
+    vault_url : str
+      Ex: https://vault-name.vault.azure.net/
+    load : Callable
+      Reads the vault and returns a new snapshot
+
+    Returns
+    ----------
+    snapshot : SecretSnapshot
+    '''
+    key = self.__key(vault_url)
+
+    with self.__lock:
+      key_lock = self.__locks.setdefault(key, threading.Lock())
+
+    # Concurrent callers for the same vault wait for a single read
+    with key_lock:
+      snapshot = self.__snapshots.get(key)
+      if snapshot is None or not self.__is_fresh(snapshot):
+        snapshot = load()
+        self.__snapshots[key] = snapshot
+      return snapshot
+
+  def invalidate(self, vault_url: str = None):
+    '''
+    Drop cached snapshots. Without arguments every snapshot is dropped
+
+    Parameters
+    ----------
+    vault_url : str
+      Ex: https://vault-name.vault.azure.net/
+    '''
+    with self.__lock:
+      if vault_url is None:
+        self.__snapshots = {}
+      else:
+        self.__snapshots.pop(self.__key(vault_url), None)
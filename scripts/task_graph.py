@@ -0,0 +1,178 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+import tracing
+
+class Task:
+  '''
+  Task of a TaskGraph
+  '''
+  def __init__(self, name: str, operation: Callable, dependencies: List[str], host: str = None) -> None:
+    '''
+    Parameters
+    ----------
+    name : str
+      Unique task name
+    operation : Callable
+      Called with a dictionary of the results of the dependencies by task name
+    dependencies : list
+      Names of the tasks that must finish before this task starts
+    host : str
+      Host the task talks to. Used to limit the number of concurrent tasks per host
+    '''
+    self.name = name
+    self.operation = operation
+    self.dependencies = list(dependencies)
+    self.host = host
+
+class TaskGraph:
+  '''
+  Class to run tasks concurrently while respecting their dependencies
+
+  A task starts as soon as all its dependencies finished, a worker is free and its host is below its concurrency limit.
+  The wall clock time of a run therefore approaches the critical path of the graph instead of the sum of all tasks
+  '''
+  def __init__(self, max_workers: int = 8, host_limits: Dict[str, int] = None) -> None:
+    '''
+    Constructor for TaskGraph Class
+
+    Parameters
+    ----------
+    max_workers : int
+      Maximum number of tasks running at the same time
+    host_limits : dict
+      Maximum number of tasks running at the same time per host. Hosts without a limit are only bound by max_workers
+    '''
+    self.__max_workers = max_workers
+    self.__host_limits = host_limits or {}
+    self.__tasks = {}
+
+  def add_task(self, name: str, operation: Callable, dependencies: List[str] = (), host: str = None):
+    '''
+    Add a task to the graph
+
+    Parameters
+    ----------
+    name : str
+      Unique task name
+    operation : Callable
+      Called with a dictionary of the results of the dependencies by task name
+    dependencies : list
+      Names of the tasks that must finish before this task starts
+    host : str
+      Host the task talks to
+
+    Returns
+    ----------
+    name : str
+      Task name, so it can be used as a dependency
+    '''
+    if name in self.__tasks:
+      raise ValueError(f'Task {name} already exists')
+
+    self.__tasks[name] = Task(name=name, operation=operation, dependencies=dependencies, host=host)
+    return name
+
+  def __validate(self):
+    '''
+    Private method to check that every dependency exists and that the graph has no cycle
+    '''
+    for task in self.__tasks.values():
+      for dependency in task.dependencies:
+        if dependency not in self.__tasks:
+          raise ValueError(f'Task {task.name} depends on unknown task {dependency}')
+
+    # Kahn's algorithm, every task must be reachable from the tasks without dependencies
+    remaining = {name: len(task.dependencies) for name, task in self.__tasks.items()}
+    ready = [name for name, count in remaining.items() if count == 0]
+    visited = 0
+    while ready:
+      name = ready.pop()
+      visited += 1
+      for dependent in self.__dependents(name):
+        remaining[dependent] -= 1
+        if remaining[dependent] == 0:
+          ready.append(dependent)
+
+    if visited != len(self.__tasks):
+      raise ValueError('Task graph contains a cycle')
+
+  def __dependents(self, name: str):
+    return [task.name for task in self.__tasks.values() if name in task.dependencies]
+
+  def __can_start(self, task: Task, running_per_host: Dict[str, int]):
+    limit = self.__host_limits.get(task.host)
+    return limit is None or running_per_host.get(task.host, 0) < limit
+
+  def run(self):
+    '''
+    Run every task of the graph
+
+    Returns
+    ----------
+    results : dict
+      Result of every task by task name
+
+    Raises
+    ----------
+    Exception
+      The first exception raised by a task. Tasks already running are awaited and no new task is started
+    '''
+    self.__validate()
+
+    results = {}
+    remaining = {name: set(task.dependencies) for name, task in self.__tasks.items()}
+    ready = [name for name, dependencies in remaining.items() if len(dependencies) == 0]
+    running = {}
+    running_per_host = {}
+    error = None
+    lock = threading.Lock()
+
+    def run_task(task: Task):
+      with lock:
+        dependency_results = {dependency: results[dependency] for dependency in task.dependencies}
+      with tracing.span(task.name, category='task', host=task.host):
+        return task.operation(dependency_results)
+
+    with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='task-graph') as executor:
+      while ready or running:
+        # Start every ready task whose host has capacity
+        if error is None:
+          for name in list(ready):
+            if len(running) >= self.__max_workers:
+              break
+            task = self.__tasks[name]
+            if not self.__can_start(task, running_per_host):
+              continue
+            ready.remove(name)
+            # Tasks are nested under the span of the caller of run
+            running[executor.submit(tracing.propagate(run_task), task)] = task
+            running_per_host[task.host] = running_per_host.get(task.host, 0) + 1
+
+        if not running:
+          break
+
+        done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+        for future in done:
+          task = running.pop(future)
+          running_per_host[task.host] -= 1
+
+          try:
+            result = future.result()
+          except Exception as e:
+            error = error or e
+            continue
+
+          with lock:
+            results[task.name] = result
+
+          for dependent in self.__dependents(task.name):
+            remaining[dependent].discard(task.name)
+            if len(remaining[dependent]) == 0:
+              ready.append(dependent)
+
+    if error is not None:
+      raise error
+
+    return results
@@ -0,0 +1,59 @@
+import os
+import uuid
+
+from constants import key_vault_constants as KEY_VAULT_CONSTANTS
+
+'''
+Inputs shared by the tests running the scripts against LocalApiServer and LocalSecretClient
+'''
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), KEY_VAULT_CONSTANTS.KEY_VAULT_TEMPLATE_PATH)
+
+def create_certificates(directory: str, size: int = 4096):
+  '''
+  Write random certificate files
+
+  Returns
+  ----------
+  certificates : dict
+    mobileprovision_path, p12_path, keystore_path, p12_password and keystore_password
+  '''
+  certificates = {'p12_password': 'p12-password', 'keystore_password': 'keystore-password'}
+  for key, extension in [('mobileprovision_path', 'mobileprovision'), ('p12_path', 'p12'), ('keystore_path', 'keystore')]:
+    path = os.path.join(directory, f'test.{extension}')
+    with open(path, 'wb') as file:
+      file.write(os.urandom(size))
+    certificates[key] = path
+  return certificates
+
+def create_vault_urls(name: str):
+  '''
+  Vault urls of every environment. Local vaults are shared by the process, every call returns new vaults
+
+  Returns
+  ----------
+  vault_urls : dict
+    common_vault_url and oem_vault_url by environment name. The environments share the OEM vault, like the default vault urls
+  '''
+  suffix = uuid.uuid4().hex[:8]
+  return {
+    env['name']: {
+      'common_vault_url': f"https://{name}-{env['name']}-common-{suffix}.vault.azure.net/",
+      'oem_vault_url': f'https://{name}-oem-{suffix}.vault.azure.net/',
+    }
+    for env in KEY_VAULT_CONSTANTS.ENVIRONMENTS
+  }
+
+def create_apps(name: str, repo_name: str):
+  '''
+  Apps of an OEM by OS, as in a batch manifest
+  '''
+  return {
+    os_name: {
+      'display_name': f'{name} {os_name}',
+      'app_name': f'{name}-{os_name.lower()}',
+      'description': f'{name} {os_name} app',
+      'repo_url': f'https://github.com/{repo_name}',
+    }
+    for os_name in ['Android', 'iOS']
+  }
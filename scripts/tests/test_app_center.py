@@ -0,0 +1,139 @@
+import contextlib
+import io
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from api.app_center_api import AppCenterApi
+from api.github_api import GithubApi
+from app_center import AppCenter
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+from github import Github
+from key_vault import KeyVault
+from local_api_server import LocalApiServer
+from local_secret_client import LocalSecretClient
+from tests.fixtures import TEMPLATE_DIRECTORY, create_apps, create_certificates, create_vault_urls
+from upload_cache import UploadCache
+
+class ReconcileTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+
+    self.server = LocalApiServer().start()
+    self.addCleanup(self.server.stop)
+    self.server.override_hosts()
+
+    self.vault_urls = create_vault_urls('oem')
+    self.upload_cache = UploadCache(cache_path=None)
+    self.app_center_api = AppCenterApi(app_center_token='token')
+    self.github = Github(
+      environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+      github_token='github',
+      repo_name='owner/oem',
+      github_api=GithubApi(github_token='github'),
+    )
+
+  def create_key_vault(self, certificates):
+    return KeyVault(
+      environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+      vault_urls=self.vault_urls,
+      certificates=certificates,
+      template_directory=TEMPLATE_DIRECTORY,
+      upload_cache=self.upload_cache,
+      secret_client_factory=LocalSecretClient.factory(),
+    )
+
+  def create_app_center(self, key_vault):
+    return AppCenter(
+      environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+      app_center_api=self.app_center_api,
+      apps=create_apps('oem', 'owner/oem'),
+      github=self.github,
+      key_vault=key_vault,
+    )
+
+  def provision(self, certificates):
+    key_vault = self.create_key_vault(certificates)
+    # The scripts report their progress on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+      key_vault.set_vault_secrets()
+      self.github.init_app()
+      self.create_app_center(key_vault).init_app()
+    return key_vault
+
+  def plan(self, key_vault):
+    before = self.server.stats()
+    with contextlib.redirect_stdout(io.StringIO()):
+      plan = self.create_app_center(key_vault).reconcile(apply=False)
+    after = self.server.stats()
+    uploads = after.get('file_asset', {}).get('requests', 0) - before.get('file_asset', {}).get('requests', 0)
+    return {app_plan['app_name']: app_plan['actions'] for app_plan in plan}, uploads
+
+  def branch_actions(self, plan):
+    return {
+      (app_name, env['branch']): actions[env['branch']]
+      for app_name, actions in plan.items()
+      for env in APP_CENTER_CONSTANTS.ENVIRONMENTS
+    }
+
+  def test_plan_of_provisioned_apps_is_unchanged_without_uploading(self):
+    key_vault = self.provision(create_certificates(self.directory.name))
+    branch_configs = dict(self.server.state.branch_configs)
+
+    plan, uploads = self.plan(key_vault)
+
+    self.assertEqual(uploads, 0)
+    self.assertEqual(set(self.branch_actions(plan).values()), {'unchanged'})
+    self.assertEqual(self.server.state.branch_configs, branch_configs)
+
+  def test_plan_matches_certificates_of_expired_cache_entries(self):
+    key_vault = self.provision(create_certificates(self.directory.name))
+
+    later = time.time() + APP_CENTER_CONSTANTS.UPLOAD_CACHE_MAX_AGE + 1
+    with mock.patch('upload_cache.time.time', return_value=later):
+      plan, uploads = self.plan(key_vault)
+
+    self.assertEqual(uploads, 0)
+    self.assertEqual(set(self.branch_actions(plan).values()), {'unchanged'})
+
+  def test_plan_updates_the_branches_of_changed_certificates(self):
+    self.provision(create_certificates(self.directory.name))
+
+    changed_directory = tempfile.TemporaryDirectory()
+    self.addCleanup(changed_directory.cleanup)
+    key_vault = self.create_key_vault(create_certificates(changed_directory.name))
+    with contextlib.redirect_stdout(io.StringIO()):
+      key_vault.set_vault_secrets()
+
+    plan, uploads = self.plan(key_vault)
+
+    self.assertEqual(uploads, 0)
+    self.assertEqual(set(self.branch_actions(plan).values()), {'update'})
+
+  def test_reconcile_writes_only_the_drifted_branches(self):
+    certificates = create_certificates(self.directory.name)
+    self.provision(certificates)
+
+    # The keystore is only part of the Android configuration
+    with open(certificates['keystore_path'], 'wb') as file:
+      file.write(b'changed keystore')
+    key_vault = self.create_key_vault(certificates)
+    with contextlib.redirect_stdout(io.StringIO()):
+      key_vault.set_vault_secrets(incremental=True)
+
+    before = self.server.stats()
+    with contextlib.redirect_stdout(io.StringIO()):
+      plan = self.create_app_center(key_vault).reconcile()
+    writes = self.server.stats()['branch_config']['requests'] - before['branch_config']['requests']
+
+    actions = self.branch_actions({app_plan['app_name']: app_plan['actions'] for app_plan in plan})
+    self.assertEqual({key for key, action in actions.items() if action == 'update'}, {key for key in actions if key[0] == 'oem-android'})
+    self.assertEqual(writes, len(APP_CENTER_CONSTANTS.ENVIRONMENTS))
+
+    plan, uploads = self.plan(key_vault)
+    self.assertEqual(set(self.branch_actions(plan).values()), {'unchanged'})
+
+if __name__ == '__main__':
+  unittest.main()
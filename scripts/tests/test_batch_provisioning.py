@@ -0,0 +1,110 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+from batch_provisioning import BatchProvisioning
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+from key_vault import KeyVault
+from local_api_server import LocalApiServer
+from local_secret_client import LocalSecretClient
+from tests.fixtures import TEMPLATE_DIRECTORY, create_apps, create_certificates, create_vault_urls
+from upload_cache import UploadCache
+
+class BatchProvisioningTest(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.certificates = create_certificates(directory.name)
+
+    self.server = LocalApiServer(app_center_tokens=['token-a', 'token-b']).start()
+    self.addCleanup(self.server.stop)
+    self.server.override_hosts()
+
+  def create_oem(self, name: str, **kwargs):
+    repo_name = f'owner/{name}'
+    return {
+      'name': name,
+      'repo_name': repo_name,
+      'repo_url': f'https://github.com/{repo_name}',
+      'apps': create_apps(name, repo_name),
+      'vault_urls': create_vault_urls(name),
+      'certificates': self.certificates,
+      'sync_vaults': True,
+      'template_directory': TEMPLATE_DIRECTORY,
+      **kwargs,
+    }
+
+  def run_batch(self, manifest):
+    # The scripts report their progress on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+      return BatchProvisioning(manifest=manifest, upload_cache=UploadCache(cache_path=None)).run()
+
+  def test_provisions_every_oem_with_its_own_app_center_token(self):
+    manifest = {
+      'app_center_token': 'token-a',
+      'github_token': 'github',
+      'local_vaults': {},
+      'oems': [self.create_oem('oem-a'), self.create_oem('oem-b', app_center_token='token-b')],
+    }
+
+    report = self.run_batch(manifest)
+
+    self.assertEqual(report['failed'], 0, [oem['error'] for oem in report['oems']])
+    state = self.server.state
+    self.assertEqual({app: token for (_, app), token in state.app_tokens.items()}, {
+      'oem-a-android': 'token-a',
+      'oem-a-ios': 'token-a',
+      'oem-b-android': 'token-b',
+      'oem-b-ios': 'token-b',
+    })
+    # Only the iOS apps upload certificates, to the account of their OEM
+    uploads = {(upload['app'], upload['api_token']) for upload in state.uploads.values()}
+    self.assertEqual(uploads, {('oem-a-ios', 'token-a'), ('oem-b-ios', 'token-b')})
+    for upload in state.uploads.values():
+      self.assertEqual(upload['state'], 'Done')
+
+  def test_a_rejected_token_fails_only_its_oem(self):
+    manifest = {
+      'app_center_token': 'token-a',
+      'github_token': 'github',
+      'local_vaults': {},
+      'oems': [self.create_oem('oem-a'), self.create_oem('oem-c', app_center_token='revoked')],
+    }
+
+    report = self.run_batch(manifest)
+
+    statuses = {oem['name']: oem['status'] for oem in report['oems']}
+    self.assertEqual(statuses, {'oem-a': 'succeeded', 'oem-c': 'failed'})
+    self.assertIn('401', report['oems'][1]['error'])
+
+  def test_syncing_vaults_requires_the_certificates(self):
+    oem = self.create_oem('oem-a')
+    del oem['certificates']
+    manifest = {'app_center_token': 'token-a', 'github_token': 'github', 'local_vaults': {}, 'oems': [oem]}
+
+    with self.assertRaisesRegex(ValueError, 'OEM oem-a is missing: certificates.mobileprovision_path'):
+      self.run_batch(manifest)
+
+    oem['certificates'] = {key: value for key, value in self.certificates.items() if key != 'keystore_password'}
+    with self.assertRaisesRegex(ValueError, 'missing: certificates.keystore_password$'):
+      self.run_batch(manifest)
+
+  def test_key_vault_does_not_prompt_in_batch_mode(self):
+    key_vault = KeyVault(
+      environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+      vault_urls=create_vault_urls('oem-a'),
+      template_directory=TEMPLATE_DIRECTORY,
+      upload_cache=UploadCache(cache_path=None),
+      secret_client_factory=LocalSecretClient.factory(),
+    )
+
+    with mock.patch('builtins.input', side_effect=AssertionError('prompted in batch mode')), contextlib.redirect_stdout(io.StringIO()):
+      with self.assertRaisesRegex(ValueError, 'certificates of the prod environment are required in batch mode'):
+        key_vault.set_vault_secrets()
+      with self.assertRaisesRegex(ValueError, 'vault urls of the dev environment are required in batch mode'):
+        KeyVault(environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT).resolve_vault_urls(env_name='dev')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,122 @@
+import threading
+import unittest
+
+from chunk_scheduler import ChunkScheduler
+
+class ChunkSchedulerTest(unittest.TestCase):
+  def test_schedules_chunks_in_enqueue_order(self):
+    scheduler = ChunkScheduler(total_blocks=5)
+    scheduler.enqueue([3, 1, 5])
+
+    self.assertEqual(scheduler.queued_chunks(), [3, 1, 5])
+    self.assertEqual([scheduler.next_chunk() for _ in range(4)], [3, 1, 5, None])
+    self.assertEqual(scheduler.inflight_count, 3)
+    self.assertEqual(scheduler.queued_count, 0)
+
+  def test_ignores_chunks_that_are_already_scheduled(self):
+    scheduler = ChunkScheduler(total_blocks=3)
+    scheduler.enqueue([1, 2])
+    chunk_number = scheduler.next_chunk()
+    scheduler.complete(chunk_number)
+
+    # Queued, inflight and completed chunks are not queued again
+    scheduler.enqueue([1, 2, 2, 3])
+
+    self.assertEqual(scheduler.queued_chunks(), [2, 3])
+    self.assertEqual(scheduler.queued_count, 2)
+
+  def test_completed_chunks_are_sorted_regardless_of_completion_order(self):
+    scheduler = ChunkScheduler(total_blocks=4)
+    scheduler.enqueue(range(1, 5))
+    chunks = [scheduler.next_chunk() for _ in range(4)]
+
+    for chunk_number in reversed(chunks):
+      scheduler.complete(chunk_number)
+
+    self.assertEqual(scheduler.completed_chunks(), [1, 2, 3, 4])
+    self.assertEqual(scheduler.completed_count, 4)
+    self.assertTrue(scheduler.is_done())
+
+  def test_completing_twice_is_ignored(self):
+    scheduler = ChunkScheduler(total_blocks=1)
+    scheduler.enqueue([1])
+    scheduler.complete(scheduler.next_chunk())
+    scheduler.complete(1)
+
+    self.assertEqual(scheduler.completed_count, 1)
+
+  def test_retry_requeues_a_failed_chunk_at_the_end(self):
+    scheduler = ChunkScheduler(total_blocks=3)
+    scheduler.enqueue([1, 2, 3])
+    failed = scheduler.next_chunk()
+
+    scheduler.retry(failed)
+
+    self.assertEqual(scheduler.queued_chunks(), [2, 3, 1])
+    self.assertEqual(scheduler.inflight_count, 0)
+    self.assertEqual(scheduler.queued_count, 3)
+    self.assertFalse(scheduler.is_done())
+
+    chunks = [scheduler.next_chunk() for _ in range(3)]
+    for chunk_number in chunks:
+      scheduler.complete(chunk_number)
+    self.assertEqual(chunks, [2, 3, 1])
+    self.assertTrue(scheduler.is_done())
+
+  def test_rejects_transitions_of_chunks_that_are_not_inflight(self):
+    scheduler = ChunkScheduler(total_blocks=2)
+    scheduler.enqueue([1])
+
+    with self.assertRaises(ValueError):
+      scheduler.retry(1)
+    with self.assertRaises(ValueError):
+      scheduler.complete(2)
+    with self.assertRaises(ValueError):
+      scheduler.enqueue([3])
+
+  def test_mark_completed_skips_queued_chunks(self):
+    scheduler = ChunkScheduler(total_blocks=3)
+    scheduler.enqueue([1, 2, 3])
+    inflight = scheduler.next_chunk()
+
+    scheduler.mark_completed([inflight, 2])
+
+    self.assertEqual(scheduler.next_chunk(), 3)
+    self.assertIsNone(scheduler.next_chunk())
+    self.assertEqual(scheduler.completed_chunks(), [1, 2])
+    self.assertEqual(scheduler.inflight_count, 1)
+
+  def test_concurrent_workers_upload_every_chunk_once(self):
+    total_blocks = 2000
+    scheduler = ChunkScheduler(total_blocks=total_blocks)
+    scheduler.enqueue(range(1, total_blocks + 1))
+    uploaded = []
+    lock = threading.Lock()
+
+    def worker():
+      attempts = 0
+      while True:
+        chunk_number = scheduler.next_chunk()
+        if chunk_number is None:
+          return
+        attempts += 1
+        # Every third attempt of a worker fails and is put back in the queue
+        if attempts % 3 == 0:
+          scheduler.retry(chunk_number)
+          continue
+        with lock:
+          uploaded.append(chunk_number)
+        scheduler.complete(chunk_number)
+
+    workers = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in workers:
+      thread.start()
+    for thread in workers:
+      thread.join()
+
+    self.assertEqual(sorted(uploaded), list(range(1, total_blocks + 1)))
+    self.assertEqual(scheduler.completed_count, total_blocks)
+    self.assertTrue(scheduler.is_done())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,134 @@
+import threading
+import unittest
+from unittest import mock
+
+import concurrency_controller
+from concurrency_controller import AdaptiveConcurrencyController
+
+class FakeClock:
+  def __init__(self) -> None:
+    self.now = 1000.0
+
+  def monotonic(self):
+    return self.now
+
+  def advance(self, seconds: float):
+    self.now += seconds
+
+class AdaptiveConcurrencyControllerTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+    patcher = mock.patch.object(concurrency_controller.time, 'monotonic', self.clock.monotonic)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def complete_round(self, controller: AdaptiveConcurrencyController, size: int = 1000, latency: float = 0.1, duration: float = 1.0):
+    '''
+    Record as many successful chunks as the limit allows, spread over duration seconds
+    '''
+    limit = controller.limit
+    for _ in range(limit):
+      controller.acquire()
+      self.clock.advance(duration / limit)
+      controller.record_success(size=size, latency=latency)
+      controller.release()
+
+  def test_slow_start_doubles_the_limit_up_to_the_maximum(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=10, initial_concurrency=2)
+
+    limits = []
+    for _ in range(4):
+      self.complete_round(controller)
+      limits.append(controller.limit)
+
+    self.assertEqual(limits, [4, 8, 10, 10])
+
+  def test_failure_decreases_the_limit_once_per_round(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=16, initial_concurrency=8)
+
+    controller.record_failure()
+    controller.record_failure()
+
+    self.assertEqual(controller.limit, 4)
+    self.assertEqual(controller.chunks_failed_count, 2)
+
+    # The next round may decrease again
+    self.complete_round(controller)
+    controller.record_failure()
+    self.assertEqual(controller.limit, 2)
+
+  def test_additive_increase_after_congestion(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=16, initial_concurrency=8)
+    controller.record_failure()
+    self.assertEqual(controller.limit, 4)
+
+    # Out of slow start, every round with the same throughput per chunk adds one upload
+    limits = []
+    for _ in range(3):
+      self.complete_round(controller, size=1000, duration=1.0 / controller.limit)
+      limits.append(controller.limit)
+
+    self.assertEqual(limits, [5, 6, 7])
+
+  def test_throughput_drop_undoes_the_increase(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=16, initial_concurrency=8)
+    controller.record_failure()
+    self.complete_round(controller, duration=1.0)
+    self.assertEqual(controller.limit, 5)
+
+    # The round with one more upload is slower than the previous round
+    self.complete_round(controller, duration=2.0)
+
+    self.assertEqual(controller.limit, 4)
+
+  def test_latency_spike_is_treated_as_congestion(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=16, initial_concurrency=4)
+    self.complete_round(controller, latency=0.1)
+    self.assertEqual(controller.limit, 8)
+
+    self.complete_round(controller, latency=1.0)
+
+    self.assertEqual(controller.limit, 4)
+
+  def test_limit_never_drops_below_one(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=4, min_concurrency=0, initial_concurrency=1)
+
+    for _ in range(5):
+      controller.record_failure()
+      self.complete_round(controller)
+      controller.record_failure()
+
+    self.assertEqual(controller.limit, 1)
+    self.assertEqual(min(controller.stats()['concurrency_history']), 1)
+
+  def test_limit_stays_within_the_configured_bounds(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=3, min_concurrency=2, initial_concurrency=10)
+    self.assertEqual(controller.limit, 3)
+
+    controller.record_failure()
+
+    self.assertEqual(controller.limit, 2)
+
+  def test_acquire_blocks_at_the_limit_until_a_slot_is_released(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=1, initial_concurrency=1)
+    self.assertTrue(controller.acquire())
+
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: controller.acquire() and acquired.set())
+    thread.start()
+
+    self.assertFalse(acquired.wait(timeout=0.2))
+    controller.release()
+    self.assertTrue(acquired.wait(timeout=2))
+    thread.join()
+
+  def test_acquire_returns_false_once_aborted(self):
+    controller = AdaptiveConcurrencyController(max_concurrency=1, initial_concurrency=1)
+    controller.acquire()
+    abort_controller = threading.Event()
+    abort_controller.set()
+
+    self.assertFalse(controller.acquire(abort_controller=abort_controller))
+
+if __name__ == '__main__':
+  unittest.main()
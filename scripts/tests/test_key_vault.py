@@ -0,0 +1,122 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+from constants import key_vault_constants as KEY_VAULT_CONSTANTS
+from key_vault import CertificateUploadException, KeyVault
+from local_api_server import LocalApiServer
+from local_secret_client import LocalSecretClient, ResourceNotFoundError
+from tests.fixtures import TEMPLATE_DIRECTORY, create_certificates, create_vault_urls
+from upload_cache import UploadCache
+
+class KeyVaultTest(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.certificates = create_certificates(directory.name)
+    self.vault_urls = create_vault_urls('oem')
+
+  def create_key_vault(self, **kwargs):
+    return KeyVault(
+      environment=APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT,
+      vault_urls=self.vault_urls,
+      certificates=self.certificates,
+      template_directory=TEMPLATE_DIRECTORY,
+      upload_cache=UploadCache(cache_path=None),
+      secret_client_factory=LocalSecretClient.factory(),
+      **kwargs,
+    )
+
+  def sync(self, key_vault: KeyVault, **kwargs):
+    # The scripts report their progress on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+      return key_vault.set_vault_secrets(incremental=True, **kwargs)
+
+  def oem_vault_url(self):
+    return self.vault_urls[KEY_VAULT_CONSTANTS.ENVIRONMENTS[-1]['name']]['oem_vault_url']
+
+  def test_incremental_sync_writes_only_new_and_changed_secrets(self):
+    key_vault = self.create_key_vault()
+
+    first = self.sync(key_vault)
+    second = self.sync(key_vault)
+
+    self.assertEqual(set(first), set(second))
+    for vault_url, report in first.items():
+      self.assertTrue(report['created'], vault_url)
+      self.assertEqual(report['failed'], [])
+    for vault_url, report in second.items():
+      self.assertEqual((report['created'], report['updated'], report['orphaned']), ([], [], []), vault_url)
+      self.assertEqual(set(report['unchanged']), set(first[vault_url]['created']), vault_url)
+
+  def test_incremental_sync_updates_changed_certificates(self):
+    self.sync(self.create_key_vault())
+
+    with open(self.certificates['p12_path'], 'wb') as file:
+      file.write(b'changed certificate')
+    report = self.sync(self.create_key_vault())
+
+    self.assertEqual(len(report[self.oem_vault_url()]['updated']), 1)
+    for vault_url, vault_report in report.items():
+      self.assertEqual(vault_report['created'], [], vault_url)
+      if vault_url != self.oem_vault_url():
+        self.assertEqual(vault_report['updated'], [], vault_url)
+
+  def test_incremental_sync_reports_and_deletes_orphaned_secrets(self):
+    self.sync(self.create_key_vault())
+    secret_client = LocalSecretClient(self.oem_vault_url())
+    secret_client.set_secret('REMOVED-SECRET', 'value')
+
+    report = self.sync(self.create_key_vault())
+    self.assertEqual(report[self.oem_vault_url()]['orphaned'], ['REMOVED-SECRET'])
+    self.assertEqual(secret_client.get_secret('REMOVED-SECRET').value, 'value')
+
+    report = self.sync(self.create_key_vault(), delete_orphans=True)
+    self.assertEqual(report[self.oem_vault_url()]['orphaned'], ['REMOVED-SECRET'])
+    with self.assertRaises(ResourceNotFoundError):
+      self.assertEqual(secret_client.get_secret('REMOVED-SECRET').value, 'value')
+
+  def test_secrets_of_a_shared_vault_are_read_once(self):
+    self.sync(self.create_key_vault())
+    key_vault = self.create_key_vault()
+
+    with mock.patch.object(LocalSecretClient, 'list_properties_of_secrets', autospec=True, side_effect=LocalSecretClient.list_properties_of_secrets) as list_properties:
+      configs = [key_vault.get_vault_secrets(app_name='oem-android', platform='Android', env_name=env['name']) for env in KEY_VAULT_CONSTANTS.ENVIRONMENTS]
+
+    # Every common vault and the OEM vault shared by the environments
+    self.assertEqual(list_properties.call_count, len(KEY_VAULT_CONSTANTS.ENVIRONMENTS) + 1)
+    self.assertEqual(len(configs), len(KEY_VAULT_CONSTANTS.ENVIRONMENTS))
+
+  def start_server(self, **kwargs):
+    server = LocalApiServer(**kwargs).start()
+    self.addCleanup(server.stop)
+    server.override_hosts()
+    return server
+
+  def test_failed_certificate_upload_names_the_certificate(self):
+    self.start_server(error_endpoints=['file_asset'], error_rate=1)
+    key_vault = self.create_key_vault()
+
+    # The scripts report their progress on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+      key_vault.set_vault_secrets()
+      with self.assertRaisesRegex(CertificateUploadException, 'mobileprovision certificate of the qa environment to oem-ios failed: 503') as context:
+        key_vault.get_vault_secrets(app_name='oem-ios', platform='iOS', env_name='qa')
+
+    self.assertEqual((context.exception.certificate, context.exception.env_name, context.exception.app_name), ('mobileprovision', 'qa', 'oem-ios'))
+
+  def test_cancelled_certificate_upload_raises(self):
+    self.start_server()
+    key_vault = self.create_key_vault()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+      key_vault.set_vault_secrets()
+      with mock.patch('key_vault.UploadAppCenterAttachments.init_app', return_value={'error': True, 'message': 'Upload cancelled'}):
+        with self.assertRaisesRegex(CertificateUploadException, 'of the dev environment to oem-ios failed: Upload cancelled'):
+          key_vault.get_vault_secrets(app_name='oem-ios', platform='iOS', env_name='dev')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,28 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from local_secret_client import LocalVault
+
+class LocalVaultTest(unittest.TestCase):
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.file_path = os.path.join(directory.name, 'vaults', 'oem.json')
+
+  def test_secrets_are_persisted_for_the_current_user_only(self):
+    vault = LocalVault('https://oem.vault.azure.net/', file_path=self.file_path)
+    vault.set_secret('P12-PASSWORD', 'secret', content_type='password')
+    vault.set_secret('P12-PASSWORD', 'changed', content_type='password')
+
+    self.assertEqual(stat.S_IMODE(os.stat(self.file_path).st_mode), 0o600)
+    self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.file_path)).st_mode) & 0o077, 0)
+    self.assertFalse(os.path.exists(f'{self.file_path}.tmp'))
+
+    reloaded = LocalVault('https://oem.vault.azure.net/', file_path=self.file_path)
+    self.assertEqual(reloaded.get_secret('P12-PASSWORD').value, 'changed')
+    self.assertEqual(len(reloaded.list_properties('P12-PASSWORD')), 2)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,182 @@
+import threading
+import unittest
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+from api.rate_limiter import HostRateLimiter, get_retry_delay, is_rate_limited, parse_retry_after
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+
+class FakeClock:
+  def __init__(self, now: float = 1000.0) -> None:
+    self.now = now
+
+  def __call__(self):
+    return self.now
+
+  def advance(self, seconds: float):
+    self.now += seconds
+
+class HostRateLimiterTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+    self.wall_clock = FakeClock(now=1700000000.0)
+
+  def limiter(self, rate: float = None, burst: int = None):
+    return HostRateLimiter(rate=rate, burst=burst, clock=self.clock, wall_clock=self.wall_clock)
+
+  def test_burst_is_sent_without_delay(self):
+    limiter = self.limiter(rate=5, burst=3)
+
+    self.assertEqual([limiter.reserve() for _ in range(3)], [0, 0, 0])
+
+  def test_queued_requests_wait_for_their_own_refill(self):
+    limiter = self.limiter(rate=5, burst=2)
+    limiter.reserve()
+    limiter.reserve()
+
+    delays = [round(limiter.reserve(), 6) for _ in range(3)]
+
+    self.assertEqual(delays, [0.2, 0.4, 0.6])
+
+  def test_tokens_refill_at_rate_up_to_burst(self):
+    limiter = self.limiter(rate=4, burst=2)
+    limiter.reserve()
+    limiter.reserve()
+
+    self.clock.advance(0.25)
+    self.assertEqual(limiter.reserve(), 0)
+    self.assertEqual(limiter.reserve(), 0.25)
+
+    # A long idle period only refills up to burst
+    self.clock.advance(60)
+    self.assertEqual([limiter.reserve() for _ in range(3)], [0, 0, 0.25])
+
+  def test_without_rate_requests_are_only_delayed_by_pauses(self):
+    limiter = self.limiter()
+
+    self.assertEqual([limiter.reserve() for _ in range(100)], [0] * 100)
+
+    limiter.pause(3)
+    self.assertEqual(limiter.reserve(), 3)
+    self.clock.advance(1)
+    self.assertEqual(limiter.reserve(), 2)
+    self.clock.advance(2)
+    self.assertEqual(limiter.reserve(), 0)
+
+  def test_pause_delays_requests_with_available_tokens(self):
+    limiter = self.limiter(rate=10, burst=10)
+
+    limiter.pause(2)
+    limiter.pause(1)
+
+    # A shorter pause does not shorten the current one
+    self.assertEqual(limiter.reserve(), 2)
+
+  def test_honors_retry_after_seconds(self):
+    limiter = self.limiter(rate=10, burst=10)
+
+    limiter.pause(parse_retry_after({'Retry-After': '7'}))
+
+    self.assertEqual(limiter.reserve(), 7)
+
+  def test_honors_retry_after_http_date(self):
+    limiter = self.limiter(rate=10, burst=10)
+    retry_at = datetime.fromtimestamp(self.wall_clock.now + 30, tz=timezone.utc)
+
+    limiter.pause(parse_retry_after({'Retry-After': format_datetime(retry_at, usegmt=True)}, now=self.wall_clock.now))
+
+    self.assertEqual(limiter.reserve(), 30)
+
+  def test_parse_retry_after_ignores_missing_and_invalid_values(self):
+    self.assertIsNone(parse_retry_after({}))
+    self.assertIsNone(parse_retry_after({'Retry-After': 'soon'}))
+    self.assertEqual(parse_retry_after({'Retry-After': '-5'}), 0)
+    self.assertEqual(parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, now=self.wall_clock.now), 0)
+
+  def test_exhausted_rate_limit_pauses_until_reset(self):
+    limiter = self.limiter(rate=10, burst=10)
+
+    limiter.update({'X-RateLimit-Remaining': '1', 'X-RateLimit-Reset': str(self.wall_clock.now + 60)})
+    self.assertEqual(limiter.reserve(), 0)
+
+    limiter.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(self.wall_clock.now + 60)})
+    self.assertEqual(limiter.reserve(), 60)
+
+  def test_update_ignores_missing_and_invalid_headers(self):
+    limiter = self.limiter(rate=10, burst=10)
+
+    limiter.update({})
+    limiter.update({'X-RateLimit-Remaining': '0'})
+    limiter.update({'X-RateLimit-Remaining': 'none', 'X-RateLimit-Reset': '1'})
+
+    self.assertEqual(limiter.reserve(), 0)
+
+  def test_threads_share_the_tokens_of_a_limiter(self):
+    limiter = self.limiter(rate=10, burst=5)
+    delays = []
+    lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def worker():
+      start.wait()
+      for _ in range(5):
+        delay = limiter.reserve()
+        with lock:
+          delays.append(delay)
+
+    workers = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in workers:
+      thread.start()
+    for thread in workers:
+      thread.join()
+
+    # Every request took its own token, whichever thread sent it
+    self.assertEqual(len(delays), 40)
+    self.assertEqual([round(delay, 6) for delay in sorted(delays)], [0] * 5 + [round(index / 10, 6) for index in range(1, 36)])
+
+  def test_for_host_returns_one_limiter_per_host_across_threads(self):
+    limits = {'rate-limiter-test.example': {'rate': 1, 'burst': 1}}
+    limiters = []
+    lock = threading.Lock()
+
+    def worker():
+      limiter = HostRateLimiter.for_host('rate-limiter-test.example')
+      with lock:
+        limiters.append(limiter)
+
+    with mock.patch.dict(APP_CENTER_CONSTANTS.API_RATE_LIMITS, limits):
+      workers = [threading.Thread(target=worker) for _ in range(8)]
+      for thread in workers:
+        thread.start()
+      for thread in workers:
+        thread.join()
+
+    self.assertEqual(len({id(limiter) for limiter in limiters}), 1)
+    self.assertIsNot(HostRateLimiter.for_host('rate-limiter-other.example'), limiters[0])
+
+class RetryDecisionTest(unittest.TestCase):
+  def test_rate_limited_responses(self):
+    self.assertTrue(is_rate_limited(429, {}))
+    self.assertTrue(is_rate_limited(403, {'X-RateLimit-Remaining': '0'}))
+    self.assertFalse(is_rate_limited(403, {'X-RateLimit-Remaining': '10'}))
+    self.assertFalse(is_rate_limited(503, {}))
+
+  def test_rate_limited_responses_are_retried_after_retry_after(self):
+    self.assertEqual(get_retry_delay(429, {'Retry-After': '3'}, idempotent=False, attempt=1), 3)
+    self.assertEqual(get_retry_delay(403, {'X-RateLimit-Remaining': '0', 'Retry-After': '2'}, idempotent=True, attempt=1), 2)
+
+  def test_server_errors_are_only_retried_if_idempotent(self):
+    with mock.patch('api.rate_limiter.backoff_delay', return_value=0.5) as backoff:
+      self.assertEqual(get_retry_delay(503, {}, idempotent=True, attempt=2), 0.5)
+      self.assertIsNone(get_retry_delay(503, {}, idempotent=False, attempt=1))
+      self.assertIsNone(get_retry_delay(400, {}, idempotent=True, attempt=1))
+
+    self.assertEqual(backoff.call_args.args, (2,))
+
+  def test_retries_stop_after_max_retries_and_max_wait(self):
+    self.assertIsNone(get_retry_delay(429, {'Retry-After': '1'}, idempotent=True, attempt=APP_CENTER_CONSTANTS.API_MAX_RETRIES + 1))
+    self.assertIsNone(get_retry_delay(429, {'Retry-After': str(APP_CENTER_CONSTANTS.API_MAX_RATE_LIMIT_WAIT + 1)}, idempotent=True, attempt=1))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,99 @@
+import threading
+import unittest
+from unittest import mock
+
+from secret_snapshot_cache import SecretSnapshot, SecretSnapshotCache
+
+class FakeClock:
+  def __init__(self, now: float = 1000.0) -> None:
+    self.now = now
+
+  def __call__(self):
+    return self.now
+
+  def advance(self, seconds: float):
+    self.now += seconds
+
+class SecretSnapshotTest(unittest.TestCase):
+  def test_values_are_fetched_once(self):
+    fetched = []
+
+    def fetch_values(secret_names):
+      fetched.append(list(secret_names))
+      return {secret_name: secret_name.lower() for secret_name in secret_names}
+
+    snapshot = SecretSnapshot(properties=[], fetch_values=fetch_values)
+
+    self.assertEqual(snapshot.get_values(['A', 'B']), {'A': 'a', 'B': 'b'})
+    self.assertEqual(snapshot.get_values(['B', 'C']), {'B': 'b', 'C': 'c'})
+    self.assertEqual(fetched, [['A', 'B'], ['C']])
+
+class SecretSnapshotCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+    patcher = mock.patch('secret_snapshot_cache.time.monotonic', self.clock)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.loads = []
+
+  def load(self):
+    snapshot = SecretSnapshot(properties=[], fetch_values=lambda secret_names: {})
+    self.loads.append(snapshot)
+    return snapshot
+
+  def test_vault_is_loaded_once_per_url(self):
+    cache = SecretSnapshotCache()
+
+    first = cache.get('https://oem.vault.azure.net/', self.load)
+    second = cache.get('https://oem.vault.azure.net', self.load)
+    other = cache.get('https://common.vault.azure.net/', self.load)
+
+    self.assertIs(first, second)
+    self.assertIsNot(first, other)
+    self.assertEqual(len(self.loads), 2)
+
+  def test_expired_snapshots_are_loaded_again(self):
+    cache = SecretSnapshotCache(ttl=60)
+    first = cache.get('https://oem.vault.azure.net/', self.load)
+
+    self.clock.advance(59)
+    self.assertIs(cache.get('https://oem.vault.azure.net/', self.load), first)
+    self.clock.advance(1)
+    self.assertIsNot(cache.get('https://oem.vault.azure.net/', self.load), first)
+
+  def test_invalidate_drops_one_or_every_snapshot(self):
+    cache = SecretSnapshotCache()
+    oem = cache.get('https://oem.vault.azure.net/', self.load)
+    common = cache.get('https://common.vault.azure.net/', self.load)
+
+    cache.invalidate('https://oem.vault.azure.net')
+    self.assertIsNot(cache.get('https://oem.vault.azure.net/', self.load), oem)
+    self.assertIs(cache.get('https://common.vault.azure.net/', self.load), common)
+
+    cache.invalidate()
+    self.assertIsNot(cache.get('https://common.vault.azure.net/', self.load), common)
+
+  def test_concurrent_callers_wait_for_a_single_load(self):
+    cache = SecretSnapshotCache()
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_load():
+      loading.set()
+      release.wait(timeout=5)
+      return self.load()
+
+    snapshots = []
+    workers = [threading.Thread(target=lambda: snapshots.append(cache.get('https://oem.vault.azure.net/', slow_load))) for _ in range(4)]
+    for thread in workers:
+      thread.start()
+    loading.wait(timeout=5)
+    release.set()
+    for thread in workers:
+      thread.join()
+
+    self.assertEqual(len(self.loads), 1)
+    self.assertEqual(len({id(snapshot) for snapshot in snapshots}), 1)
+
+if __name__ == '__main__':
+  unittest.main()
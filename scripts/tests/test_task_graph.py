@@ -0,0 +1,159 @@
+import threading
+import time
+import unittest
+
+from task_graph import TaskGraph
+
+class ConcurrencyProbe:
+  '''
+  Records the peak number of operations running at the same time per host
+  '''
+  def __init__(self) -> None:
+    self.running = {}
+    self.peak = {}
+    self.lock = threading.Lock()
+
+  def operation(self, host: str, duration: float = 0.05):
+    def run(dependency_results):
+      with self.lock:
+        self.running[host] = self.running.get(host, 0) + 1
+        self.peak[host] = max(self.peak.get(host, 0), self.running[host])
+      time.sleep(duration)
+      with self.lock:
+        self.running[host] -= 1
+    return run
+
+class TaskGraphTest(unittest.TestCase):
+  def test_tasks_start_after_their_dependencies(self):
+    order = []
+    lock = threading.Lock()
+
+    def operation(name):
+      def run(dependency_results):
+        with lock:
+          order.append(name)
+        return name
+      return run
+
+    graph = TaskGraph(max_workers=4)
+    graph.add_task('deploy', operation('deploy'), dependencies=['build', 'configure'])
+    graph.add_task('build', operation('build'), dependencies=['checkout'])
+    graph.add_task('configure', operation('configure'), dependencies=['checkout'])
+    graph.add_task('checkout', operation('checkout'))
+
+    graph.run()
+
+    self.assertEqual(order[0], 'checkout')
+    self.assertEqual(set(order[1:3]), {'build', 'configure'})
+    self.assertEqual(order[3], 'deploy')
+
+  def test_tasks_receive_the_results_of_their_dependencies(self):
+    graph = TaskGraph()
+    graph.add_task('app', lambda results: 'app-id')
+    graph.add_task('branch', lambda results: 'main')
+    graph.add_task('config', lambda results: f'{results["app"]}/{results["branch"]}', dependencies=['app', 'branch'])
+
+    results = graph.run()
+
+    self.assertEqual(results, {'app': 'app-id', 'branch': 'main', 'config': 'app-id/main'})
+
+  def test_independent_tasks_run_concurrently(self):
+    # Every task waits for the others, the run only finishes if they all run at the same time
+    barrier = threading.Barrier(3, timeout=5)
+    graph = TaskGraph(max_workers=3)
+    for index in range(3):
+      graph.add_task(f'task-{index}', lambda results: barrier.wait())
+
+    results = graph.run()
+
+    self.assertEqual(sorted(results.values()), [0, 1, 2])
+
+  def test_host_limits_bound_concurrent_tasks_per_host(self):
+    probe = ConcurrencyProbe()
+    graph = TaskGraph(max_workers=8, host_limits={'api.appcenter.ms': 2})
+    for index in range(6):
+      graph.add_task(f'app-center-{index}', probe.operation('api.appcenter.ms'), host='api.appcenter.ms')
+      graph.add_task(f'github-{index}', probe.operation('api.github.com'), host='api.github.com')
+
+    graph.run()
+
+    self.assertEqual(probe.peak['api.appcenter.ms'], 2)
+    # Hosts without a limit are only bound by max_workers
+    self.assertGreater(probe.peak['api.github.com'], 2)
+    self.assertLessEqual(probe.peak['api.github.com'], 6)
+
+  def test_max_workers_bounds_concurrent_tasks(self):
+    probe = ConcurrencyProbe()
+    graph = TaskGraph(max_workers=3)
+    for index in range(8):
+      graph.add_task(f'task-{index}', probe.operation(None))
+
+    graph.run()
+
+    self.assertEqual(probe.peak[None], 3)
+
+  def test_failed_dependency_stops_its_dependents(self):
+    started = []
+
+    def operation(name):
+      def run(dependency_results):
+        started.append(name)
+      return run
+
+    def fail(dependency_results):
+      started.append('create_app')
+      raise RuntimeError('App Center returned 500')
+
+    graph = TaskGraph(max_workers=1)
+    graph.add_task('create_app', fail)
+    graph.add_task('independent', operation('independent'))
+    graph.add_task('upload', operation('upload'), dependencies=['create_app'])
+    graph.add_task('configure', operation('configure'), dependencies=['upload'])
+
+    with self.assertRaisesRegex(RuntimeError, 'App Center returned 500'):
+      graph.run()
+
+    # Neither the dependents nor the tasks that were still waiting for a worker are started
+    self.assertEqual(started, ['create_app'])
+
+  def test_running_tasks_finish_before_the_error_is_raised(self):
+    finished = threading.Event()
+    release = threading.Event()
+
+    def slow(dependency_results):
+      release.wait(timeout=5)
+      finished.set()
+
+    def fail(dependency_results):
+      release.set()
+      raise RuntimeError('failed')
+
+    graph = TaskGraph(max_workers=2)
+    graph.add_task('slow', slow)
+    graph.add_task('fail', fail)
+
+    with self.assertRaises(RuntimeError):
+      graph.run()
+
+    self.assertTrue(finished.is_set())
+
+  def test_rejects_unknown_dependencies_duplicates_and_cycles(self):
+    graph = TaskGraph()
+    graph.add_task('a', lambda results: None, dependencies=['missing'])
+    with self.assertRaisesRegex(ValueError, 'unknown task missing'):
+      graph.run()
+
+    graph = TaskGraph()
+    graph.add_task('a', lambda results: None)
+    with self.assertRaises(ValueError):
+      graph.add_task('a', lambda results: None)
+
+    graph = TaskGraph()
+    graph.add_task('a', lambda results: None, dependencies=['c'])
+    graph.add_task('b', lambda results: None, dependencies=['a'])
+    graph.add_task('c', lambda results: None, dependencies=['b'])
+    with self.assertRaisesRegex(ValueError, 'cycle'):
+      graph.run()
+
+if __name__ == '__main__':
+  unittest.main()
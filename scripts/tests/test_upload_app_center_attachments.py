@@ -0,0 +1,147 @@
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from api.app_center_api import AppCenterApi
+from api.exceptions import ApiException
+from api.upload_attachments_api import UploadAttachmentsApi
+from concurrency_controller import AdaptiveConcurrencyController
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+from file import File, MemoryFile
+from local_api_server import LocalApiServer
+from upload_app_center_attachments import UploadAppCenterAttachments
+from upload_cache import UploadCache
+
+class RecordingController(AdaptiveConcurrencyController):
+  '''
+  Concurrency controller recording how long every upload slot is held
+  '''
+  instances = []
+
+  def __init__(self, *args, **kwargs) -> None:
+    super().__init__(*args, **kwargs)
+    self.hold_durations = []
+    self.__acquired_at = threading.local()
+    RecordingController.instances.append(self)
+
+  def acquire(self, abort_controller: threading.Event = None):
+    acquired = super().acquire(abort_controller=abort_controller)
+    if acquired:
+      self.__acquired_at.value = time.monotonic()
+    return acquired
+
+  def release(self):
+    self.hold_durations.append(time.monotonic() - self.__acquired_at.value)
+    super().release()
+
+class UploadAppCenterAttachmentsTest(unittest.TestCase):
+  CHUNK_SIZE = 1024
+
+  def setUp(self):
+    self.server = LocalApiServer(chunk_size=self.CHUNK_SIZE).start()
+    self.addCleanup(self.server.stop)
+    self.server.override_hosts()
+    self.app_center_api = AppCenterApi(app_center_token='token')
+    self.upload = UploadAppCenterAttachments(APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT, app_center_api=self.app_center_api)
+
+  def run_upload(self, data: bytes, app_name: str = 'oem-ios', upload: UploadAppCenterAttachments = None):
+    # The scripts report their progress on stdout
+    with contextlib.redirect_stdout(io.StringIO()), MemoryFile(data=data, file_name='test.p12') as file:
+      return (upload or self.upload).init_app(app_name=app_name, file=file)
+
+  def requests(self, endpoint: str):
+    return self.server.stats().get(endpoint, {}).get('requests', 0)
+
+  def test_uploads_every_chunk_of_the_file(self):
+    data = os.urandom(8 * self.CHUNK_SIZE + 100)
+
+    result = self.run_upload(data)
+
+    self.assertFalse(result.get('error'))
+    upload = self.server.state.uploads[os.path.basename(result['location'])]
+    self.assertEqual(upload['state'], 'Done')
+    self.assertEqual(upload['file_size'], len(data))
+    self.assertEqual(sorted(upload['chunks']), list(range(1, 10)))
+    self.assertEqual(self.requests('upload_chunk'), 9)
+    self.assertEqual(result['upload_statistics']['bytes_uploaded'], len(data))
+
+  def test_upload_cache_reuses_the_upload_of_the_same_content(self):
+    upload = UploadAppCenterAttachments(APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT, upload_cache=UploadCache(cache_path=None), app_center_api=self.app_center_api)
+    data = os.urandom(2 * self.CHUNK_SIZE)
+
+    first = self.run_upload(data, upload=upload)
+    second = self.run_upload(data, upload=upload)
+    other_app = self.run_upload(data, app_name='oem-android', upload=upload)
+
+    self.assertEqual(second['location'], first['location'])
+    self.assertNotEqual(other_app['location'], first['location'])
+    self.assertEqual(self.requests('file_asset'), 2)
+    self.assertEqual(self.requests('upload_chunk'), 4)
+
+  def test_resumable_upload_sends_only_the_missing_chunks(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    file_path = os.path.join(directory.name, 'test.p12')
+    with open(file_path, 'wb') as file:
+      file.write(os.urandom(6 * self.CHUNK_SIZE))
+    checkpoint_directory = os.path.join(directory.name, 'checkpoints')
+
+    upload_chunk = UploadAttachmentsApi.upload_chunk
+
+    def interrupt_at_chunk_4(api, data, **kwargs):
+      if kwargs['chunk_number'] == 4:
+        raise RuntimeError('Connection lost')
+      return upload_chunk(api, data, **kwargs)
+
+    def run_resumable_upload():
+      upload = UploadAppCenterAttachments(APP_CENTER_CONSTANTS.BATCH_ENVIRONMENT, resumable=True, checkpoint_directory=checkpoint_directory, app_center_api=self.app_center_api)
+      with contextlib.redirect_stdout(io.StringIO()), File(file_path=file_path) as file:
+        return upload.init_app(app_name='oem-ios', file=file)
+
+    with mock.patch.object(UploadAttachmentsApi, 'upload_chunk', autospec=True, side_effect=interrupt_at_chunk_4):
+      with self.assertRaisesRegex(RuntimeError, 'Connection lost'):
+        run_resumable_upload()
+
+    self.assertEqual(len(os.listdir(checkpoint_directory)), 1)
+    upload = next(iter(self.server.state.uploads.values()))
+    uploaded_chunks = set(upload['chunks'])
+    self.assertNotIn(4, uploaded_chunks)
+    chunk_requests = self.requests('upload_chunk')
+
+    result = run_resumable_upload()
+
+    self.assertFalse(result.get('error'))
+    self.assertEqual(upload['state'], 'Done')
+    self.assertEqual(self.requests('file_asset'), 1)
+    self.assertEqual(self.requests('upload_chunk') - chunk_requests, 6 - len(uploaded_chunks))
+    self.assertEqual(os.listdir(checkpoint_directory), [])
+
+  def test_failed_chunk_waits_for_its_retry_without_an_upload_slot(self):
+    upload_chunk = UploadAttachmentsApi.upload_chunk
+    failures = []
+
+    def fail_first_chunk_once(api, data, **kwargs):
+      if kwargs['chunk_number'] == 1 and not failures:
+        failures.append(kwargs['chunk_number'])
+        raise ApiException('503: Service Unavailable', status_code=503)
+      return upload_chunk(api, data, **kwargs)
+
+    data = os.urandom(4 * self.CHUNK_SIZE)
+    with mock.patch('upload_app_center_attachments.AdaptiveConcurrencyController', RecordingController), \
+      mock.patch.object(UploadAttachmentsApi, 'upload_chunk', autospec=True, side_effect=fail_first_chunk_once):
+      result = self.run_upload(data)
+
+    self.assertFalse(result.get('error'))
+    self.assertEqual(result['upload_statistics']['auto_retry_count'], 1)
+    upload = next(iter(self.server.state.uploads.values()))
+    self.assertEqual(upload['state'], 'Done')
+    # The retry waits auto_retry_delay, no slot is held that long
+    self.assertLess(max(RecordingController.instances[-1].hold_durations), 0.5)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,326 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+class Span:
+  '''
+  Timed operation of a Tracer with its attributes, such as bytes and HTTP status
+
+  Spans are nested: a span started while another one is active in the same thread or task is its child
+  '''
+  def __init__(self, name: str, category: str, span_id: int, parent_id: int, attributes: Dict) -> None:
+    '''
+    Parameters
+    ----------
+    name : str
+      Name of the operation
+    category : str
+      Kind of operation. Ex: http, task, app_center
+    span_id : int
+      Unique id of the span in its Tracer
+    parent_id : int
+      Id of the enclosing span or None for a root span
+    attributes : dict
+      Attributes known when the span starts
+    '''
+    self.name = name
+    self.category = category
+    self.span_id = span_id
+    self.parent_id = parent_id
+    self.attributes = dict(attributes)
+    self.error = None
+    thread = threading.current_thread()
+    self.thread_id = thread.ident
+    self.thread_name = thread.name
+    self.start = time.perf_counter()
+    self.end = None
+
+  @property
+  def duration(self):
+    return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+  def set(self, **attributes):
+    '''
+    Set attributes of the span. Ex: span.set(status=200)
+    '''
+    self.attributes.update(attributes)
+
+  def add(self, key: str, amount: int = 1):
+    '''
+    Add an amount to a numeric attribute of the span. Ex: span.add('bytes_sent', len(chunk))
+    '''
+    self.attributes[key] = self.attributes.get(key, 0) + amount
+
+class NoopSpan(Span):
+  '''
+  Span returned while the Tracer is disabled, its attributes are ignored
+  '''
+  def __init__(self) -> None:
+    super().__init__(name='', category='', span_id=0, parent_id=None, attributes={})
+
+  def set(self, **attributes):
+    return None
+
+  def add(self, key: str, amount: int = 1):
+    return None
+
+class Tracer:
+  '''
+  Class to record nested spans of a run and export them as JSON or as a Chrome trace
+
+  The active span is kept in a context variable, so it follows asyncio tasks.
+  Threads start without an active span, submit work through Tracer.propagate to keep the spans of a worker under the span that submitted it.
+  A disabled Tracer records nothing and costs one attribute lookup per span
+  '''
+  __shared = None
+  __shared_lock = threading.Lock()
+
+  def __init__(self, enabled: bool = True) -> None:
+    '''
+    Constructor for Tracer Class
+
+    Parameters
+    ----------
+    enabled : bool
+      Record spans. Can be changed later with enable and disable
+    '''
+    self.__enabled = enabled
+    self.__spans = []
+    self.__ids = itertools.count(1)
+    self.__lock = threading.Lock()
+    self.__noop_span = NoopSpan()
+    self.__current = contextvars.ContextVar(f'current_span_{id(self)}', default=None)
+    # Spans are timed with perf_counter, the wall clock time of its origin places the trace in time
+    self.__origin = time.perf_counter()
+    self.__origin_time = time.time()
+
+  @classmethod
+  def shared(cls):
+    '''
+    Get the tracer shared by the whole process. It is disabled until enable is called
+
+    Returns
+    ----------
+    tracer : Tracer
+    '''
+    with cls.__shared_lock:
+      if cls.__shared is None:
+        cls.__shared = cls(enabled=False)
+      return cls.__shared
+
+  @property
+  def enabled(self):
+    return self.__enabled
+
+  def enable(self):
+    self.__enabled = True
+
+  def disable(self):
+    self.__enabled = False
+
+  def clear(self):
+    '''
+    Drop the recorded spans
+    '''
+    with self.__lock:
+      self.__spans = []
+
+  def spans(self):
+    '''
+    Get the finished spans in the order they finished
+
+    Returns
+    ----------
+    spans : list
+    '''
+    with self.__lock:
+      return list(self.__spans)
+
+  def current_span(self):
+    '''
+    Get the active span of the thread or task
+
+    Returns
+    ----------
+    span : Span
+      Active span, or None if there is none
+    '''
+    return self.__current.get()
+
+  @contextmanager
+  def span(self, name: str, category: str = None, **attributes):
+    '''
+    Record a span around a block. An exception raised in the block is recorded as the error of the span and re-raised
+
+    Ex:
+    with tracer.span('upload.chunk', category='upload', chunk_number=1) as span:
+      span.add('bytes', len(chunk))
+
+    Parameters
+    ----------
+    name : str
+      Name of the operation
+    category : str
+      Kind of operation
+    attributes : dict
+      Attributes known when the span starts
+
+    Returns
+    ----------
+    span : Span
+      Span of the block, attributes can be added to it until the block ends
+    '''
+    if not self.__enabled:
+      yield self.__noop_span
+      return
+
+    parent = self.__current.get()
+    span = Span(name=name, category=category or name.split('.')[0], span_id=next(self.__ids), parent_id=parent.span_id if parent is not None else None, attributes=attributes)
+    token = self.__current.set(span)
+    try:
+      yield span
+    except BaseException as e:
+      span.error = f'{type(e).__name__}: {e}'
+      raise
+    finally:
+      span.end = time.perf_counter()
+      self.__current.reset(token)
+      with self.__lock:
+        self.__spans.append(span)
+
+  def propagate(self, operation: Callable):
+    '''
+    Bind an operation to the active span, so spans it starts in another thread are nested under it
+
+    Ex: executor.submit(tracer.propagate(operation), *args)
+
+    Parameters
+    ----------
+    operation : Callable
+      Operation run by another thread
+
+    Returns
+    ----------
+    operation : Callable
+      Runs the operation in a copy of the current context
+    '''
+    if not self.__enabled:
+      return operation
+
+    # A context can only be entered by one thread at a time, every call runs in its own copy
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(operation, *args, **kwargs)
+
+  def to_json(self):
+    '''
+    Export the spans with their start relative to the creation of the tracer, in seconds
+
+    Returns
+    ----------
+    trace : dict
+      [start_time] wall clock time of the origin and [spans] with their id, parent id, thread, start, duration, attributes and error
+    '''
+    return {
+      'start_time': self.__origin_time,
+      'spans': [
+        {
+          'id': span.span_id,
+          'parent_id': span.parent_id,
+          'name': span.name,
+          'category': span.category,
+          'thread': span.thread_name,
+          'start': span.start - self.__origin,
+          'duration': span.duration,
+          'attributes': span.attributes,
+          'error': span.error,
+        }
+        for span in sorted(self.spans(), key=lambda span: span.start)
+      ],
+    }
+
+  def to_chrome_trace(self):
+    '''
+    Export the spans in the Trace Event Format, to open in chrome://tracing or https://ui.perfetto.dev
+
+    Returns
+    ----------
+    trace : dict
+      Complete events in microseconds, one track per thread
+    '''
+    pid = os.getpid()
+    spans = sorted(self.spans(), key=lambda span: span.start)
+    events = [
+      {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': thread_name}}
+      for thread_id, thread_name in {span.thread_id: span.thread_name for span in spans}.items()
+    ]
+    for span in spans:
+      args = {**span.attributes, 'id': span.span_id, 'parent_id': span.parent_id}
+      if span.error is not None:
+        args['error'] = span.error
+      events.append({
+        'name': span.name,
+        'cat': span.category,
+        'ph': 'X',
+        'ts': (span.start - self.__origin) * 1e6,
+        'dur': span.duration * 1e6,
+        'pid': pid,
+        'tid': span.thread_id,
+        'args': args,
+      })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def export(self, path: str, format: str = 'chrome'):
+    '''
+    Write the spans to a JSON file
+
+    Parameters
+    ----------
+    path : str
+      File the trace is written to
+    format : str
+      chrome for the Trace Event Format, json for the output of to_json
+    '''
+    if format not in ['chrome', 'json']:
+      raise ValueError(f'Unknown trace format {format}')
+
+    trace = self.to_chrome_trace() if format == 'chrome' else self.to_json()
+    with open(path, 'w') as file:
+      json.dump(trace, file, default=str)
+
+  def summarize(self):
+    '''
+    Aggregate the spans by name
+
+    Returns
+    ----------
+    summary : dict
+      Count, total, max duration, errors and byte counts of every span name, by decreasing total duration
+    '''
+    summary = {}
+    for span in self.spans():
+      entry = summary.setdefault(span.name, {'count': 0, 'total': 0, 'max': 0, 'errors': 0})
+      entry['count'] += 1
+      entry['total'] += span.duration
+      entry['max'] = max(entry['max'], span.duration)
+      entry['errors'] += span.error is not None
+      for key, value in span.attributes.items():
+        if key.startswith('bytes') and isinstance(value, int):
+          entry[key] = entry.get(key, 0) + value
+    return dict(sorted(summary.items(), key=lambda item: item[1]['total'], reverse=True))
+
+def span(name: str, category: str = None, **attributes):
+  '''
+  Record a span in the tracer shared by the process, see Tracer.span
+  '''
+  return Tracer.shared().span(name, category=category, **attributes)
+
+def propagate(operation: Callable):
+  '''
+  Bind an operation to the active span of the shared tracer, see Tracer.propagate
+  '''
+  return Tracer.shared().propagate(operation)
@@ -5,20 +5,59 @@ import os
 import json
 import math
 import datetime
+import io
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Union
 
+import tracing
+from api.api_wrapper import resolve_host
 from api.app_center_api import AppCenterApi
+from api.connection_pool import ConnectionPool
+from api.exceptions import ApiException
 from api.upload_attachments_api import UploadAttachmentsApi
-from file import File
+from chunk_scheduler import ChunkScheduler
+from concurrency_controller import AdaptiveConcurrencyController
+from file import File, MemoryFile
+from upload_cache import UploadCache
 from constants import app_center_constants as APP_CENTER_CONSTANTS
 
 class UploadAppCenterAttachments:
   '''
   Class to upload attachments to app center
   '''
-  def __init__(self, environment: str) -> None:
+  # Upload data that is persisted in the checkpoint of a resumable upload
+  CHECKPOINT_KEYS = ['asset_id', 'url_encoded_token', 'upload_domain', 'chunk_size', 'blob_partitions', 'total_blocks', 'file_name', 'file_size', 'file_path']
+
+  def __init__(self, environment: str, resumable: bool = False, checkpoint_directory: str = APP_CENTER_CONSTANTS.UPLOAD_CHECKPOINT_DIRECTORY, upload_cache: UploadCache = None, app_center_api: AppCenterApi = None) -> None:
+    '''
+    Constructor for UploadAppCenterAttachments Class
+
+    Parameters
+    ----------
+    environment : str
+      Environment name
+    resumable : bool
+      If True, the progress of the upload is persisted in a checkpoint and an unfinished upload of the same file is resumed
+    checkpoint_directory : str
+      Directory in which the checkpoints are stored
+    upload_cache : UploadCache
+      If provided, a file that was already uploaded to the same app is not uploaded again
+    app_center_api : AppCenterApi
+      Api of the App Center account the app belongs to, its token is used for the upload domain as well.
+      Defaults to an api with APP_CENTER_CONSTANTS.APP_CENTER_TOKEN
+    '''
     self.__environment = environment
-    self.__app_center_api = AppCenterApi(app_center_token=APP_CENTER_CONSTANTS.APP_CENTER_TOKEN)
+    self.__resumable = resumable
+    self.__checkpoint_directory = checkpoint_directory
+    self.__checkpoint_path = None
+    self.__checkpoint_lock = threading.Lock()
+    self.__last_checkpoint_time = 0
+    self.__cancel_requested = False
+    self.__upload_cache = upload_cache
+    self.__app_center_api = app_center_api or AppCenterApi(app_center_token=APP_CENTER_CONSTANTS.APP_CENTER_TOKEN)
     self.__upload_attachments_api = None
     self.__upload_success_response = {}
     self.__max_number_of_concurrent_uploads = 10
@@ -44,11 +83,11 @@ class UploadAppCenterAttachments:
       'average_speed': 0,
       'blocks_completed': 0,
       'chunks_failed_count': 0,
-      'chunk_queue': [],
+      'chunk_scheduler': None,
+      'concurrency_controller': None,
       'connected': True,
       'end_time': datetime.datetime.now(),
-      'inflight_set': set(),
-      'abort_controller': '',
+      'abort_controller': threading.Event(),
       'max_error_count': 20,
       'service_callback': {
         'auto_retry_count': 5,
@@ -69,13 +108,11 @@ class UploadAppCenterAttachments:
     chunks : list(int)
       Iterate through list of chunks that must be uploaded and append it to the chunk queue
     '''
-    if len(self.__upload_status['chunk_queue']) == 0:
-      self.__upload_status['chunk_queue'] = chunks
-      return
+    if self.__upload_status['chunk_scheduler'] is None:
+      self.__upload_status['chunk_scheduler'] = ChunkScheduler(total_blocks=self.__upload_data['total_blocks'])
 
-    status = self.__upload_status
-    filtered_chunks = [chunk for chunk in chunks if chunk not in status['chunk_queue']]
-    self.__upload_status['chunk_queue'].append(filtered_chunks)
+    # Chunks that are already queued, inflight or completed are ignored by the scheduler
+    self.__upload_status['chunk_scheduler'].enqueue(chunks)
 
   def __finish_upload(self):
     '''
@@ -92,6 +129,92 @@ class UploadAppCenterAttachments:
     print('Successfully uploaded the file')
     print()
 
+  def __is_resumable(self):
+    # Files held in memory have no path to recognize them on the next run, their uploads are not resumed
+    return self.__resumable and self.__upload_data['file_path'] is not None
+
+  def __get_checkpoint_path(self, app_name: str):
+    '''
+    Private method to construct the checkpoint path of the file being uploaded to the given app
+    '''
+    file_name = f"{app_name}.{self.__upload_data['file_name']}.{self.__upload_data['file_size']}.json"
+    return os.path.join(self.__checkpoint_directory, file_name)
+
+  def __load_checkpoint(self):
+    '''
+    Private method to load the checkpoint of an unfinished upload of the same file
+
+    Returns
+    ----------
+    checkpoint : dict
+      Checkpoint or None if there is no valid checkpoint
+    '''
+    try:
+      with open(self.__checkpoint_path, 'r') as file:
+        checkpoint = json.load(file)
+    except (OSError, ValueError):
+      return None
+
+    # A checkpoint is only valid for the same file
+    if checkpoint.get('file_path') != self.__upload_data['file_path'] or checkpoint.get('file_size') != self.__upload_data['file_size']:
+      return None
+
+    return checkpoint
+
+  def __save_checkpoint(self, force: bool = False):
+    '''
+    Private method to persist the asset id, token, chunk size and completed blocks of the upload
+
+    Parameters
+    ----------
+    force : bool
+      Write the checkpoint even if the previous one was written less than UPLOAD_CHECKPOINT_INTERVAL seconds ago
+    '''
+    if not self.__is_resumable() or self.__upload_status['chunk_scheduler'] is None:
+      return
+
+    with self.__checkpoint_lock:
+      now = time.monotonic()
+      if not force and now - self.__last_checkpoint_time < APP_CENTER_CONSTANTS.UPLOAD_CHECKPOINT_INTERVAL:
+        return
+      self.__last_checkpoint_time = now
+
+      checkpoint = {key: self.__upload_data[key] for key in self.CHECKPOINT_KEYS}
+      checkpoint['completed_blocks'] = self.__upload_status['chunk_scheduler'].completed_chunks()
+
+      # Write to a temporary file first, so an interrupted write never corrupts the previous checkpoint.
+      # The checkpoint holds the upload token, only the current user may read it
+      os.makedirs(self.__checkpoint_directory, mode=0o700, exist_ok=True)
+      temporary_path = f'{self.__checkpoint_path}.tmp'
+      descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+      with os.fdopen(descriptor, 'w') as file:
+        json.dump(checkpoint, file)
+      os.replace(temporary_path, self.__checkpoint_path)
+
+  def __delete_checkpoint(self):
+    '''
+    Private method to delete the checkpoint once the upload is finished or cancelled
+    '''
+    if self.__checkpoint_path and os.path.exists(self.__checkpoint_path):
+      os.remove(self.__checkpoint_path)
+
+  def __cancel_upload(self):
+    '''
+    Private method to cancel the upload on the server and discard the checkpoint
+    '''
+    self.__upload_status['state'] = 'Cancelled'
+    print('Cancelling upload on server')
+
+    id = self.__upload_data['asset_id']
+    url_encoded_token = self.__upload_data['url_encoded_token']
+
+    try:
+      self.__upload_attachments_api.cancel_upload(id=id, url_encoded_token=url_encoded_token)
+    except ApiException as e:
+      print(f'Unable to cancel the upload on server: {e}')
+
+    self.__delete_checkpoint()
+
   def __file_chunk(self, start, end):
     '''
     Private method to read a file in chunks
@@ -105,7 +228,7 @@ class UploadAppCenterAttachments:
     
     Returns
     ----------
-    chunk : bytes
+    chunk : bytes | memoryview
       A chunk of file based on start and end position
     '''
     return self.__file.read_file_chunk(start=start, end=end)
@@ -116,18 +239,11 @@ class UploadAppCenterAttachments:
 
     Parameters
     ----------
-    chunk : bytes
+    chunk : bytes | memoryview
       A chunk of file that should be uploaded
     chunk_number : int
       Keep track of chunk number and passing to the API
-    
-    Returns
-    ----------
-    chunk : bytes
-      A chunk of file based on start and end position
     '''
-
-    self.__upload_status['inflight_set'].add(chunk_number)
     print('Starting upload for chunk: ', chunk_number)
 
     # Obtain the necessary information from the response of initiate file asset upload
@@ -135,58 +251,239 @@ class UploadAppCenterAttachments:
     url_encoded_token = self.__upload_data['url_encoded_token']
 
     # Upload the chunk to the file server
-    result = self.__upload_attachments_api.upload_chunk(data=chunk, id=id, chunk_number=chunk_number, url_encoded_token=url_encoded_token)
+    with tracing.span('upload.chunk', chunk_number=chunk_number, bytes_sent=len(chunk)):
+      self.__upload_attachments_api.upload_chunk(data=chunk, id=id, chunk_number=chunk_number, url_encoded_token=url_encoded_token)
 
     print(f'ChunkSucceeded: {chunk_number}. ')
-    self.__upload_status['inflight_set'].remove(chunk_number)
 
-    # Recursively call the upload method to get the next chunk 
-    self.__single_threaded_upload()
+  def __retry_failed_chunk(self, chunk_number: int, error: ApiException):
+    '''
+    Private method to put a failed chunk back in the queue. The caller waits auto_retry_delay before its next chunk
+
+    Parameters
+    ----------
+    chunk_number : int
+      Chunk number that failed to upload
+    error : ApiException
+      Reason of the failure
 
-  def __single_threaded_upload(self):
+    Returns
+    ----------
+    retry : bool
+      False once max_error_count chunks failed and the upload should be given up
+    '''
+    controller = self.__upload_status['concurrency_controller']
+    controller.record_failure()
+    self.__upload_status['chunk_scheduler'].retry(chunk_number)
+    self.__upload_status['chunks_failed_count'] = controller.chunks_failed_count
+
+    if controller.chunks_failed_count >= self.__upload_status['max_error_count']:
+      return False
+
+    self.__upload_status['auto_retry_count'] += 1
+    print(f'ChunkFailed: {chunk_number}. Retrying with {controller.limit} concurrent uploads: {error}')
+    return True
+
+  def __upload_worker(self):
+    '''
+    Private method run by every upload worker. Pulls chunk numbers from the scheduler until it is drained.
+    The number of workers uploading at the same time is limited by the concurrency controller
     '''
-    Private method to find the chunk of file and trigger the upload chunk
+    scheduler = self.__upload_status['chunk_scheduler']
+    controller = self.__upload_status['concurrency_controller']
+    abort_controller = self.__upload_status['abort_controller']
+    retry_delay = 0
+
+    while not abort_controller.is_set():
+      # After a failure the worker waits without an upload slot, so the other workers keep uploading
+      if retry_delay > 0 and abort_controller.wait(retry_delay):
+        return
+      retry_delay = 0
+
+      if not controller.acquire(abort_controller=abort_controller):
+        return
+
+      try:
+        chunk_number = scheduler.next_chunk()
+        if chunk_number is None:
+          return
+
+        # Find the start and end positions of the file
+        start = (chunk_number - 1) * self.__upload_data['chunk_size']
+        end = min(chunk_number * self.__upload_data['chunk_size'], self.__upload_data['file_size'])
+        upload_start = time.monotonic()
+
+        try:
+          chunk = self.__file_chunk(start, end)
+          try:
+            self.__upload_chunk(chunk, chunk_number)
+          finally:
+            # Memory mapped chunks are views of the mapping and must be released before the file is closed
+            if isinstance(chunk, memoryview):
+              chunk.release()
+        except ApiException as e:
+          if self.__retry_failed_chunk(chunk_number, e):
+            retry_delay = self.__upload_status['service_callback']['auto_retry_delay']
+            continue
+          abort_controller.set()
+          raise
+        except BaseException:
+          # Put the chunk back and stop the remaining workers, the upload cannot be finished anymore
+          scheduler.retry(chunk_number)
+          abort_controller.set()
+          raise
+
+        controller.record_success(size=end - start, latency=time.monotonic() - upload_start)
+        scheduler.complete(chunk_number)
+        self.__upload_status['blocks_completed'] = scheduler.completed_count
+        self.__save_checkpoint()
+      finally:
+        controller.release()
+
+  def __update_upload_statistics(self):
     '''
+    Private method to copy the statistics of the concurrency controller to the upload status
 
-    # If the condition is true, trigger the finish upload
-    if len(self.__upload_status['chunk_queue']) == 0 and len(self.__upload_status['inflight_set']) == 0:
+    Returns
+    ----------
+    statistics : dict
+      Throughput, latency, concurrency and connection reuse statistics of the upload
+    '''
+    statistics = self.__upload_status['concurrency_controller'].stats()
+    self.__upload_status['average_speed'] = statistics['average_speed']
+    self.__upload_status['transfer_queue_rate'] = statistics['transfer_queue_rate']
+    self.__upload_status['chunks_failed_count'] = statistics['chunks_failed_count']
+
+    return {
+      **statistics,
+      'start_time': self.__upload_status['start_time'].isoformat(),
+      'end_time': self.__upload_status['end_time'].isoformat(),
+      'auto_retry_count': self.__upload_status['auto_retry_count'],
+      'connection_pool': ConnectionPool.for_host(resolve_host(self.__upload_data['upload_domain'])[0]).stats(),
+    }
+
+  def __start_upload(self):
+    '''
+    Private method to start uploading the file using a pool of concurrent upload workers
+    '''
+    scheduler = self.__upload_status['chunk_scheduler']
+    max_concurrent_uploads = min(self.__max_number_of_concurrent_uploads, scheduler.queued_count)
+    print(f'Starting upload with up to {max_concurrent_uploads} concurrent workers for {scheduler.queued_count} chunks')
+
+    self.__upload_status['start_time'] = datetime.datetime.now()
+    self.__upload_status['state'] = 'Uploading'
+    self.__upload_status['concurrency_controller'] = AdaptiveConcurrencyController(max_concurrency=max_concurrent_uploads)
+    abort_controller = self.__upload_status['abort_controller']
+
+    try:
+      with ThreadPoolExecutor(max_workers=max(max_concurrent_uploads, 1), thread_name_prefix='upload-chunk') as executor:
+        workers = [executor.submit(tracing.propagate(self.__upload_worker)) for i in range(max_concurrent_uploads)]
+
+        # Surface the first failure of any worker
+        try:
+          for worker in as_completed(workers):
+            worker.result()
+        except BaseException:
+          # Stop the remaining workers before waiting for the pool to shut down
+          abort_controller.set()
+          raise
+    except KeyboardInterrupt:
+      self.__cancel_upload()
+      raise
+    except Exception:
+      self.__upload_status['state'] = 'Failed'
+      if self.__is_resumable():
+        self.__save_checkpoint(force=True)
+        print('Upload failed. The progress is saved and the upload is resumed on the next run')
+      else:
+        self.__cancel_upload()
+      raise
+    finally:
       self.__upload_status['end_time'] = datetime.datetime.now()
-      self.__finish_upload()
-      return
 
-    # Pop out the topmost chunk number from the queue
-    chunk_number = self.__upload_status['chunk_queue'].pop()
+    statistics = self.__update_upload_statistics()
+    print(f"Uploaded {statistics['bytes_uploaded']} bytes at {statistics['average_speed'] / 1024:.1f} KB/s with up to {statistics['peak_concurrency']} concurrent uploads")
 
-    # Find the start and end positions of the file
-    start = (chunk_number - 1) * self.__upload_data['chunk_size'];
-    end = min(chunk_number * self.__upload_data['chunk_size'], self.__upload_data['file_size']);
-    chunk = self.__file_chunk(start, end)
+    if self.__cancel_requested:
+      self.__cancel_upload()
+      return {'error': True, 'message': 'Upload cancelled', 'upload_statistics': statistics}
 
-    # Trigger chunk upload
-    self.__upload_chunk(chunk, chunk_number)
+    # All the workers are done and the queue is drained, finish the upload exactly once
+    self.__finish_upload()
+    self.__delete_checkpoint()
+    self.__upload_status['state'] = 'Completed'
 
-  def __start_upload(self):
+    return {**self.__upload_success_response, 'upload_statistics': statistics}
+
+  def __create_upload_attachments_api(self, upload_domain: str = None):
     '''
-    Private method to start uploading the file
+    Private method to create the upload attachments api for the upload domain of the file asset
+
+    Parameters
+    ----------
+    upload_domain : str
+      Defaults to the upload domain of the current file asset
     '''
-    print('Starting single threaded upload with chunks: ', self.__upload_status['chunk_queue'])
-    concurrent_uploads = min(self.__max_number_of_concurrent_uploads, len(self.__upload_status['chunk_queue']))
-    
-    for i in range(concurrent_uploads):
-      self.__single_threaded_upload()
-    
-    return self.__upload_success_response
+    upload_domain = upload_domain or self.__upload_data['upload_domain']
+    # The upload domain is a url, its scheme is kept so plain http stand-ins work as well
+    self.__upload_attachments_api = UploadAttachmentsApi(app_center_token=self.__app_center_api.app_center_token, host_name=upload_domain)
+
+  def __resume_upload(self, checkpoint):
+    '''
+    Private method to restore an unfinished upload from its checkpoint and enqueue the chunks missing on the server
+
+    Parameters
+    ----------
+    checkpoint : dict
+      Checkpoint of the unfinished upload
+
+    Returns
+    ----------
+    resumed : bool
+      False if the server no longer accepts the upload and a new upload has to be started
+    '''
+    for key in self.CHECKPOINT_KEYS:
+      self.__upload_data[key] = checkpoint[key]
+
+    self.__create_upload_attachments_api()
+
+    id = self.__upload_data['asset_id']
+    url_encoded_token = self.__upload_data['url_encoded_token']
+
+    try:
+      result = self.__upload_attachments_api.upload_status(id=id, url_encoded_token=url_encoded_token)
+    except ApiException as e:
+      print(f'Unable to resume the upload, starting a new upload: {e}')
+      return False
+
+    if result.get('error'):
+      print(f"Unable to resume the upload, starting a new upload: {result.get('message')}")
+      return False
+
+    total_blocks = self.__upload_data['total_blocks']
+
+    # Prefer the server view of the missing chunks, fall back to the completed blocks of the checkpoint
+    missing_chunks = result.get('chunk_list')
+    if missing_chunks is None:
+      completed_blocks = set(checkpoint.get('completed_blocks', []))
+      missing_chunks = [chunk for chunk in range(1, total_blocks + 1) if chunk not in completed_blocks]
+
+    missing_set = set(missing_chunks)
+    self.__enqueue_chunks(missing_chunks)
+    self.__upload_status['chunk_scheduler'].mark_completed(chunk for chunk in range(1, total_blocks + 1) if chunk not in missing_set)
+    self.__upload_status['blocks_completed'] = self.__upload_status['chunk_scheduler'].completed_count
+
+    print(f'Resuming upload with {len(missing_set)} of {total_blocks} chunks missing on server')
+    return True
 
   def __upload_file_metadata(self):
-    upload_domain = self.__upload_data['upload_domain']
     id = self.__upload_data['asset_id']
     url_encoded_token = self.__upload_data['url_encoded_token']
     file_name = self.__upload_data['file_name']
     file_size = self.__upload_data['file_size']
 
     # Create upload attachments api
-    domain = upload_domain[8:]
-    self.__upload_attachments_api = UploadAttachmentsApi(app_center_token=APP_CENTER_CONSTANTS.APP_CENTER_TOKEN, host_name=domain)
+    self.__create_upload_attachments_api()
 
     result = self.__upload_attachments_api.upload_metadata(id=id, file_name=file_name, file_size=file_size, url_encoded_token=url_encoded_token)
 
@@ -197,7 +494,8 @@ class UploadAppCenterAttachments:
     print('Chunks to upload: ', self.__upload_data['total_blocks'])
 
     # Enqueue chunks
-    self.__enqueue_chunks(result.get('chunk_list'))
+    self.__enqueue_chunks(result.get('chunk_list') or [])
+    self.__save_checkpoint(force=True)
 
     # Returns the success response
     return self.__start_upload()
@@ -226,7 +524,72 @@ class UploadAppCenterAttachments:
     # Upload file metadata
     return self.__upload_file_metadata()
 
-  def init_app(self, app_name: str, file: File):
+  def __get_cached_upload(self, app_name: str, digest: str):
+    '''
+    Private method to find a previous upload of the same content to the same app that is still valid on the server
+
+    Parameters
+    ----------
+    app_name : str
+      App name to which the file has to be linked
+    digest : str
+      SHA-256 digest of the file
+
+    Returns
+    ----------
+    response : dict
+      Response of the previous upload or None if the file has to be uploaded
+    '''
+    entry = self.__upload_cache.get(digest, app_name)
+    if entry is None:
+      return None
+
+    # The upload is only reused as long as the server still knows the asset
+    self.__create_upload_attachments_api(upload_domain=entry['upload_domain'])
+    try:
+      result = self.__upload_attachments_api.upload_status(id=entry['asset_id'], url_encoded_token=entry['url_encoded_token'])
+    except ApiException as e:
+      result = {'error': True, 'message': str(e)}
+
+    if result.get('error'):
+      print(f"Cached upload of {self.__upload_data['file_name']} is no longer valid, uploading again")
+      self.__upload_cache.invalidate(digest=digest, app_name=app_name)
+      return None
+
+    print(f"Reusing the previous upload of {self.__upload_data['file_name']} for {app_name}")
+    return entry['response']
+
+  def __upload(self, app_name: str):
+    '''
+    Private method to upload the file, resuming an unfinished upload of the same file if possible
+
+    Parameters
+    ----------
+    app_name : str
+      App name to which the file has to be linked
+
+    Returns
+    ----------
+    response : Any
+      Success response after the file has finished uploading the file
+    '''
+    # Reset the state of any previous upload
+    self.__upload_status['chunk_scheduler'] = None
+    self.__upload_status['abort_controller'] = threading.Event()
+    self.__upload_status['auto_retry_count'] = 0
+    self.__cancel_requested = False
+
+    if self.__is_resumable():
+      self.__checkpoint_path = self.__get_checkpoint_path(app_name)
+      checkpoint = self.__load_checkpoint()
+      if checkpoint is not None and self.__resume_upload(checkpoint):
+        return self.__start_upload()
+      self.__upload_status['chunk_scheduler'] = None
+      self.__delete_checkpoint()
+
+    return self.__upload_file_asset(app_name)
+
+  def init_app(self, app_name: str, file: Union[File, MemoryFile, bytes, bytearray, memoryview, io.BytesIO], file_name: str = None):
     '''
     Public method to initiate uploading the file asset
 
@@ -234,20 +597,73 @@ class UploadAppCenterAttachments:
     ----------
     app_name : str
       App name to which the file has to be linked
-    file : File
-      File object
+    file : File | MemoryFile | bytes | bytearray | memoryview | BytesIO
+      File object, or the content of the file held in memory
+    file_name : str
+      Name of the file if its content is passed. Defaults to the name attribute of the buffer
     
     Returns
     ----------
     response : Any
-      Success response after the file has finished uploading the file
+      Success response after the file has finished uploading the file.
+      The throughput, latency and concurrency statistics of the upload are added as upload_statistics
     '''
+    if not isinstance(file, (File, MemoryFile)):
+      return self.__upload_buffer(app_name=app_name, data=file, file_name=file_name or getattr(file, 'name', None))
+
     self.__file = file
     self.__upload_data['file_name'] = file.file_name
     self.__upload_data['file_path'] = file.file_path
     self.__upload_data['file_size'] = file.file_size
-    
-    return self.__upload_file_asset(app_name)
+
+    with tracing.span('upload.file', app=app_name, file_name=file.file_name, bytes=file.file_size) as span:
+      if self.__upload_cache is None:
+        result = self.__upload(app_name)
+        span.set(failed=bool(result.get('error')))
+        return result
+
+      digest = self.__upload_cache.digest(file)
+
+      # Concurrent uploads of the same content to the same app wait for the first one and reuse its upload
+      with self.__upload_cache.upload_lock(digest, app_name):
+        cached_response = self.__get_cached_upload(app_name=app_name, digest=digest)
+        if cached_response is not None:
+          span.set(cached=True)
+          return cached_response
+
+        result = self.__upload(app_name)
+        span.set(failed=bool(result.get('error')))
+
+        if not result.get('error'):
+          response = {key: value for key, value in result.items() if key != 'upload_statistics'}
+          self.__upload_cache.put(
+            digest,
+            app_name,
+            response,
+            asset_id=self.__upload_data['asset_id'],
+            url_encoded_token=self.__upload_data['url_encoded_token'],
+            upload_domain=self.__upload_data['upload_domain']
+          )
+
+    return result
+
+  def __upload_buffer(self, app_name: str, data, file_name: str):
+    '''
+    Private method to upload content held in memory
+    '''
+    if not file_name:
+      raise ValueError('file_name is required to upload a buffer')
+
+    with MemoryFile(data=data, file_name=os.path.basename(file_name)) as file:
+      return self.init_app(app_name=app_name, file=file)
+
+  def cancel(self):
+    '''
+    Public method to abort a running upload from another thread.
+    The workers stop after their current chunk and the upload is cancelled on the server
+    '''
+    self.__cancel_requested = True
+    self.__upload_status['abort_controller'].set()
 
 
 def main():
@@ -263,8 +679,8 @@ def main():
   upload_app_center_attachments_app = UploadAppCenterAttachments(environment=environment)
   
   # Invoke the upload_app_center_attachments app
-  file = File('/Users/rahulmuddebihal/Downloads/Empower_OEM4_Adhoc-2.mobileprovision')
-  upload_app_center_attachments_app.init_app(app_name='hello-ios', file=file)
+  with File('/Users/rahulmuddebihal/Downloads/Empower_OEM4_Adhoc-2.mobileprovision', memory_map=True) as file:
+    upload_app_center_attachments_app.init_app(app_name='hello-ios', file=file)
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from constants import app_center_constants as APP_CENTER_CONSTANTS
+
+class UploadCache:
+  '''
+  Class to cache uploaded files by their content
+
+  Entries are keyed by the SHA-256 digest of the file and the app it was uploaded to
+  and hold the upload response (location and absolute_uri) together with the asset id and token of the upload,
+  so the same certificate is uploaded once per app instead of once per branch
+  '''
+  def __init__(self, cache_path: str = APP_CENTER_CONSTANTS.UPLOAD_CACHE_PATH, max_age: float = APP_CENTER_CONSTANTS.UPLOAD_CACHE_MAX_AGE) -> None:
+    '''
+    Constructor for UploadCache Class
+
+    Parameters
+    ----------
+    cache_path : str
+      JSON file in which the cache is persisted across runs. If None, the cache is kept in memory only
+    max_age : float
+      Seconds after which an entry is no longer reused
+    '''
+    self.__cache_path = cache_path
+    self.__max_age = max_age
+    self.__lock = threading.Lock()
+    self.__upload_locks = {}
+    self.__entries = self.__load()
+
+  def __load(self):
+    '''
+    Private method to load the persisted cache
+    '''
+    if not self.__cache_path:
+      return {}
+
+    try:
+      with open(self.__cache_path, 'r') as file:
+        return json.load(file)
+    except (OSError, ValueError):
+      return {}
+
+  def __save(self):
+    '''
+    Private method to persist the cache. Must be called with the lock held
+    '''
+    if not self.__cache_path:
+      return
+
+    directory = os.path.dirname(self.__cache_path)
+    if directory:
+      os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    # The entries hold the asset tokens, only the current user may read them
+    temporary_path = f'{self.__cache_path}.tmp'
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as file:
+      json.dump(self.__entries, file)
+    os.replace(temporary_path, self.__cache_path)
+
+  def __key(self, digest: str, app_name: str):
+    return f'{app_name}:{digest}'
+
+  @staticmethod
+  def digest(file, block_size: int = 1024 * 1024):
+    '''
+    Compute the SHA-256 digest of a file
+
+    Parameters
+    ----------
+    file : File
+      File to hash
+    block_size : int
+      Number of bytes hashed at once
+
+    Returns
+    ----------
+    digest : str
+      Hex digest of the file content
+    '''
+    sha256 = hashlib.sha256()
+    for start in range(0, file.file_size, block_size):
+      chunk = file.read_file_chunk(start=start, end=min(start + block_size, file.file_size))
+      sha256.update(chunk)
+      if isinstance(chunk, memoryview):
+        chunk.release()
+    return sha256.hexdigest()
+
+  def upload_lock(self, digest: str, app_name: str):
+    '''
+    Get the lock of the upload of a file to an app
+
+    Hold it while looking up the cache, uploading and caching the upload,
+    so uploads of the same file to the same app that are already in flight are awaited instead of repeated
+
+    Parameters
+    ----------
+    digest : str
+      SHA-256 digest of the file
+    app_name : str
+      App name the file is uploaded to
+
+    Returns
+    ----------
+    lock : threading.Lock
+      Same lock for every caller of the same digest and app
+    '''
+    with self.__lock:
+      return self.__upload_locks.setdefault(self.__key(digest, app_name), threading.Lock())
+
+  def get(self, digest: str, app_name: str, include_expired: bool = False):
+    '''
+    Get the cached upload of a file for an app
+
+    Parameters
+    ----------
+    digest : str
+      SHA-256 digest of the file
+    app_name : str
+      App name the file was uploaded to
+    include_expired : bool
+      Return entries older than max_age as well. They are not reused for new uploads,
+      but still identify the upload a branch configuration refers to
+
+    Returns
+    ----------
+    entry : dict
+      Cached entry with [response], [asset_id], [url_encoded_token], [upload_domain], [uploaded_at] or None if there is no fresh entry
+    '''
+    with self.__lock:
+      entry = self.__entries.get(self.__key(digest, app_name))
+
+    if entry is None or (not include_expired and time.time() - entry.get('uploaded_at', 0) > self.__max_age):
+      return None
+
+    return entry
+
+  def put(self, digest: str, app_name: str, response, **kwargs):
+    '''
+    Cache the upload of a file for an app
+
+    Parameters
+    ----------
+    digest : str
+      SHA-256 digest of the file
+    app_name : str
+      App name the file was uploaded to
+    response : dict
+      Response of the finished upload
+    kwargs : dict
+      [asset_id], [url_encoded_token], [upload_domain]
+    '''
+    with self.__lock:
+      self.__entries[self.__key(digest, app_name)] = {
+        'response': response,
+        'asset_id': kwargs.get('asset_id', ''),
+        'url_encoded_token': kwargs.get('url_encoded_token', ''),
+        'upload_domain': kwargs.get('upload_domain', ''),
+        'uploaded_at': time.time(),
+      }
+      self.__save()
+
+  def invalidate(self, digest: str = None, app_name: str = None):
+    '''
+    Remove cached uploads. Without arguments the whole cache is cleared
+
+    Parameters
+    ----------
+    digest : str
+      SHA-256 digest of the file
+    app_name : str
+      App name the file was uploaded to
+    '''
+    with self.__lock:
+      if digest is None and app_name is None:
+        self.__entries = {}
+      else:
+        self.__entries = {
+          key: entry for key, entry in self.__entries.items()
+          if not ((app_name is None or key.startswith(f'{app_name}:')) and (digest is None or key.endswith(f':{digest}')))
+        }
+      self.__save()